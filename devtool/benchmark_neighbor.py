@@ -0,0 +1,53 @@
+"""
+Benchmark building neighbor lists of configurations from 10 to 10^6 atoms.
+
+The configurations are perturbed simple cubic lattices of Si, with periodic boundary
+conditions. For each size, the time to build a full list, a half list, and a full list
+with multiple threads is reported. Neighbor lists are not cached.
+
+To run:
+$ python benchmark_neighbor.py
+"""
+
+import os
+import time
+
+import numpy as np
+
+from kliff.dataset import Configuration
+from kliff.neighbor import NeighborList
+
+
+def create_configuration(natoms, a=2.5, seed=35):
+    n = max(1, int(round(natoms ** (1 / 3))))
+    x = np.arange(n) * a
+    coords = np.stack(np.meshgrid(x, x, x, indexing="ij"), axis=-1).reshape(-1, 3)
+    rng = np.random.RandomState(seed)
+    coords += rng.uniform(-0.1, 0.1, coords.shape)
+    cell = np.eye(3) * n * a
+    return Configuration(cell, ["Si"] * len(coords), coords, [True, True, True])
+
+
+def timeit(conf, repeat=3, **kwargs):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        NeighborList(conf, infl_dist=5.0, **kwargs)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+if __name__ == "__main__":
+    num_threads = os.cpu_count()
+
+    print(
+        f"{'atoms':>10s} {'full (s)':>12s} {'half (s)':>12s} "
+        f"{f'{num_threads} threads (s)':>16s}"
+    )
+    for natoms in [10, 10**2, 10**3, 10**4, 10**5, 10**6]:
+        conf = create_configuration(natoms)
+        repeat = 3 if natoms < 10**6 else 1
+        full = timeit(conf, repeat)
+        half = timeit(conf, repeat, half_list=True)
+        threaded = timeit(conf, repeat, num_threads=num_threads)
+        print(f"{conf.get_num_atoms():10d} {full:12.4f} {half:12.4f} {threaded:16.4f}")
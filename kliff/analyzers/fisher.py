@@ -1,8 +1,8 @@
-import copy
-
 import numpy as np
 from loguru import logger
 
+from kliff import parallel
+from kliff.analyzers.rmse import AnalyzerError
 from kliff.utils import split_string
 
 
@@ -18,25 +18,51 @@ class Fisher:
 
     where :math:`f_m` are the forces on atoms in configuration :math:`m`, :math:`\theta_i`
     is the ith model parameter.
-    Derivatives are computed numerically using Ridders' algorithm:
-    https://en.wikipedia.org/wiki/Ridders%27_method
+
+    Derivatives are computed analytically if the model provides them (see
+    :meth:`kliff.models.model.ComputeArguments.compute_jacobian`). Otherwise, they are
+    computed numerically using central differences with Richardson extrapolation
+    over a fixed sequence of steps. The same perturbation schedule is shared by all
+    configurations: the model parameters are perturbed once, the forces are computed
+    for a whole chunk of configurations, and then the next perturbation is applied.
 
     Parameters
     ----------
     calculator:
         A calculator object.
+
+    nprocs: int
+        Number of processes to use. The chunks of configurations are distributed to
+        the processes.
+
+    chunk_size: int
+        Number of configurations that share the perturbations of the parameters. The
+        Jacobians of a chunk are kept in memory.
+
+    step: float
+        Initial step of the finite differences, relative to the parameter value (or
+        absolute if the magnitude of the parameter value is smaller than 1).
+
+    num_steps: int
+        Number of steps, each half of the previous one, used in the Richardson
+        extrapolation of the finite differences.
     """
 
-    def __init__(self, calculator):
+    def __init__(self, calculator, nprocs=1, chunk_size=100, step=1e-3, num_steps=3):
         self.calculator = calculator
-        self.F = None
-        self.F_stdev = None
-        self.delta_params = None
+        self.nprocs = nprocs
+        self.chunk_size = chunk_size
+        self.step = step
+        self.num_steps = num_steps
 
     def run(self, verbose=1):
         """
         Compute the Fisher information matrix and the standard deviation.
 
+        The mean and standard deviation over configurations are accumulated with
+        Welford's method, such that the Fisher information of each configuration
+        needs not be kept in memory.
+
         Parameters
         ----------
         verbose: int
@@ -55,23 +81,164 @@ class Fisher:
 
         logger.info("Start computing Fisher information matrix.")
 
-        I_all = []
+        if self.calculator.has_jacobian():
+            logger.info("Using analytic Jacobian of forces w.r.t. parameters.")
 
-        cas = self.calculator.get_compute_arguments()
-        for i, ca in enumerate(cas):
-            if i % 100 == 0:
-                logger.info(f"Processing configuration {i}.")
+        original_params = self.calculator.get_opt_params()
 
-            dfdp = self._compute_jacobian_one_config(ca)
-            I_all.append(np.dot(dfdp.T, dfdp))
-        I = np.mean(I_all, axis=0)
-        I_stdev = np.std(I_all, axis=0)
+        ncas = len(self.calculator.get_compute_arguments())
+        starts = list(range(0, ncas, self.chunk_size))
+        if self.nprocs > 1:
+            stats = parallel.parmap2(
+                self._compute_chunk, starts, original_params, nprocs=self.nprocs
+            )
+        else:
+            stats = [self._compute_chunk(i, original_params) for i in starts]
+
+        # restore params back
+        self.calculator.update_model_params(original_params)
+
+        n, mean, M2 = stats[0]
+        for stat in stats[1:]:
+            n, mean, M2 = _combine_welford((n, mean, M2), stat)
+        I = mean
+        I_stdev = np.sqrt(M2 / n)
 
         self._write_result(I, I_stdev, verbose)
         logger.info("Finish computing Fisher information matrix.")
 
         return I, I_stdev
 
+    def _compute_chunk(self, start, params):
+        """
+        Compute the Fisher information of a chunk of configurations.
+
+        Parameters
+        ----------
+        start: int
+            Index of the first configuration of the chunk.
+
+        params: 1D array
+            The parameter values at which to compute the Fisher information.
+
+        Return
+        ------
+        (n, mean, M2)
+            Number of configurations, mean of the Fisher information of the
+            configurations, and sum of squares of differences from the mean.
+        """
+        cas = self.calculator.get_compute_arguments()
+        cas = cas[start : start + self.chunk_size]
+        logger.info(f"Processing configurations {start} to {start + len(cas) - 1}.")
+
+        if self.calculator.has_jacobian():
+            self.calculator.update_model_params(params)
+            jacobians = [self._compute_jacobian_analytic(ca) for ca in cas]
+        else:
+            jacobians = self._compute_jacobian_finite_difference(cas, params)
+
+        # Welford's method
+        n = 0
+        mean = 0.0
+        M2 = 0.0
+        for dfdp in jacobians:
+            I = np.dot(dfdp.T, dfdp)
+            n += 1
+            delta = I - mean
+            mean = mean + delta / n
+            M2 = M2 + delta * (I - mean)
+
+        return n, mean, M2
+
+    def _compute_jacobian_analytic(self, ca):
+        """
+        Compute the Jacobian of forces w.r.t. parameters for one configuration, using
+        the analytic Jacobian of the prediction provided by the model.
+        """
+        if not ca.compute_forces:
+            raise AnalyzerError(
+                "Forces are not computed for configuration "
+                f"`{ca.conf.identifier}`. Create the calculator with `use_forces=True` "
+                "to compute the Fisher information matrix."
+            )
+
+        jacobian = self.calculator.compute_jacobian(ca)
+
+        # the prediction is energy (if computed), forces, and stress (if computed)
+        start = 1 if ca.compute_energy else 0
+        end = start + 3 * ca.conf.get_num_atoms()
+
+        return jacobian[start:end]
+
+    def _compute_jacobian_finite_difference(self, cas, params):
+        """
+        Compute the Jacobians of forces w.r.t. parameters for a chunk of configurations,
+        using central differences with Richardson extrapolation.
+
+        Parameters
+        ----------
+        cas: list
+            `compute arguments` of the configurations.
+
+        params: 1D array
+            The parameter values at which to compute the Jacobians.
+
+        Return
+        ------
+        list of 2D array
+            The Jacobian of each configuration, shape(3N, P), with N the number of
+            atoms in the configuration and P the number of parameters.
+        """
+        params = np.asarray(params, dtype=float)
+
+        columns = [[] for _ in cas]
+        for k in range(len(params)):
+            h = self.step * max(abs(params[k]), 1.0)
+
+            estimates = [[] for _ in cas]
+            for _ in range(self.num_steps):
+                p = params.copy()
+                p[k] = params[k] + h
+                forces_plus = self._compute_forces(p, cas)
+                p[k] = params[k] - h
+                forces_minus = self._compute_forces(p, cas)
+
+                for i, (fp, fm) in enumerate(zip(forces_plus, forces_minus)):
+                    estimates[i].append((fp - fm) / (2 * h))
+                h /= 2
+
+            for i, est in enumerate(estimates):
+                columns[i].append(_richardson_extrapolation(est))
+
+        return [np.stack(cols, axis=1) for cols in columns]
+
+    def _compute_forces(self, params, cas):
+        """
+        Compute forces of configurations using a specific set of model parameters.
+
+        Parameters
+        ----------
+        params: list
+          the parameter values
+
+        cas: list
+            `compute arguments` of the configurations
+
+        Return
+        ------
+        forces: list of 1D array
+            the forces on atoms in each configuration
+        """
+        self.calculator.update_model_params(params)
+
+        forces = []
+        for ca in cas:
+            self.calculator.compute(ca)
+            f = self.calculator.get_forces(ca)
+            forces.append(np.reshape(f, (-1,)))
+
+        return forces
+
     def _write_result(self, I, stdev, verbose, path="analysis_Fisher_info_matrix.txt"):
         params = self.calculator.get_opt_params()
         nparams = len(params)
@@ -124,54 +291,38 @@ class Fisher:
                         fout.write("{:23.15e} ".format(v))
                     fout.write("\n")
 
-    def _compute_jacobian_one_config(self, ca):
-        """
-        Compute the Jacobian of forces w.r.t. parameters for one configuration.
 
-        Parameters
-        ----------
-        ca: object
-            `compute argument` associated with one configuration.
-        """
-
-        try:
-            import numdifftools as nd
-        except ImportError as e:
-            raise ImportError(
-                '{}\nFisher information analyzer needs "numdifftools". Please install '
-                "it first.".format(str(e))
-            )
-
-        # compute Jacobian of forces w.r.t. parameters
-        original_params = self.calculator.get_opt_params()
-        Jfunc = nd.Jacobian(self._compute_forces_one_config)
-        j = Jfunc(copy.deepcopy(original_params), ca)
-
-        # restore params back
-        self.calculator.update_model_params(original_params)
-
-        return j
+def _richardson_extrapolation(estimates):
+    """
+    Richardson extrapolation of central difference estimates.
 
-    def _compute_forces_one_config(self, params, ca):
-        """
-        Compute forces using a specific set of model parameters.
+    Parameters
+    ----------
+    estimates: list
+        Central difference estimates with steps h, h/2, h/4, ..., whose errors are
+        even powers of the step.
 
-        Parameters
-        ----------
-        params: list
-          the parameter values
+    Return
+    ------
+    The extrapolated estimate.
+    """
+    d = list(estimates)
+    for j in range(1, len(estimates)):
+        factor = 4**j
+        d = [(factor * d[i + 1] - d[i]) / (factor - 1) for i in range(len(d) - 1)]
+    return d[0]
 
-        ca: object
-            `compute argument` associated with one configuration
 
-        Return
-        ------
-        forces: 1D array
-            the forces on atoms in this configuration
-        """
-        self.calculator.update_model_params(params)
-        self.calculator.compute(ca)
-        forces = self.calculator.get_forces(ca)
-        forces = np.reshape(forces, (-1,))
+def _combine_welford(a, b):
+    """
+    Combine the Welford statistics (n, mean, M2) of two sets of samples.
 
-        return forces
+    See https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
+    """
+    n_a, mean_a, M2_a = a
+    n_b, mean_b, M2_b = b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    M2 = M2_a + M2_b + delta**2 * n_a * n_b / n
+    return n, mean, M2
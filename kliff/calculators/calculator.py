@@ -133,6 +133,30 @@ class Calculator:
             compute_arguments.compute(self.model.get_model_params())
         return compute_arguments.results
 
+    def compute_jacobian(self, compute_arguments) -> np.array:
+        """
+        Compute the Jacobian of the prediction w.r.t. the optimizing parameters, given
+        the compute arguments associated with a configuration.
+
+        Args:
+            compute_arguments: A compute arguments instance for a configuration.
+
+        Returns:
+            2D array of shape (S, M), where `S` is the size of the prediction (see
+            :meth:`get_prediction`) and `M` the number of optimizing parameters.
+        """
+        jacobian = compute_arguments.compute_jacobian(self.model.get_model_params())
+        return self.model.get_opt_params_jacobian(jacobian)
+
+    def has_jacobian(self) -> bool:
+        """
+        Whether the Jacobian w.r.t. the optimizing parameters can be computed
+        analytically by :meth:`compute_jacobian`.
+        """
+        if self._is_kim_model():
+            return False
+        return self.model.has_opt_params_jacobian()
+
     def get_energy(self, compute_arguments) -> float:
         """
         Get the energy of a configuration.
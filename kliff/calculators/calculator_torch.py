@@ -7,7 +7,12 @@ from loguru import logger
 from torch.utils.data import DataLoader
 
 from kliff.dataset.dataset import Configuration
-from kliff.dataset.dataset_torch import FingerprintsDataset, fingerprints_collate_fn
+from kliff.dataset.dataset_torch import (
+    FingerprintsBatch,
+    FingerprintsDataset,
+    fingerprints_collate_fn,
+)
+from kliff.descriptors.descriptor import FingerprintsCache
 from kliff.models.model_torch import ModelTorch
 from kliff.models.neural_network import NeuralNetwork
 from kliff.utils import pickle_load, to_path
@@ -44,11 +49,12 @@ class CalculatorTorch:
         use_energy: bool = True,
         use_forces: bool = True,
         use_stress: bool = False,
-        fingerprints_filename: Union[Path, str] = "fingerprints.pkl",
+        fingerprints_filename: Union[Path, str] = "fingerprints",
         fingerprints_mean_stdev_filename: Optional[Union[Path, str]] = None,
         reuse: bool = False,
-        use_welford_method: bool = False,
+        use_welford_method: Optional[bool] = None,
         nprocs: int = 1,
+        fingerprints_cache: Optional[Union[FingerprintsCache, Path, str]] = None,
     ):
         """
         Process configs to generate fingerprints.
@@ -58,20 +64,25 @@ class CalculatorTorch:
             use_energy: Whether to require the calculator to compute energy.
             use_forces: Whether to require the calculator to compute forces.
             use_stress: Whether to require the calculator to compute stress.
-            fingerprints_filename: Path to save the generated fingerprints.
+            fingerprints_filename: Path to save the generated fingerprints, a
+                fingerprints store directory, or a pickle file if it ends with `.pkl`.
                 If `reuse=True`, Will not generate the fingerprints, but directly use the
-                one provided via this file.
+                one provided via this path.
             fingerprints_mean_stdev_filename: Path to save the mean and standard deviation
                 of the fingerprints. If `reuse=True`, Will not generate new fingerprints
                 mean and stdev, but directly use the one provided via this file.
                 If `normalize` is not required by a descriptor, this is ignored.
             reuse: Whether to reuse provided fingerprints.
-            use_welford_method: Whether to compute mean and standard deviation using the
-                Welford method, which is memory efficient. See
-                https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
+            use_welford_method: Deprecated and ignored, with a `DeprecationWarning` if
+                given. The mean and standard deviation of the fingerprints are always
+                accumulated one configuration at a time, which is memory efficient.
             nprocs: Number of processes used to generate the fingerprints. If `1`, run
                 in serial mode, otherwise `nprocs` processes will be forked via
                 multiprocessing to do the work.
+            fingerprints_cache: Cache of the fingerprints of configurations, or the path
+                to its directory (see :class:`~kliff.descriptors.FingerprintsCache`).
+                If provided, only the configurations not in the cache are transformed
+                to generate the fingerprints. Ignored if `reuse=True`.
         """
 
         self.configs = configs
@@ -112,14 +123,20 @@ class CalculatorTorch:
 
         # generate fingerprints and pickle it
         else:
+            if fingerprints_cache is not None and not isinstance(
+                fingerprints_cache, FingerprintsCache
+            ):
+                fingerprints_cache = FingerprintsCache(fingerprints_cache)
+
             self.fingerprints_path = self.model.descriptor.generate_fingerprints(
                 configs,
                 use_forces,
                 use_stress,
                 fingerprints_filename,
                 fingerprints_mean_stdev_filename,
-                use_welford_method,
-                nprocs,
+                use_welford_method=use_welford_method,
+                nprocs=nprocs,
+                cache=fingerprints_cache,
             )
 
         # Finally, assign fingerprints dataset property as a FingerprintsDataset instance
@@ -159,73 +176,173 @@ class CalculatorTorch:
         self.model.fit(path)
 
     def compute(self, batch):
-        #
-        # shape N--number of atoms in a config; D--feature dim
-        # zeta: (N, D)
-        # dzetadr_force: (N, D, 3N)
-        # dzetadr_stress: (N, D, 6)
-        #
-        # batching dzetadr_force seems difficult, because two axes have different size
-        # this seems doable, combine N and 3N as one dim, and use einstein sum
+        """
+        Compute the properties of a batch of configurations.
+
+        Args:
+            batch: A batch of samples from the dataloader returned by
+                :meth:`get_compute_arguments`, or a list of fingerprints.
+
+        Returns:
+            A dict of the properties, each a list of the values of the configurations
+            in the batch, or `None` if the property is not used.
+        """
+        batch = self._as_batch(batch)
+        results = self.compute_batch(batch)
+
+        natoms_config = batch.natoms.tolist()
+        energy_config = list(results["energy"].unbind())
+        if results["forces"] is None:
+            forces_config = None
+        else:
+            forces_config = [
+                f.reshape(-1) for f in torch.split(results["forces"], natoms_config)
+            ]
+        if results["stress"] is None:
+            stress_config = None
+        else:
+            stress_config = list(results["stress"].unbind())
+
+        self.results["energy"] = energy_config
+        self.results["forces"] = forces_config
+        self.results["stress"] = stress_config
+        return {
+            "energy": energy_config,
+            "forces": forces_config,
+            "stress": stress_config,
+        }
+
+    def compute_batch(self, batch):
+        """
+        Compute the properties of a batch of configurations, packed over the batch.
+
+        Unlike :meth:`compute`, the properties are not split per configuration, which
+        is what vectorized loss functions need. See
+        :class:`~kliff.dataset.dataset_torch.FingerprintsBatch` for the layout.
+
+        Args:
+            batch: A batch of samples from the dataloader returned by
+                :meth:`get_compute_arguments`, or a list of fingerprints.
 
+        Returns:
+            A dict with `energy` of shape (B,), `forces` of shape (N, 3), and `stress`
+            of shape (B, 6), where `B` is the number of configurations and `N` the
+            total number of atoms in the batch. A property is `None` if not used.
+        """
+        batch = self._as_batch(batch)
         device = self.model.device
 
         grad = self.use_forces or self.use_stress
 
-        # TODO, the batching should be moved to dataloader
-        # get information from batch
-        zeta_config = [sample["zeta"] for sample in batch]
-        zeta_stacked = torch.cat(zeta_config, dim=0).to(device)
+        zeta = batch.zeta.to(device)
+        atom_config = batch.atom_config.to(device)
+        if grad:
+            zeta.requires_grad_(True)
+
+        energy_atom = self._compute_energy_atom(zeta, batch)
+        energy = torch.zeros(
+            len(batch), dtype=energy_atom.dtype, device=energy_atom.device
+        ).index_add(0, atom_config, energy_atom)
 
-        # evaluate model
+        forces = None
+        stress = None
         if grad:
-            zeta_stacked.requires_grad_(True)
+            dedzeta = torch.autograd.grad(energy_atom.sum(), zeta, create_graph=True)[0]
+            zeta.requires_grad_(False)  # no need of grad any more
+
+            if self.use_forces:
+                forces = self._compute_forces_sparse(
+                    dedzeta,
+                    batch.dzetadr_forces.to(device),
+                    batch.dzetadr_forces_atom.to(device),
+                    batch.dzetadr_forces_neigh.to(device),
+                )
 
-        energy_atom = self.model(zeta_stacked)
+            if self.use_stress:
+                stress = self._compute_stress(
+                    dedzeta,
+                    batch.dzetadr_stress.to(device),
+                    batch.volume.to(device),
+                    atom_config,
+                )
 
-        # forces and stress
-        if not self.use_forces:
-            forces_config = None
-        else:
-            forces_config = []
-        if not self.use_stress:
-            stress_config = None
-        else:
-            stress_config = []
+        return {"energy": energy, "forces": forces, "stress": stress}
 
-        natoms_config = [len(zeta) for zeta in zeta_config]
-        energy_config = [e.sum() for e in torch.split(energy_atom, natoms_config)]
+    def compute_batch_ensemble(
+        self,
+        batch,
+        params: Dict[str, torch.Tensor],
+        buffers: Optional[Dict[str, torch.Tensor]] = None,
+    ):
+        """
+        Compute the properties of a batch of configurations for an ensemble of models,
+        packed over the batch.
+
+        The models share the architecture of :attr:`model`, and their parameters are
+        stacked along a leading dimension of size `K`, e.g. by
+        :func:`torch.func.stack_module_state`. All models are evaluated in a single
+        vectorized pass using :func:`torch.func.vmap`.
+
+        Args:
+            batch: A batch of samples from the dataloader returned by
+                :meth:`get_compute_arguments`, or a list of fingerprints.
+            params: Stacked parameters of the models, keyed by parameter name.
+            buffers: Stacked buffers of the models, keyed by buffer name.
+
+        Returns:
+            A dict with `energy` of shape (K, B), `forces` of shape (K, N, 3), and
+            `stress` of shape (K, B, 6), where `B` is the number of configurations and
+            `N` the total number of atoms in the batch. A property is `None` if not
+            used.
+        """
+        batch = self._as_batch(batch)
+        device = self.model.device
+
+        if buffers is None:
+            buffers = {}
+        nmodels = next(iter(params.values())).shape[0]
+
+        grad = self.use_forces or self.use_stress
 
+        # each model gets its own copy of the fingerprints, such that the gradient of
+        # the energy w.r.t. them is that of each model
+        zeta = batch.zeta.to(device).expand(nmodels, *batch.zeta.shape).clone()
+        atom_config = batch.atom_config.to(device)
         if grad:
-            dedzeta = torch.autograd.grad(
-                energy_atom.sum(), zeta_stacked, create_graph=True
-            )[0]
-            zeta_stacked.requires_grad_(False)  # no need of grad any more
+            zeta.requires_grad_(True)
 
-            dedzeta_config = torch.split(dedzeta, natoms_config)
+        def energy_atom_fn(p, b, z):
+            return torch.func.functional_call(self.model, (p, b), (z,)).reshape(-1)
 
-            for i, sample in enumerate(batch):
-                dedz = dedzeta_config[i]
+        energy_atom = torch.func.vmap(energy_atom_fn, randomness="different")(
+            params, buffers, zeta
+        )
+        energy = torch.zeros(
+            (nmodels, len(batch)), dtype=energy_atom.dtype, device=energy_atom.device
+        ).index_add(1, atom_config, energy_atom)
 
-                if self.use_forces:
-                    dzetadr_forces = sample["dzetadr_forces"].to(device)
-                    f = self._compute_forces(dedz, dzetadr_forces)
-                    forces_config.append(f)
+        forces = None
+        stress = None
+        if grad:
+            dedzeta = torch.autograd.grad(energy_atom.sum(), zeta, create_graph=True)[0]
+
+            if self.use_forces:
+                forces = self._compute_forces_sparse(
+                    dedzeta,
+                    batch.dzetadr_forces.to(device),
+                    batch.dzetadr_forces_atom.to(device),
+                    batch.dzetadr_forces_neigh.to(device),
+                )
 
-                if self.use_stress:
-                    dzetadr_stress = sample["dzetadr_stress"].to(device)
-                    volume = sample["dzetadr_volume"]
-                    s = self._compute_stress(dedz, dzetadr_stress, volume)
-                    stress_config.append(s)
+            if self.use_stress:
+                stress = self._compute_stress(
+                    dedzeta,
+                    batch.dzetadr_stress.to(device),
+                    batch.volume.to(device),
+                    atom_config,
+                )
 
-        self.results["energy"] = energy_config
-        self.results["forces"] = forces_config
-        self.results["stress"] = stress_config
-        return {
-            "energy": energy_config,
-            "forces": forces_config,
-            "stress": stress_config,
-        }
+        return {"energy": energy, "forces": forces, "stress": stress}
 
     @property
     def model(self):
@@ -263,15 +380,47 @@ class CalculatorTorch:
     def get_stress(self, batch):
         return self.results["stress"]
 
+    def _compute_energy_atom(self, zeta, batch):
+        """
+        Compute the energy of each atom in the batch, a 1D tensor of shape (N,).
+        """
+        return self.model(zeta).reshape(-1)
+
     @staticmethod
-    def _compute_forces(denergy_dzeta, dzetadr):
-        forces = -torch.tensordot(denergy_dzeta, dzetadr, dims=([0, 1], [0, 1]))
-        return forces
+    def _as_batch(batch):
+        if isinstance(batch, FingerprintsBatch):
+            return batch
+        return fingerprints_collate_fn(batch)
+
+    @staticmethod
+    def _compute_forces_sparse(denergy_dzeta, dzetadr, atom, neigh):
+        """
+        Compute forces from sparse gradients of fingerprints.
+
+        See :class:`~kliff.descriptors.descriptor.SparseGradient` for the meaning of
+        `dzetadr`, `atom`, and `neigh`. The returned forces are of shape (N, 3), or
+        (K, N, 3) if `denergy_dzeta` is of shape (K, N, D) for an ensemble of models.
+        """
+        natoms = denergy_dzeta.shape[-2]
+        contrib = torch.einsum("...nd,ndk->...nk", denergy_dzeta[..., atom, :], dzetadr)
+        forces = torch.zeros(
+            contrib.shape[:-2] + (natoms, 3), dtype=contrib.dtype, device=contrib.device
+        ).index_add(-2, neigh, contrib)
+        return -forces
 
     @staticmethod
-    def _compute_stress(denergy_dzeta, dzetadr, volume):
-        forces = torch.tensordot(denergy_dzeta, dzetadr, dims=([0, 1], [0, 1])) / volume
-        return forces
+    def _compute_stress(denergy_dzeta, dzetadr, volume, atom_config):
+        """
+        Compute the stress of each configuration in the batch, of shape (B, 6), or
+        (K, B, 6) if `denergy_dzeta` is of shape (K, N, D) for an ensemble of models.
+        """
+        contrib = torch.einsum("...nd,ndk->...nk", denergy_dzeta, dzetadr)
+        stress = torch.zeros(
+            contrib.shape[:-2] + (len(volume), 6),
+            dtype=contrib.dtype,
+            device=contrib.device,
+        ).index_add(-2, atom_config, contrib)
+        return stress / volume[:, None]
 
     def get_size_opt_params(self) -> Tuple[List[int], List[int], int]:
         """
@@ -389,84 +538,25 @@ class CalculatorTorchSeparateSpecies(CalculatorTorch):
 
         self.results = dict([(i, None) for i in self.implemented_property])
 
-    def compute(self, batch):
-        device = self.model.device
-
-        grad = self.use_forces or self.use_stress
-
-        # collate batch by species
-
-        supported_species = self.models.keys()
-        zeta_by_species = {s: [] for s in supported_species}
-        config_id_by_species = {s: [] for s in supported_species}
-        zeta_config = []
-
-        for i, sample in enumerate(batch):
-            zeta = sample["zeta"].to(device)
-            species = sample["configuration"].species
-            zeta.requires_grad_(True)
-            zeta_config.append(zeta)
-
-            for s, z in zip(species, zeta):
-                if s not in supported_species:
-                    raise CalculatorTorchError(f"No model for species: {s}")
-                else:
-                    zeta_by_species[s].append(z)
-                    config_id_by_species[s].append(i)
-
-        # evaluate model to compute energy
-        energy_config = [None for _ in range(len(batch))]
-        for s, zeta in zeta_by_species.items():
+    def _compute_energy_atom(self, zeta, batch):
+        """
+        Compute the energy of each atom in the batch, using the model of its species.
+        """
+        species = np.concatenate([sample["configuration"].species for sample in batch])
+        for s in np.unique(species):
+            if s not in self.models:
+                raise CalculatorTorchError(f"No model for species: {s}")
+
+        energy_atom = torch.zeros(len(species), dtype=zeta.dtype, device=zeta.device)
+        for s, model in self.models.items():
+            index = torch.from_numpy(np.flatnonzero(species == s)).to(zeta.device)
             # have no species "s" in this batch of data
-            if not zeta:  # zeta == []
+            if len(index) == 0:
                 continue
+            energy = model(zeta[index]).reshape(-1)
+            energy_atom = energy_atom.index_copy(0, index, energy)
 
-            z_tensor = torch.stack(zeta)  # convert a list of tensor to tensor
-            energy = self.models[s](z_tensor)
-
-            for e_atom, i in zip(energy, config_id_by_species[s]):
-                if energy_config[i] is None:
-                    energy_config[i] = e_atom
-                else:
-                    # note cannot use +=, energy e_atom is a view
-                    energy_config[i] = energy_config[i] + e_atom
-
-        # forces and stress
-        if not self.use_forces:
-            forces_config = None
-        else:
-            forces_config = []
-        if not self.use_stress:
-            stress_config = None
-        else:
-            stress_config = []
-        if grad:
-            for i, sample in enumerate(batch):
-                # derivative of energy w.r.t. zeta
-                energy = energy_config[i]
-                zeta = zeta_config[i]
-                dedz = torch.autograd.grad(energy, zeta, create_graph=True)[0]
-                zeta.requires_grad_(False)  # no need of grad any more
-
-                if self.use_forces:
-                    dzetadr_forces = sample["dzetadr_forces"].to(device)
-                    f = self._compute_forces(dedz, dzetadr_forces)
-                    forces_config.append(f)
-
-                if self.use_stress:
-                    dzetadr_stress = sample["dzetadr_stress"]
-                    volume = sample["dzetadr_volume"].to(device)
-                    s = self._compute_stress(dedz, dzetadr_stress, volume)
-                    stress_config.append(s)
-
-        self.results["energy"] = energy_config
-        self.results["forces"] = forces_config
-        self.results["stress"] = stress_config
-        return {
-            "energy": energy_config,
-            "forces": forces_config,
-            "stress": stress_config,
-        }
+        return energy_atom
 
     @property
     def model(self):
@@ -1,4 +1,11 @@
 from .dataset import Configuration, Dataset
-from .extxyz import read_extxyz, write_extxyz
+from .extxyz import index_extxyz, iread_extxyz, read_extxyz, write_extxyz
 
-__all__ = ["Configuration", "Dataset", "read_extxyz", "write_extxyz"]
+__all__ = [
+    "Configuration",
+    "Dataset",
+    "index_extxyz",
+    "iread_extxyz",
+    "read_extxyz",
+    "write_extxyz",
+]
@@ -1,12 +1,15 @@
 import copy
 import os
+from collections import OrderedDict
+from collections.abc import Sequence
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 from loguru import logger
 
-from kliff.dataset.extxyz import read_extxyz, write_extxyz
+from kliff import parallel
+from kliff.dataset.extxyz import index_extxyz, iread_extxyz, read_extxyz, write_extxyz
 from kliff.dataset.weight import Weight
 from kliff.utils import to_path
 
@@ -76,19 +79,75 @@ class Configuration:
         """
         Read configuration from file.
 
+        If the file stores multiple configurations (frames), only the first one is
+        read; use :meth:`from_file_frames` to read all of them.
+
         Args:
             filename: Path to the file that stores the configuration.
             file_format: Format of the file that stores the configuration (e.g. `xyz`).
         """
 
         if file_format == "xyz":
-            cell, species, coords, PBC, energy, forces, stress = read_extxyz(filename)
+            data = read_extxyz(filename)
         else:
             raise ConfigurationError(
                 f"Expect data file_format to be one of {list(SUPPORTED_FORMAT.keys())}, "
                 f"got: {file_format}."
             )
 
+        return cls._from_data(data, weight, str(filename), filename)
+
+    @classmethod
+    def from_file_frames(
+        cls,
+        filename: Path,
+        weight: Optional[Weight] = None,
+        file_format: str = "xyz",
+    ) -> List["Configuration"]:
+        """
+        Read all the configurations (frames) stored in a file.
+
+        If the file stores a single configuration, its identifier is the filename, the
+        same as :meth:`from_file`; otherwise, the identifier of the i-th configuration
+        is ``<filename>@<i>``.
+
+        Args:
+            filename: Path to the file that stores the configurations.
+            weight: an instance that computes the weight of the configuration in the
+                loss function. Each configuration gets its own copy.
+            file_format: Format of the file that stores the configuration (e.g. `xyz`).
+        """
+        if file_format == "xyz":
+            frames = list(iread_extxyz(filename))
+        else:
+            raise ConfigurationError(
+                f"Expect data file_format to be one of {list(SUPPORTED_FORMAT.keys())}, "
+                f"got: {file_format}."
+            )
+
+        if len(frames) == 1:
+            identifiers = [str(filename)]
+        else:
+            identifiers = [f"{filename}@{i}" for i in range(len(frames))]
+
+        return [
+            cls._from_data(data, copy.copy(weight), identifier, filename)
+            for data, identifier in zip(frames, identifiers)
+        ]
+
+    @classmethod
+    def _from_data(
+        cls,
+        data: Tuple,
+        weight: Optional[Weight],
+        identifier: str,
+        filename: Path,
+    ):
+        """
+        Create a configuration from the data returned by the file readers.
+        """
+        cell, species, coords, PBC, energy, forces, stress = data
+
         cell = np.asarray(cell)
         species = [str(i) for i in species]
         coords = np.asarray(coords)
@@ -106,19 +165,21 @@ class Configuration:
             forces,
             stress,
             weight,
-            identifier=str(filename),
+            identifier=identifier,
         )
         self._path = to_path(filename)
 
         return self
 
-    def to_file(self, filename: Path, file_format: str = "xyz"):
+    def to_file(self, filename: Path, file_format: str = "xyz", append: bool = False):
         """
         Write the configuration to file.
 
         Args:
             filename: Path to the file that stores the configuration.
             file_format: Format of the file that stores the configuration (e.g. `xyz`).
+            append: If `True`, append the configuration as a new frame to the end of
+                the file, instead of overwriting it.
         """
         filename = to_path(filename)
         if file_format == "xyz":
@@ -131,6 +192,7 @@ class Configuration:
                 self._energy,
                 self._forces,
                 self._stress,
+                append,
             )
         else:
             raise ConfigurationError(
@@ -310,10 +372,16 @@ class Dataset:
         path: Path of a file storing a configuration or filename to a directory containing
             multiple files. If given a directory, all the files in this directory and its
             subdirectories with the extension corresponding to the specified file_format
-            will be read.
+            will be read. A file may store multiple configurations (frames), e.g. an
+            extended xyz trajectory, and all of them are read.
         weight: an instance that computes the weight of the configuration in the loss
             function.
         file_format: Format of the file that stores the configuration, e.g. `xyz`.
+        nprocs: Number of processes used to read (or index, if `lazy=True`) the files.
+        lazy: If `True`, only an index of the configurations (file and position in the
+            file) is built at initialization, and a configuration is read from disk when
+            it is accessed. See :class:`~kliff.dataset.dataset.LazyConfigurations`.
+        cache_size: Maximum number of configurations kept in memory when `lazy=True`.
     """
 
     def __init__(
@@ -321,15 +389,22 @@ class Dataset:
         path: Optional[Path] = None,
         weight: Optional[Weight] = None,
         file_format="xyz",
+        nprocs: int = 1,
+        lazy: bool = False,
+        cache_size: int = 1024,
     ):
         self.file_format = file_format
+        self.nprocs = nprocs
+        self.lazy = lazy
 
-        if path is not None:
-            self.configs = self._read(path, weight, file_format)
-
+        if lazy:
+            self.configs = LazyConfigurations(cache_size=cache_size)
         else:
             self.configs = []
 
+        if path is not None:
+            self.add_configs(path, weight)
+
     def add_configs(self, path: Path, weight: Optional[Weight] = None):
         """
         Read configurations from filename and added them to the existing set of
@@ -343,12 +418,20 @@ class Dataset:
                 function.
         """
 
-        configs = self._read(path, weight, self.file_format)
-        self.configs.extend(configs)
+        if self.lazy:
+            index = self._index(path, self.file_format, self.nprocs)
+            self.configs.add(index, weight, self.file_format)
+            logger.info(f"{len(index)} configurations indexed from {path}")
+        else:
+            configs = self._read(path, weight, self.file_format, self.nprocs)
+            self.configs.extend(configs)
 
     def get_configs(self) -> List[Configuration]:
         """
         Get the configurations.
+
+        If `lazy=True`, this is a :class:`~kliff.dataset.dataset.LazyConfigurations`,
+        which can be indexed and iterated over like a list.
         """
         return self.configs
 
@@ -359,10 +442,55 @@ class Dataset:
         return len(self.configs)
 
     @staticmethod
-    def _read(path: Path, weight: Optional[Weight] = None, file_format: str = "xyz"):
+    def _read(
+        path: Path,
+        weight: Optional[Weight] = None,
+        file_format: str = "xyz",
+        nprocs: int = 1,
+    ):
         """
         Read atomic configurations from path.
         """
+        all_files = Dataset._get_files(path, file_format)
+
+        if nprocs == 1:
+            configs = _read_files(all_files, weight, file_format)
+        else:
+            rslt = parallel.parmap1(
+                _read_files,
+                _split_files(all_files, nprocs),
+                weight,
+                file_format,
+                nprocs=nprocs,
+            )
+            configs = [conf for chunk in rslt for conf in chunk]
+
+        logger.info(f"{len(configs)} configurations read from {path}")
+
+        return configs
+
+    @staticmethod
+    def _index(path: Path, file_format: str = "xyz", nprocs: int = 1):
+        """
+        Index atomic configurations in path, without reading them.
+        """
+        all_files = Dataset._get_files(path, file_format)
+
+        if nprocs == 1:
+            index = _index_files(all_files)
+        else:
+            rslt = parallel.parmap1(
+                _index_files, _split_files(all_files, nprocs), nprocs=nprocs
+            )
+            index = [entry for chunk in rslt for entry in chunk]
+
+        return index
+
+    @staticmethod
+    def _get_files(path: Path, file_format: str = "xyz") -> List[Path]:
+        """
+        Get all the files storing atomic configurations in path.
+        """
         try:
             extension = SUPPORTED_FORMAT[file_format]
         except KeyError:
@@ -385,19 +513,122 @@ class Dataset:
             parent = path.parent
             all_files = [path]
 
-        configs = [
-            Configuration.from_file(f, copy.copy(weight), file_format)
-            for f in all_files
-        ]
-
-        if len(configs) <= 0:
+        if len(all_files) <= 0:
             raise DatasetError(
                 f"No dataset file with file format `{file_format}` found at {parent}."
             )
 
-        logger.info(f"{len(configs)} configurations read from {path}")
+        return all_files
 
-        return configs
+
+class LazyConfigurations(Sequence):
+    """
+    A list-like collection of configurations that are read from disk on access.
+
+    Only the file and byte offset of each configuration are kept. When a configuration
+    is accessed, it is read and stored in a least-recently-used cache of at most
+    `cache_size` configurations. Modifications to a configuration (e.g. its weight)
+    are lost once it is evicted from the cache.
+
+    Args:
+        cache_size: Maximum number of configurations kept in memory.
+    """
+
+    def __init__(self, cache_size: int = 1024):
+        self.cache_size = cache_size
+
+        # (filename, offset, identifier, weight, file_format) of each configuration
+        self._index = []
+        self._cache = OrderedDict()
+
+    def add(
+        self,
+        index: List[Tuple[Path, int, str]],
+        weight: Optional[Weight] = None,
+        file_format: str = "xyz",
+    ):
+        """
+        Add configurations given by (filename, offset, identifier) to the collection.
+        """
+        self._index.extend(
+            (filename, offset, identifier, weight, file_format)
+            for filename, offset, identifier in index
+        )
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"Configuration index {index} out of range.")
+
+        try:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        except KeyError:
+            pass
+
+        conf = self._load(index)
+        self._cache[index] = conf
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return conf
+
+    def _load(self, index: int) -> Configuration:
+        filename, offset, identifier, weight, file_format = self._index[index]
+        if file_format == "xyz":
+            data = read_extxyz(filename, offset)
+        else:
+            raise DatasetError(
+                f"Expect data file_format to be one of {list(SUPPORTED_FORMAT.keys())}, "
+                f"got: {file_format}."
+            )
+        return Configuration._from_data(data, copy.copy(weight), identifier, filename)
+
+
+def _read_files(
+    files: List[Path], weight: Optional[Weight] = None, file_format: str = "xyz"
+) -> List[Configuration]:
+    """
+    Read all configurations in the files.
+    """
+    configs = []
+    for f in files:
+        configs.extend(Configuration.from_file_frames(f, weight, file_format))
+    return configs
+
+
+def _index_files(files: List[Path]) -> List[Tuple[Path, int, str]]:
+    """
+    Get (filename, offset, identifier) of all configurations in the files.
+    """
+    index = []
+    for f in files:
+        offsets = index_extxyz(f)
+        if len(offsets) == 1:
+            index.append((f, offsets[0], str(f)))
+        else:
+            index.extend((f, o, f"{f}@{i}") for i, o in enumerate(offsets))
+    return index
+
+
+def _split_files(files: List[Path], nprocs: int) -> List[List[Path]]:
+    """
+    Split files into chunks, a few for each process, to reduce the communication.
+    """
+    nchunks = min(len(files), 4 * nprocs)
+    bounds = np.linspace(0, len(files), nchunks + 1).astype(int)
+    return [files[b:e] for b, e in zip(bounds[:-1], bounds[1:])]
 
 
 class ConfigurationError(Exception):
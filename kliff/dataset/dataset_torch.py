@@ -1,6 +1,7 @@
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Any, Callable, Dict, List, Optional
 
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 
@@ -12,7 +13,7 @@ class FingerprintsDataset(Dataset):
     Atomic environment fingerprints dataset used by torch models.
 
     Args:
-        filename: to the fingerprints file.
+        filename: to the fingerprints store directory or the fingerprints pickle file.
         transform: transform to be applied on a sample.
     """
 
@@ -30,18 +31,136 @@ class FingerprintsDataset(Dataset):
         return sample
 
 
-def fingerprints_collate_fn(batch):
+class FingerprintsBatch(list):
+    """
+    A batch of fingerprints samples, collated by :meth:`fingerprints_collate_fn`.
+
+    The batch is a list of the samples (each a dict of tensors), so it can be indexed
+    and iterated over as before. In addition, the samples are packed into tensors over
+    the whole batch, which are available as attributes. Let `B` be the number of
+    configurations in the batch, `N` the total number of atoms, and `D` the feature
+    dimension:
+
+    - zeta: fingerprints of all atoms, shape (N, D)
+    - natoms: number of atoms of each configuration, shape (B,)
+    - atom_config: index of the configuration each atom belongs to, shape (N,)
+    - energy: reference energy, shape (B,)
+    - config_weight: configuration weight, shape (B,)
+    - energy_weight: energy weight, shape (B,)
+
+    If forces are used:
+
+    - forces: reference forces, shape (N, 3)
+    - forces_weight: forces weight, shape (N, 3)
+    - dzetadr_forces, dzetadr_forces_atom, dzetadr_forces_neigh: gradients of the
+      fingerprints w.r.t. atomic coordinates in the sparse format (see
+      :class:`~kliff.descriptors.descriptor.SparseGradient`), with atom indices
+      offset to index into the atoms of the batch. Dense gradients are converted to
+      this format.
+
+    If stress is used:
+
+    - stress: reference stress, shape (B, 6)
+    - stress_weight: stress weight, shape (B, 6)
+    - dzetadr_stress: gradients of the fingerprints w.r.t. strain, shape (N, D, 6)
+    - volume: volume of each configuration, shape (B,)
+    """
+
+    def __init__(self, samples: List[Dict[str, Any]]):
+        super(FingerprintsBatch, self).__init__(samples)
+
+        natoms = [len(sample["zeta"]) for sample in samples]
+        self.natoms = torch.tensor(natoms, dtype=torch.int64)
+        self.atom_config = torch.repeat_interleave(
+            torch.arange(len(samples)), self.natoms
+        )
+
+        self.zeta = torch.cat([sample["zeta"] for sample in samples])
+        dtype = self.zeta.dtype
+
+        self.energy = torch.stack([sample["energy"].reshape(()) for sample in samples])
+
+        weights = [sample["configuration"].weight for sample in samples]
+        self.config_weight = torch.tensor(
+            [w.config_weight for w in weights], dtype=dtype
+        )
+        self.energy_weight = torch.tensor(
+            [w.energy_weight for w in weights], dtype=dtype
+        )
+
+        if all("dzetadr_forces" in sample for sample in samples):
+            self.forces = torch.cat([sample["forces"] for sample in samples])
+            self.forces_weight = torch.cat(
+                [
+                    _broadcast_weight(w.forces_weight, (n, 3), dtype)
+                    for w, n in zip(weights, natoms)
+                ]
+            )
+            self._pack_dzetadr_forces(samples, natoms)
+        else:
+            self.forces = None
+            self.forces_weight = None
+            self.dzetadr_forces = None
+            self.dzetadr_forces_atom = None
+            self.dzetadr_forces_neigh = None
+
+        if all("dzetadr_stress" in sample for sample in samples):
+            self.stress = torch.stack([sample["stress"] for sample in samples])
+            self.stress_weight = torch.stack(
+                [_broadcast_weight(w.stress_weight, (6,), dtype) for w in weights]
+            )
+            self.dzetadr_stress = torch.cat(
+                [sample["dzetadr_stress"] for sample in samples]
+            )
+            self.volume = torch.stack(
+                [sample["volume"].reshape(()) for sample in samples]
+            )
+        else:
+            self.stress = None
+            self.stress_weight = None
+            self.dzetadr_stress = None
+            self.volume = None
+
+    def _pack_dzetadr_forces(self, samples, natoms):
+        values = []
+        atoms = []
+        neighs = []
+        offset = 0
+        for sample, n in zip(samples, natoms):
+            dzetadr = sample["dzetadr_forces"]
+            if "dzetadr_forces_neigh" in sample:
+                atom = sample["dzetadr_forces_atom"]
+                neigh = sample["dzetadr_forces_neigh"]
+            else:
+                # dense (n, D, 3n) to sparse (n*n, D, 3), with all atom pairs
+                dzetadr = dzetadr.reshape(n, -1, n, 3).transpose(1, 2)
+                dzetadr = dzetadr.reshape(n * n, -1, 3)
+                atom = torch.arange(n).repeat_interleave(n)
+                neigh = torch.arange(n).repeat(n)
+            values.append(dzetadr)
+            atoms.append(atom + offset)
+            neighs.append(neigh + offset)
+            offset += n
+
+        self.dzetadr_forces = torch.cat(values)
+        self.dzetadr_forces_atom = torch.cat(atoms)
+        self.dzetadr_forces_neigh = torch.cat(neighs)
+
+
+def fingerprints_collate_fn(batch: List[Dict[str, Any]]) -> FingerprintsBatch:
     """
     Convert a batch of samples into tensor.
 
     Unlike the default collate_fn(), which stack samples in the batch (requiring each
-    sample having the same dimension), this function does not do the stack.
+    sample having the same dimension), this function converts each sample to tensors,
+    and packs the samples of different sizes into tensors over the whole batch.
 
     Args:
         batch: A batch of samples.
 
     Returns:
-        A list of tensor.
+        A :class:`FingerprintsBatch`, which is a list of samples (dict of tensors),
+        with the packed tensors as attributes.
     """
     tensor_batch = []
     for i, sample in enumerate(batch):
@@ -52,4 +171,16 @@ def fingerprints_collate_fn(batch):
             tensor_sample[key] = value
         tensor_batch.append(tensor_sample)
 
-    return tensor_batch
+    return FingerprintsBatch(tensor_batch)
+
+
+def _broadcast_weight(weight, shape, dtype):
+    """
+    Broadcast a scalar or per-component weight to a tensor of the given shape.
+    """
+    weight = torch.as_tensor(np.asarray(weight), dtype=dtype)
+    return (
+        weight.reshape(-1).expand(shape)
+        if weight.numel() == 1
+        else weight.reshape(shape)
+    )
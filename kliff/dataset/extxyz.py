@@ -1,5 +1,6 @@
+import itertools
 from pathlib import Path
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -8,6 +9,7 @@ from kliff.error import InputError, KeyNotFoundError
 
 def read_extxyz(
     filename: Path,
+    offset: int = 0,
 ) -> Tuple[
     np.ndarray,
     List[str],
@@ -20,8 +22,13 @@ def read_extxyz(
     """
     Read atomic configuration stored in extended xyz file_format.
 
+    If the file contains multiple frames, only the first one is read. Use
+    :func:`iread_extxyz` to read all of them.
+
     Args:
         filename: filename to the extended xyz file
+        offset: byte offset in the file where the frame starts, e.g. obtained from
+            :func:`index_extxyz`; by default, the first frame is read
 
     Returns:
         cell: 3x3 array, supercell lattice vectors
@@ -33,87 +40,218 @@ def read_extxyz(
         stress: 1D array of size 6, stress on the cell in Voigt notation; `None` if not
             provided in file
     """
+    for frame in iread_extxyz(filename, offset):
+        return frame
+
+    raise InputError(f"Corrupted data file {filename}. No configuration found.")
+
+
+def iread_extxyz(
+    filename: Path,
+    offset: int = 0,
+) -> Iterator[
+    Tuple[
+        np.ndarray,
+        List[str],
+        np.ndarray,
+        List[bool],
+        Union[float, None],
+        Union[np.ndarray, None],
+        Union[List[float], None],
+    ]
+]:
+    """
+    Iterate over the atomic configurations (frames) stored in an extended xyz file.
+
+    The file may contain any number of concatenated frames, each consisting of a line
+    giving the number of atoms, a comment line with the key-value pairs, and one line
+    per atom. The atom block of each frame is parsed in a single vectorized step, and
+    frames are read lazily, so arbitrarily long trajectories can be processed.
+
+    Args:
+        filename: filename to the extended xyz file
+        offset: byte offset in the file to start reading from; line numbers in error
+            messages are counted from here
+
+    Returns:
+        An iterator over the frames; each frame is the tuple
+        `(cell, species, coords, PBC, energy, forces, stress)` described in
+        :func:`read_extxyz`.
+    """
     with open(filename, "r") as fin:
-        lines = fin.readlines()
-
-        try:
-            natoms = int(lines[0].split()[0])
-        except ValueError as e:
-            raise InputError(f"{e}.\nCorrupted data at line 1 of file {filename}.")
-
-        # lattice vector
-        line = lines[1].replace("'", '"')
-        cell = _parse_key_value(line, "Lattice", "float", 9, filename)
-        cell = np.reshape(cell, (3, 3))
-
-        # PBC
-        PBC = _parse_key_value(line, "PBC", "int", 3, filename)
-
-        # energy is optional
-        try:
-            in_quotes = _check_in_quotes(line, "Energy", filename)
-            energy = _parse_key_value(line, "Energy", "float", 1, filename, in_quotes)[
-                0
-            ]
-        except KeyNotFoundError:
-            energy = None
-
-        # stress is optional
-        try:
-            stress = _parse_key_value(line, "Stress", "float", 6, filename)
-        except KeyNotFoundError:
-            stress = None
-
-        # body, species symbol, x, y, z (and fx, fy, fz if provided)
-        species = []
-        coords = []
-        forces = []
-
-        # if forces provided
-        line = lines[2].strip().split()
-        if len(line) == 4:
-            has_forces = False
-        elif len(line) == 7:
-            has_forces = True
-        else:
-            raise InputError(f"Corrupted data at line 3 of file {filename}.")
-
-        try:
-            num_lines = 0
-            for line in lines[2:]:
-                num_lines += 1
-                line = line.strip().split()
-                if len(line) != 4 and len(line) != 7:
-                    raise InputError(
-                        f'Corrupted data at line {num_lines + 3} of file "{filename}".'
-                    )
-                if has_forces:
-                    symbol, x, y, z, fx, fy, fz = line
-                    species.append(symbol.lower().capitalize())
-                    coords.append([float(x), float(y), float(z)])
-                    forces.append([float(fx), float(fy), float(fz)])
-                else:
-                    symbol, x, y, z = line
-                    species.append(symbol.lower().capitalize())
-                    coords.append([float(x), float(y), float(z)])
-        except ValueError as e:
-            raise InputError(
-                f"{e}.\nCorrupted data at line {num_lines + 3} of file {filename}."
-            )
+        fin.seek(offset)
+        lineno = 0  # number of lines consumed so far
+        while True:
+            line = fin.readline()
+            lineno += 1
+
+            if not line:
+                break
+            if not line.strip():
+                # allow blank lines between (or after) frames
+                continue
+
+            try:
+                natoms = int(line.split()[0])
+            except ValueError as e:
+                raise InputError(
+                    f"{e}.\nCorrupted data at line {lineno} of file {filename}."
+                )
 
-        if num_lines != natoms:
-            raise InputError(
-                f"Corrupted data file {filename}. Number of atoms is {natoms}, "
-                f"whereas number of data lines is {num_lines}."
-            )
+            header = fin.readline()
+            lineno += 1
+            cell, PBC, energy, stress = _parse_header(header, filename, lineno)
 
-        coords = np.asarray(coords)
-        if has_forces:
-            forces = np.asarray(forces)
-        else:
-            forces = None
+            body = list(itertools.islice(fin, natoms))
+            species, coords, forces = _parse_body(body, natoms, filename, lineno + 1)
+            lineno += natoms
+
+            yield cell, species, coords, PBC, energy, forces, stress
+
+
+def index_extxyz(filename: Path) -> List[int]:
+    """
+    Get the byte offsets of the frames stored in an extended xyz file.
+
+    Only the number of atoms of each frame is parsed, so this is much cheaper than
+    reading the frames. A frame can then be read with
+    ``read_extxyz(filename, offset)``.
+
+    Args:
+        filename: filename to the extended xyz file
 
-        return cell, species, coords, PBC, energy, forces, stress
+    Returns:
+        Byte offset of each frame in the file.
+    """
+    offsets = []
+    with open(filename, "rb") as fin:
+        lineno = 0
+        while True:
+            offset = fin.tell()
+            line = fin.readline()
+            lineno += 1
+
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            try:
+                natoms = int(line.split()[0])
+            except ValueError as e:
+                raise InputError(
+                    f"{e}.\nCorrupted data at line {lineno} of file {filename}."
+                )
+
+            offsets.append(offset)
+
+            # skip the comment line and the atom block
+            for _ in range(natoms + 1):
+                fin.readline()
+            lineno += natoms + 1
+
+    return offsets
+
+
+def _parse_header(
+    line: str, filename: Path, lineno: int
+) -> Tuple[np.ndarray, List[int], Union[float, None], Union[List[float], None]]:
+    """
+    Parse the comment line of a frame to get cell, PBC, energy, and stress.
+    """
+    line = line.replace("'", '"')
+
+    # lattice vector
+    cell = _parse_key_value(line, "Lattice", "float", 9, filename, lineno=lineno)
+    cell = np.reshape(cell, (3, 3))
+
+    # PBC
+    PBC = _parse_key_value(line, "PBC", "int", 3, filename, lineno=lineno)
+
+    # energy is optional
+    try:
+        in_quotes = _check_in_quotes(line, "Energy", filename, lineno)
+        energy = _parse_key_value(
+            line, "Energy", "float", 1, filename, in_quotes, lineno
+        )[0]
+    except KeyNotFoundError:
+        energy = None
+
+    # stress is optional
+    try:
+        stress = _parse_key_value(line, "Stress", "float", 6, filename, lineno=lineno)
+    except KeyNotFoundError:
+        stress = None
+
+    return cell, PBC, energy, stress
+
+
+def _parse_body(
+    lines: List[str], natoms: int, filename: Path, lineno: int
+) -> Tuple[List[str], np.ndarray, Union[np.ndarray, None]]:
+    """
+    Parse the atom block of a frame, each line being species symbol, x, y, z (and fx,
+    fy, fz if provided).
+
+    Args:
+        lines: lines of the atom block
+        natoms: expected number of atoms
+        filename: File name where the lines come from.
+        lineno: line number of the first line of the block in the file
+
+    Returns:
+        species: species of atoms
+        coords: Nx3 array, coordinates of atoms
+        forces: Nx3 array, forces on atoms; `None` if not provided
+    """
+    if len(lines) != natoms:
+        raise InputError(
+            f"Corrupted data file {filename}. Number of atoms is {natoms}, "
+            f"whereas number of data lines is {len(lines)}."
+        )
+    if natoms == 0:
+        return [], np.zeros((0, 3)), None
+
+    # if forces provided
+    ncols = len(lines[0].split())
+    if ncols == 4:
+        has_forces = False
+    elif ncols == 7:
+        has_forces = True
+    else:
+        raise InputError(f"Corrupted data at line {lineno} of file {filename}.")
+
+    tokens = "".join(lines).split()
+    if len(tokens) != natoms * ncols:
+        for i, line in enumerate(lines):
+            if len(line.split()) != ncols:
+                raise InputError(
+                    f'Corrupted data at line {lineno + i} of file "{filename}".'
+                )
+
+    symbols = tokens[0::ncols]
+    del tokens[0::ncols]
+    try:
+        values = np.array(tokens, dtype=np.double).reshape(natoms, ncols - 1)
+    except ValueError as e:
+        for i, line in enumerate(lines):
+            try:
+                [float(x) for x in line.split()[1:]]
+            except ValueError:
+                raise InputError(
+                    f"{e}.\nCorrupted data at line {lineno + i} of file {filename}."
+                )
+        raise InputError(f"{e}.\nCorrupted data in file {filename}.")
+
+    # normalize the case of species symbols, e.g. `si` and `SI` to `Si`
+    unique_symbols, inverse = np.unique(symbols, return_inverse=True)
+    unique_species = [s.lower().capitalize() for s in unique_symbols]
+    species = [unique_species[i] for i in inverse]
+
+    coords = np.ascontiguousarray(values[:, :3])
+    forces = np.ascontiguousarray(values[:, 3:]) if has_forces else None
+
+    return species, coords, forces
 
 
 def write_extxyz(
@@ -125,6 +263,7 @@ def write_extxyz(
     energy: Optional[float] = None,
     forces: Optional[np.ndarray] = None,
     stress: Optional[List[float]] = None,
+    append: bool = False,
 ):
     """
     Write configuration info to a file in extended xyz file_format.
@@ -139,9 +278,11 @@ def write_extxyz(
         forces: Nx3 array, forces on atoms; If `None`, not write to file
         stress: 1D array of size 6, stress on the cell in Voigt notation; If `None`,
             not write to file
+        append: If `True`, append the configuration as a new frame to the end of the
+            file, instead of overwriting it.
     """
 
-    with open(filename, "w") as fout:
+    with open(filename, "a" if append else "w") as fout:
         # first line (number of atoms)
         natoms = len(species)
         fout.write("{}\n".format(natoms))
@@ -194,7 +335,13 @@ def write_extxyz(
 
 
 def _parse_key_value(
-    line: str, key: str, dtype: str, size: int, filename: Path, in_quotes: bool = True
+    line: str,
+    key: str,
+    dtype: str,
+    size: int,
+    filename: Path,
+    in_quotes: bool = True,
+    lineno: int = 2,
 ) -> List[Any]:
     """
     Given key, parse a string like ``other stuff key="value" other stuff`` to get value.
@@ -207,12 +354,14 @@ def _parse_key_value(
         dtype: Expected data type of value, `int` or `float`.
         size: Expected size of value.
         filename: File name where the line comes from.
+        in_quotes: Whether the value is enclosed in quotes.
+        lineno: Line number of the line in the file.
 
     Returns:
         Values associated with key.
     """
     line = line.strip()
-    key = _check_key(line, key, filename)
+    key = _check_key(line, key, filename, lineno)
     try:
         value = line[line.index(key) :]
         if in_quotes:
@@ -225,45 +374,51 @@ def _parse_key_value(
             value = value[: value.index(" ")]
         value = value.split()
     except Exception as e:
-        raise InputError(f"{e}.\nCorrupted {key} data at line 2 of file {filename}.")
+        raise InputError(
+            f"{e}.\nCorrupted {key} data at line {lineno} of file {filename}."
+        )
 
     if len(value) != size:
         raise InputError(
-            f"Incorrect size of {key} at line 2 of file {filename};\n"
+            f"Incorrect size of {key} at line {lineno} of file {filename};\n"
             f"required: {size}, provided: {len(value)}. Possibly, the quotes not match."
         )
     try:
         if dtype == "float":
             value = [float(i) for i in value]
         elif dtype == "int":
-            if(all(i in ['T','F'] for i in value)):
-                value = [1 if i =='T' else 0 for i in value]
+            if all(i in ["T", "F"] for i in value):
+                value = [1 if i == "T" else 0 for i in value]
             else:
                 value = [int(i) for i in value]
     except Exception as e:
-        raise InputError(f"{e}.\nCorrupted {key} data at line 2 of file {filename}.")
+        raise InputError(
+            f"{e}.\nCorrupted {key} data at line {lineno} of file {filename}."
+        )
 
     return value
 
 
-def _check_key(line, key, filename):
+def _check_key(line, key, filename, lineno=2):
     """
     Check whether a key or its lowercase counter part is in line.
     """
     if key not in line:
         key_lower = key.lower()
         if key_lower not in line:
-            raise KeyNotFoundError(f"{key} not found at line 2 of file {filename}.")
+            raise KeyNotFoundError(
+                f"{key} not found at line {lineno} of file {filename}."
+            )
         else:
             key = key_lower
     return key
 
 
-def _check_in_quotes(line, key, filename):
+def _check_in_quotes(line, key, filename, lineno=2):
     """
     Check whether ``key=value`` or ``key="value"`` in line.
     """
-    key = _check_key(line, key, filename)
+    key = _check_key(line, key, filename, lineno)
     value = line[line.index(key) :]
     value = value[value.index("=") + 1 :]
     value = value.lstrip(" ")
@@ -1,5 +1,5 @@
 from .bispectrum.bispectrum import Bispectrum
-from .descriptor import Descriptor
+from .descriptor import Descriptor, FingerprintsCache
 from .symmetry_function.sym_fn import SymmetryFunction
 
-__all__ = ["Descriptor", "SymmetryFunction", "Bispectrum"]
+__all__ = ["Descriptor", "FingerprintsCache", "SymmetryFunction", "Bispectrum"]
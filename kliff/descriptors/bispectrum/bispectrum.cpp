@@ -13,10 +13,14 @@
 
 #include "bispectrum.hpp"
 
+#include <algorithm>
 #include <cmath>
 #include <complex>
+#include <functional>
 #include <limits>
 #include <numeric>
+#include <thread>
+#include <vector>
 
 #ifdef MY_PI
 #undef MY_PI
@@ -273,20 +277,73 @@ void Bispectrum::compute_B(double const * coordinates,
                            int const Natoms,
                            int const Ncontrib,
                            double * const zeta,
-                           double * const dzeta_dr)
+                           double * const dzeta_dr,
+                           int const num_threads,
+                           int const * shifts,
+                           double const * cell)
+{
+  // offset of the neighbors of each atom in the 1D neighbor list
+  std::vector<int> neighstart(Ncontrib + 1, 0);
+  for (int i = 0; i < Ncontrib; ++i)
+  {
+    neighstart[i + 1] = neighstart[i] + numneigh[i];
+  }
+
+  int const nthreads = std::max(1, std::min(num_threads, Ncontrib));
+
+  // each thread works on a contiguous range of atoms, whose zeta and dzeta_dr
+  // do not overlap with those of the other threads
+  auto work = [&](Bispectrum & bs, int const t) {
+    bs.compute_B_atoms(static_cast<long>(Ncontrib) * t / nthreads,
+                       static_cast<long>(Ncontrib) * (t + 1) / nthreads,
+                       coordinates,
+                       particleSpecies,
+                       neighlist,
+                       neighstart.data(),
+                       numneigh,
+                       image,
+                       Natoms,
+                       Ncontrib,
+                       zeta,
+                       dzeta_dr,
+                       shifts,
+                       cell);
+  };
+
+  std::vector<Bispectrum> workers(nthreads - 1, *this);
+  std::vector<std::thread> threads;
+  for (int t = 1; t < nthreads; ++t)
+  {
+    threads.emplace_back(work, std::ref(workers[t - 1]), t);
+  }
+  work(*this, 0);
+  for (auto & thread : threads) { thread.join(); }
+}
+
+void Bispectrum::compute_B_atoms(int const first,
+                                 int const last,
+                                 double const * coordinates,
+                                 int const * particleSpecies,
+                                 int const * neighlist,
+                                 int const * neighstart,
+                                 int const * numneigh,
+                                 int const * image,
+                                 int const Natoms,
+                                 int const Ncontrib,
+                                 double * const zeta,
+                                 double * const dzeta_dr,
+                                 int const * shifts,
+                                 double const * cell)
 {
   // prepare data
   Array2DView<double> coords(Natoms, DIM, coordinates);
 
-  int start = 0;
-  for (int i = 0; i < Ncontrib; i++)
+  for (int i = first; i < last; i++)
   {
     int const numNei = numneigh[i];
-    int const * const ilist = neighlist + start;
+    int const * const ilist = neighlist + neighstart[i];
     int const iSpecies = particleSpecies[i];
 
-    start += numNei;
-
     // insure rij, inside, wj, and rcutij are of size jnum
     grow_rij(numNei);
 
@@ -311,6 +368,15 @@ void Bispectrum::compute_B(double const * coordinates,
       {
         rvec[dim] = coords(j, dim) - coords(i, dim);
       }
+      if (shifts)
+      {
+        int const * const s = shifts + (neighstart[i] + jj) * DIM;
+        for (int dim = 0; dim < DIM; ++dim)
+        {
+          rvec[dim] += s[0] * cell[dim] + s[1] * cell[DIM + dim]
+                       + s[2] * cell[2 * DIM + dim];
+        }
+      }
 
       double const rsq
           = rvec[0] * rvec[0] + rvec[1] * rvec[1] + rvec[2] * rvec[2];
@@ -156,6 +156,16 @@ class Bispectrum
    * \param Ncontrib
    * \param zeta
    * \param dzetadr
+   * \param num_threads Number of threads to split the atoms over
+   * \param shifts Integer cell shift vector of each neighbor in \c neighlist;
+   * if not \c nullptr, there are no padding atoms, and a neighbor \c j is at
+   * the coordinates of atom \c j displaced by its shift vector times \c cell
+   * \param cell Cell of the configuration, each row a lattice vector; only used
+   * with \c shifts
+   *
+   * \note
+   * Each additional thread works on its own copy of this object, since the
+   * intermediate arrays (Ui, Zi, ...) are stored as class members.
    */
   void compute_B(double const * coordinates,
                  int const * particleSpecies,
@@ -165,7 +175,35 @@ class Bispectrum
                  int const Natoms,
                  int const Ncontrib,
                  double * const zeta,
-                 double * const dzetadr);
+                 double * const dzetadr,
+                 int const num_threads = 1,
+                 int const * shifts = nullptr,
+                 double const * cell = nullptr);
+
+  /*!
+   * \brief Computes bispectrum for the contributing atoms in range
+   * [first, last)
+   *
+   * \param first Index of the first atom
+   * \param last One past the index of the last atom
+   * \param neighstart Offset of the neighbors of each atom in \c neighlist
+   *
+   * \sa compute_B for the other parameters.
+   */
+  void compute_B_atoms(int const first,
+                       int const last,
+                       double const * coordinates,
+                       int const * particleSpecies,
+                       int const * neighlist,
+                       int const * neighstart,
+                       int const * numneigh,
+                       int const * image,
+                       int const Natoms,
+                       int const Ncontrib,
+                       double * const zeta,
+                       double * const dzetadr,
+                       int const * shifts,
+                       double const * cell);
 
   /*!
    * \brief Set the cutoff
@@ -36,6 +36,11 @@ class Bispectrum(Descriptor):
         Data type for the generated fingerprints, such as ``np.float32`` and
         ``np.float64``.
 
+    num_threads: int (optional)
+        Number of threads used by the C++ kernels to compute the descriptor values of
+        the atoms in a configuration. The kernels release the GIL, so several
+        configurations can also be transformed concurrently from Python threads.
+
     Example
     -------
     >>> cut_name = 'cos'
@@ -61,10 +66,12 @@ class Bispectrum(Descriptor):
         hyperparams=None,
         normalize=True,
         dtype=np.float32,
+        num_threads=1,
     ):
         super(Bispectrum, self).__init__(
             cut_dists, cut_name, hyperparams, normalize, dtype
         )
+        self.num_threads = num_threads
 
         self.update_hyperparams(self.hyperparams)
 
@@ -95,13 +102,16 @@ class Bispectrum(Descriptor):
         # neighbor list
         infl_dist = max(self.cutoff.values())
 
-        nei = NeighborList(conf, infl_dist, padding_need_neigh=False)
+        # periodic images referred to by cell shift vectors, without padding atoms
+        nei = NeighborList(conf, infl_dist, use_shifts=True)
 
         coords = nei.coords
         image = nei.image
-        species = np.asarray([self.species_code[i] for i in nei.species], dtype=np.intc)
+        species = nei.get_species_code(self.species_code)
 
-        numneigh, neighlist = nei.get_numneigh_and_neighlist_1D()
+        numneigh, _, neighlist = nei.get_csr()
+        shifts = nei.get_shifts()
+        cell = np.asarray(conf.cell, dtype=np.double)
 
         Natoms = len(coords)
         Ncontrib = conf.get_num_atoms()
@@ -109,13 +119,33 @@ class Bispectrum(Descriptor):
 
         if grad:
             zeta, dzeta_dr = self._cdesc.compute_zeta_and_dzeta_dr(
-                coords, species, neighlist, numneigh, image, Natoms, Ncontrib, Ndesc
+                coords,
+                species,
+                neighlist,
+                numneigh,
+                image,
+                Natoms,
+                Ncontrib,
+                Ndesc,
+                self.num_threads,
+                shifts,
+                cell,
             )
             # reshape to 4D array
             dzeta_dr = dzeta_dr.reshape(Ncontrib, Ndesc, Ncontrib, 3)
         else:
             zeta = self._cdesc.compute_zeta(
-                coords, species, neighlist, numneigh, image, Natoms, Ncontrib, Ndesc
+                coords,
+                species,
+                neighlist,
+                numneigh,
+                image,
+                Natoms,
+                Ncontrib,
+                Ndesc,
+                self.num_threads,
+                shifts,
+                cell,
             )
             dzeta_dr = None
 
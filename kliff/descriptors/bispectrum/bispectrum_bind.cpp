@@ -5,6 +5,36 @@
 
 namespace py = pybind11;
 
+namespace
+{
+using IntArray = py::array_t<int, py::array::c_style | py::array::forcecast>;
+using DoubleArray
+    = py::array_t<double, py::array::c_style | py::array::forcecast>;
+
+// Get the cell shift vectors of the neighbors and the cell, kept alive by
+// shifts_arr and cell_arr; the pointers are nullptr if shifts is None.
+void get_shifts(py::object shifts,
+                py::object cell,
+                IntArray & shifts_arr,
+                DoubleArray & cell_arr,
+                int const *& shifts_ptr,
+                double const *& cell_ptr)
+{
+  shifts_ptr = nullptr;
+  cell_ptr = nullptr;
+  if (shifts.is_none()) { return; }
+
+  shifts_arr = shifts.cast<IntArray>();
+  if (!cell.is_none()) { cell_arr = cell.cast<DoubleArray>(); }
+  if (cell_arr.size() != 9)
+  {
+    throw std::runtime_error("\"cell\" is required with \"shifts\".");
+  }
+  shifts_ptr = shifts_arr.data();
+  cell_ptr = cell_arr.data();
+}
+}  // namespace
+
 PYBIND11_MODULE(bs, m)
 {
   m.doc() = "Bispectrum descriptor.";
@@ -43,19 +73,37 @@ PYBIND11_MODULE(bs, m)
              py::array_t<int> image,
              int Natoms,
              int Ncontrib,
-             int Ndescriptor) {
+             int Ndescriptor,
+             int num_threads,
+             py::object shifts,
+             py::object cell) {
             // create empty vectors to hold return data
             std::vector<double> zeta(Ncontrib * Ndescriptor, 0.0);
 
-            d.compute_B(coords.data(0),
-                        species.data(0),
-                        neighlist.data(0),
-                        numneigh.data(0),
-                        image.data(0),
-                        Natoms,
-                        Ncontrib,
-                        zeta.data(),
-                        nullptr);
+            IntArray shifts_arr;
+            DoubleArray cell_arr;
+            int const * shifts_ptr;
+            double const * cell_ptr;
+            get_shifts(
+                shifts, cell, shifts_arr, cell_arr, shifts_ptr, cell_ptr);
+
+            {
+              // no Python objects are touched during the computation
+              py::gil_scoped_release release;
+
+              d.compute_B(coords.data(0),
+                          species.data(0),
+                          neighlist.data(0),
+                          numneigh.data(0),
+                          image.data(0),
+                          Natoms,
+                          Ncontrib,
+                          zeta.data(),
+                          nullptr,
+                          num_threads,
+                          shifts_ptr,
+                          cell_ptr);
+            }
 
             // pack zeta into a buffer that numpy array can understand
             auto zeta_2D = py::array(py::buffer_info(
@@ -78,7 +126,10 @@ PYBIND11_MODULE(bs, m)
           py::arg("image").noconvert(),
           py::arg("Natoms"),
           py::arg("Ncontrib"),
-          py::arg("Ndescriptor"))
+          py::arg("Ndescriptor"),
+          py::arg("num_threads") = 1,
+          py::arg("shifts") = py::none(),
+          py::arg("cell") = py::none())
 
       .def(
           "compute_zeta_and_dzeta_dr",
@@ -90,21 +141,39 @@ PYBIND11_MODULE(bs, m)
              py::array_t<int> image,
              int Natoms,
              int Ncontrib,
-             int Ndescriptor) {
+             int Ndescriptor,
+             int num_threads,
+             py::object shifts,
+             py::object cell) {
             // create empty vectors to hold return data
             std::vector<double> zeta(Ncontrib * Ndescriptor, 0.0);
             std::vector<double> dzeta_dr(Ncontrib * Ndescriptor * Ncontrib * 3,
                                          0.0);
 
-            d.compute_B(coords.data(0),
-                        species.data(0),
-                        neighlist.data(0),
-                        numneigh.data(0),
-                        image.data(0),
-                        Natoms,
-                        Ncontrib,
-                        zeta.data(),
-                        dzeta_dr.data());
+            IntArray shifts_arr;
+            DoubleArray cell_arr;
+            int const * shifts_ptr;
+            double const * cell_ptr;
+            get_shifts(
+                shifts, cell, shifts_arr, cell_arr, shifts_ptr, cell_ptr);
+
+            {
+              // no Python objects are touched during the computation
+              py::gil_scoped_release release;
+
+              d.compute_B(coords.data(0),
+                          species.data(0),
+                          neighlist.data(0),
+                          numneigh.data(0),
+                          image.data(0),
+                          Natoms,
+                          Ncontrib,
+                          zeta.data(),
+                          dzeta_dr.data(),
+                          num_threads,
+                          shifts_ptr,
+                          cell_ptr);
+            }
 
             // pack zeta into a buffer that numpy array can understand
             auto zeta_2D = py::array(py::buffer_info(
@@ -145,5 +214,8 @@ PYBIND11_MODULE(bs, m)
           py::arg("Natoms"),
           py::arg("Ncontrib"),
           py::arg("Ndescriptor"),
+          py::arg("num_threads") = 1,
+          py::arg("shifts") = py::none(),
+          py::arg("cell") = py::none(),
           "Return (zeta, dzeta_dr)");
 }
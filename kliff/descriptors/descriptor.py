@@ -1,14 +1,43 @@
+import hashlib
+import json
+import os
 import pickle
-import sys
+import shutil
+import warnings
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import numpy as np
 from loguru import logger
 
 from kliff import parallel
 from kliff.dataset import Configuration
-from kliff.utils import create_directory, pickle_dump, to_path
+from kliff.neighbor import NeighborListCache
+from kliff.utils import create_directory, pickle_dump, pickle_load, to_path
+
+
+class SparseGradient(NamedTuple):
+    """
+    Gradient of the fingerprints of a configuration w.r.t. atomic coordinates, stored
+    in a sparse neighbor-indexed form.
+
+    The fingerprint of an atom only depends on the coordinates of the atom itself and
+    its neighbors, so instead of a dense array of shape (num_atoms, num_descriptors,
+    num_atoms*3), only the nonzero blocks are stored. Entry `k` gives the gradient of
+    the fingerprint of atom `atom[k]` w.r.t. the coordinates of atom `neigh[k]`.
+
+    Attributes:
+        value: 3D array of shape (nnz, num_descriptors, 3).
+        atom: 1D int array of shape (nnz,), the atom whose fingerprint is
+            differentiated.
+        neigh: 1D int array of shape (nnz,), the (contributing) atom w.r.t. whose
+            coordinates the fingerprint is differentiated.
+    """
+
+    value: np.ndarray
+    atom: np.ndarray
+    neigh: np.ndarray
 
 
 class Descriptor:
@@ -56,6 +85,9 @@ class Descriptor:
         self.normalize = normalize
         self.dtype = dtype
 
+        # whether `transform` returns the gradients for forces as `SparseGradient`
+        self.sparse_grad = False
+
         # size, mean, and stdev of fingerprints; mean and stdev will be used only when
         # `normalize=True`
         self.size = None
@@ -67,219 +99,307 @@ class Descriptor:
         configs: List[Configuration],
         fit_forces: bool = False,
         fit_stress: bool = False,
-        fingerprints_filename: Union[Path, str] = "fingerprints.pkl",
+        fingerprints_filename: Union[Path, str] = "fingerprints",
         fingerprints_mean_stdev_filename: Optional[Union[Path, str]] = None,
-        use_welford_method: bool = False,
+        use_welford_method: Optional[bool] = None,
         nprocs: int = 1,
+        cache: Optional["FingerprintsCache"] = None,
     ):
         """
         Convert all configurations to their fingerprints.
 
+        Each configuration is transformed only once. If the mean and standard deviation
+        of the fingerprints are needed for normalization, the fingerprints are first
+        written to a temporary store without normalization, while their mean and
+        standard deviation are accumulated; they are then normalized in a second pass
+        over the stored arrays. The temporary store is in double precision and is only
+        removed once the normalized fingerprints are written, so the peak disk usage is
+        that of both stores, i.e. twice that of the fingerprints if the descriptor is
+        in double precision as well.
+
         Args:
             configs: Dataset configurations
             fit_forces: Whether to compute the gradient of fingerprints w.r.t. atomic
                 coordinates so as to compute forces.
             fit_stress: Whether to compute the gradient of fingerprints w.r.t. atomic
                 coordinates so as to compute stress.
-            use_welford_method: Whether to compute mean and standard deviation using the
-                Welford method, which is memory efficient. See
-                https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
-            fingerprints_filename: Path to dump fingerprints to a pickle file.
+            fingerprints_filename: Path to dump fingerprints. The fingerprints are
+                stored in a directory of binary arrays (see
+                :class:`~kliff.descriptors.descriptor.FingerprintsStore`). If the path
+                ends with `.pkl`, they are instead written as a stream of pickled
+                dictionaries, one for each configuration.
             fingerprints_mean_stdev_filename: Path to dump the mean and standard
                 deviation of the fingerprints as a pickle file. If `normalize=False`
                 for the descriptor, this is ignored.
-
+            use_welford_method: Deprecated and ignored, with a `DeprecationWarning` if
+                given. The mean and standard deviation are always accumulated one
+                configuration at a time, which is memory efficient.
             nprocs: Number of processes used to generate the fingerprints. If `1`, run
                 in serial mode, otherwise `nprocs` processes will be forked via
                 multiprocessing to do the work.
+            cache: Cache of the fingerprints of configurations. Only the configurations
+                not in the cache are transformed, and their fingerprints are added to
+                the cache.
         """
+        if use_welford_method is not None:
+            warnings.warn(
+                "`use_welford_method` is deprecated and ignored; the mean and stdev of "
+                "the fingerprints are always accumulated one configuration at a time.",
+                category=DeprecationWarning,
+                stacklevel=2,
+            )
+
         if self.mean is not None and self.stdev is not None:
             has_mean_stdev = True
         else:
             has_mean_stdev = False
 
-        # compute mean and stdev
-        if self.normalize and not has_mean_stdev:
-            logger.info("Start computing mean and stdev of fingerprints.")
-
-            if use_welford_method:
-                logger.info(
-                    "Computing fingerprint mean and stdev using the Welford method."
-                )
-                self.mean, self.stdev = self._welford_mean_and_stdev(configs)
-                zeta, dzetadr_forces, dzetadr_stress = None, None, None
-
-            else:
-                zeta, dzetadr_forces, dzetadr_stress = self._calc_zeta_dzetadr(
-                    configs, fit_forces, fit_stress, nprocs
-                )
-                stacked = np.concatenate(zeta)
-                self.mean = np.mean(stacked, axis=0)
-                self.stdev = np.std(stacked, axis=0)
-
-            logger.info("Finish computing mean and stdev of fingerprints.")
-
-            # save to a pickle file
-            if fingerprints_mean_stdev_filename is None:
-                fingerprints_mean_stdev_filename = "fingerprints_mean_and_stdev.pkl"
-            state_dict = self.state_dict()
-            pickle_dump(state_dict, fingerprints_mean_stdev_filename)
-
-            logger.info(
-                "Fingerprints mean and stdev saved to "
-                f"`{fingerprints_mean_stdev_filename}`."
+        if not self.normalize or has_mean_stdev:
+            self._dump_fingerprints(
+                configs, fingerprints_filename, fit_forces, fit_stress, nprocs, cache
             )
+            return fingerprints_filename
 
-        else:
-            zeta, dzetadr_forces, dzetadr_stress = None, None, None
+        # compute mean and stdev, while writing the fingerprints without normalization
+        logger.info("Start computing mean and stdev of fingerprints.")
 
-        # generate fingerprints
-        self._dump_fingerprints(
+        fname = to_path(fingerprints_filename)
+        raw_fname = fname.with_name(fname.name + ".raw")
+        moments = self._dump_fingerprints(
             configs,
-            fingerprints_filename,
-            zeta,
-            dzetadr_forces,
-            dzetadr_stress,
+            raw_fname,
             fit_forces,
             fit_stress,
+            nprocs,
+            cache,
+            normalize=False,
+            dtype=np.float64,
+        )
+        self.mean = moments.mean
+        self.stdev = moments.get_stdev()
+
+        logger.info("Finish computing mean and stdev of fingerprints.")
+
+        # save to a pickle file
+        if fingerprints_mean_stdev_filename is None:
+            fingerprints_mean_stdev_filename = "fingerprints_mean_and_stdev.pkl"
+        state_dict = self.state_dict()
+        pickle_dump(state_dict, fingerprints_mean_stdev_filename)
+
+        logger.info(
+            "Fingerprints mean and stdev saved to "
+            f"`{fingerprints_mean_stdev_filename}`."
         )
 
+        # normalize the stored fingerprints
+        self._normalize_fingerprints(raw_fname, fname, fit_forces, fit_stress)
+        shutil.rmtree(raw_fname)
+
         return fingerprints_filename
 
     def _dump_fingerprints(
         self,
         configs,
         fname,
-        all_zeta,
-        all_dzetadr_forces,
-        all_dzetadr_stress,
         fit_forces,
         fit_stress,
-    ):
+        nprocs=1,
+        cache=None,
+        normalize=True,
+        dtype=None,
+    ) -> "FingerprintMoments":
         """
-        Dump fingerprints to a pickle file.
-        """
-
-        logger.info(f"Pickling fingerprints to `{fname}`")
+        Transform the configurations and dump their fingerprints to a binary
+        fingerprints store, or a pickle file if `fname` ends with `.pkl`.
 
-        create_directory(fname, is_directory=False)
+        With `nprocs > 1`, the configurations are transformed by a pool of worker
+        processes, and the fingerprints are written in the order of the configurations
+        as they are returned.
 
-        # remove it, because we use append mode for the file below
-        fname = to_path(fname)
-        if fname.exists():
-            fname.unlink()
+        Args:
+            cache: Cache of the fingerprints; only the configurations not in it are
+                transformed.
+            normalize: Whether to normalize the fingerprints, if `normalize=True` for
+                the descriptor.
+            dtype: Data type of the stored fingerprints. Default to the data type of the
+                descriptor.
 
-        with open(fname, "ab") as f:
-            for i, conf in enumerate(configs):
-                if i % 100 == 0:
-                    logger.info(f"Processing configuration: {i}.")
+        Returns:
+            The moments of the fingerprints before normalization.
+        """
+        writer = self._create_writer(fname, fit_forces, fit_stress, dtype)
 
-                if all_zeta is None:
-                    zeta, dzetadr_f, dzetadr_s = self.transform(
-                        conf, fit_forces, fit_stress
-                    )
-                else:
-                    zeta = all_zeta[i]
-                    dzetadr_f = all_dzetadr_forces[i]
-                    dzetadr_s = all_dzetadr_stress[i]
-
-                # centering and normalization
-                if self.normalize:
-                    zeta = (zeta - self.mean) / self.stdev
-                    if fit_forces or fit_stress:
-                        stdev_3d = np.atleast_3d(self.stdev)
-                    if fit_forces:
-                        dzetadr_f = dzetadr_f / stdev_3d
-                    if fit_stress:
-                        dzetadr_s = dzetadr_s / stdev_3d
-
-                # pickling data
-                zeta = np.asarray(zeta, self.dtype)
-                energy = np.asarray(conf.energy, self.dtype)
-                if fit_forces:
-                    dzetadr_f = np.asarray(dzetadr_f, self.dtype)
-                    forces = np.asarray(conf.forces, self.dtype)
-                if fit_stress:
-                    dzetadr_s = np.asarray(dzetadr_s, self.dtype)
-                    stress = np.asarray(conf.stress, self.dtype)
-                    volume = np.asarray(conf.get_volume(), self.dtype)
-
-                example = {"configuration": conf, "zeta": zeta, "energy": energy}
-                if fit_forces:
-                    example["dzetadr_forces"] = dzetadr_f
-                    example["forces"] = forces
-                if fit_stress:
-                    example["dzetadr_stress"] = dzetadr_s
-                    example["stress"] = stress
-                    example["volume"] = volume
-
-                pickle.dump(example, f)
-
-        logger.info(f"Pickle {len(configs)} configurations finished.")
-
-    def _calc_zeta_dzetadr(self, configs, fit_forces, fit_stress, nprocs=1):
-        """
-        Calculate the fingerprints and maybe its gradients w.r.t the atomic coords.
-        """
-        if nprocs == 1:
-            zeta = []
-            dzetadr_forces = []
-            dzetadr_stress = []
-            for conf in configs:
-                z, dzdr_f, dzdr_s = self.transform(conf, fit_forces, fit_stress)
-                zeta.append(z)
-                dzetadr_forces.append(dzdr_f)
-                dzetadr_stress.append(dzdr_s)
+        # keys of the configurations in the cache, and whether they are cached
+        if cache is None:
+            keys = [None] * len(configs)
+            cached = [False] * len(configs)
         else:
-            rslt = parallel.parmap1(
-                self.transform, configs, fit_forces, fit_stress, nprocs=nprocs
+            descriptor_key = cache.get_descriptor_key(self)
+            keys = [cache.get_key(descriptor_key, conf) for conf in configs]
+            cached = [cache.has(key, fit_forces, fit_stress) for key in keys]
+        todo = [conf for conf, c in zip(configs, cached) if not c]
+        if cache is not None:
+            logger.info(
+                f"Fingerprints of {len(configs) - len(todo)} configurations found in "
+                "the cache."
             )
-            zeta = [pair[0] for pair in rslt]
-            dzetadr_forces = [pair[1] for pair in rslt]
-            dzetadr_stress = [pair[2] for pair in rslt]
 
-        return zeta, dzetadr_forces, dzetadr_stress
+        if nprocs > 1 and todo:
+            pool = parallel.get_context().Pool(
+                nprocs, initializer=_init_descriptor_worker, initargs=(self,)
+            )
+            results = pool.imap(
+                _transform_config, ((conf, fit_forces, fit_stress) for conf in todo)
+            )
+        else:
+            pool = None
+            results = (
+                _transform_config((conf, fit_forces, fit_stress), self) for conf in todo
+            )
 
-    def _welford_mean_and_stdev(self, configs: List[Configuration]):
-        """
-        Compute the mean and standard deviation of fingerprints.
+        moments = FingerprintMoments()
+        try:
+            with writer as f:
+                for i, (conf, key, c) in enumerate(zip(configs, keys, cached)):
+                    if i % 100 == 0:
+                        logger.info(f"Processing configuration: {i}.")
+
+                    if c:
+                        fingerprints = cache.get(key, fit_forces, fit_stress)
+                        if fingerprints is None:
+                            # removed from the cache after the lookup above
+                            fingerprints = self.transform(conf, fit_forces, fit_stress)
+                            cache.put(key, *fingerprints)
+                        m = FingerprintMoments.from_array(fingerprints[0])
+                    else:
+                        *fingerprints, m = next(results)
+                        if cache is not None:
+                            cache.put(key, *fingerprints)
+
+                    zeta, dzetadr_f, dzetadr_s = fingerprints
+                    moments.merge(m)
+                    example = self._get_example(
+                        conf,
+                        zeta,
+                        dzetadr_f,
+                        dzetadr_s,
+                        fit_forces,
+                        fit_stress,
+                        normalize,
+                        dtype,
+                    )
+                    f.append(example)
+        finally:
+            if pool is not None:
+                pool.terminate()
 
-        This running mean and standard method proposed by Welford is memory-efficient.
-        Besides, it outperforms the naive method from suffering numerical instability for
-        large dataset.
+        logger.info(f"Dump fingerprints of {len(configs)} configurations finished.")
 
-        Args:
-            configs: Dataset class:`~kliff.dataset.Configuration`.
+        return moments
 
-        See Also:
-            https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
+    def _normalize_fingerprints(self, raw_fname, fname, fit_forces, fit_stress):
         """
+        Normalize the fingerprints in the store `raw_fname`, and dump them to `fname`.
+        """
+        raw = FingerprintsStore(raw_fname)
+        writer = self._create_writer(fname, fit_forces, fit_stress)
+
+        with writer as f:
+            for data in raw:
+                dzetadr_f = data.get("dzetadr_forces")
+                if "dzetadr_forces_neigh" in data:
+                    dzetadr_f = SparseGradient(
+                        dzetadr_f,
+                        data["dzetadr_forces_atom"],
+                        data["dzetadr_forces_neigh"],
+                    )
+                example = self._get_example(
+                    data["configuration"],
+                    data["zeta"],
+                    dzetadr_f,
+                    data.get("dzetadr_stress"),
+                    fit_forces,
+                    fit_stress,
+                )
+                f.append(example)
 
-        # number of features
-        conf = configs[0]
-        zeta, _, _ = self.transform(conf, fit_forces=False, fit_stress=False)
-        size = zeta.shape[1]
-
-        # Welford's method
-        n = 0
-        mean = np.zeros(size)
-        M2 = np.zeros(size)
-        for i, conf in enumerate(configs):
-            zeta, _, _ = self.transform(conf, fit_forces=False, fit_stress=False)
-            for row in zeta:
-                n += 1
-                delta = row - mean
-                mean += delta / n
-                delta2 = row - mean
-                M2 += delta * delta2
+        logger.info(f"Normalize fingerprints of {len(raw)} configurations finished.")
 
-            if i % 100 == 0:
-                logger.info("Processing configuration: {i}.")
-                sys.stdout.flush()
+    def _create_writer(self, fname, fit_forces, fit_stress, dtype=None):
+        """
+        Create the writer of the fingerprints, with an `append` method taking the
+        fingerprints of a configuration.
+        """
+        fname = to_path(fname)
+        dtype = self.dtype if dtype is None else dtype
 
-        stdev = np.sqrt(M2 / n)  # not the unbiased
+        if fname.suffix == ".pkl":
+            logger.info(f"Pickling fingerprints to `{fname}`")
+            return _PickleWriter(fname)
+        else:
+            logger.info(f"Writing fingerprints to `{fname}`")
+            return FingerprintsWriter(
+                fname, dtype, fit_forces, fit_stress, self.sparse_grad
+            )
 
-        return mean, stdev
+    def _get_example(
+        self,
+        conf,
+        zeta,
+        dzetadr_f,
+        dzetadr_s,
+        fit_forces,
+        fit_stress,
+        normalize=True,
+        dtype=None,
+    ):
+        """
+        Normalize the fingerprints of a configuration and collect them, together with
+        the reference data, into a dictionary.
+        """
+        dtype = self.dtype if dtype is None else dtype
+
+        # centering and normalization
+        if self.normalize and normalize:
+            zeta = (zeta - self.mean) / self.stdev
+            if fit_forces or fit_stress:
+                stdev_3d = np.atleast_3d(self.stdev)
+            if fit_forces:
+                if isinstance(dzetadr_f, SparseGradient):
+                    dzetadr_f = dzetadr_f._replace(value=dzetadr_f.value / stdev_3d)
+                else:
+                    dzetadr_f = dzetadr_f / stdev_3d
+            if fit_stress:
+                dzetadr_s = dzetadr_s / stdev_3d
+
+        zeta = np.asarray(zeta, dtype)
+        energy = np.asarray(conf.energy, dtype)
+        if fit_forces:
+            sparse = isinstance(dzetadr_f, SparseGradient)
+            if sparse:
+                dzetadr_f_atom = np.asarray(dzetadr_f.atom, np.int64)
+                dzetadr_f_neigh = np.asarray(dzetadr_f.neigh, np.int64)
+                dzetadr_f = dzetadr_f.value
+            dzetadr_f = np.asarray(dzetadr_f, dtype)
+            forces = np.asarray(conf.forces, dtype)
+        if fit_stress:
+            dzetadr_s = np.asarray(dzetadr_s, dtype)
+            stress = np.asarray(conf.stress, dtype)
+            volume = np.asarray(conf.get_volume(), dtype)
+
+        example = {"configuration": conf, "zeta": zeta, "energy": energy}
+        if fit_forces:
+            example["dzetadr_forces"] = dzetadr_f
+            example["forces"] = forces
+            if sparse:
+                example["dzetadr_forces_atom"] = dzetadr_f_atom
+                example["dzetadr_forces_neigh"] = dzetadr_f_neigh
+        if fit_stress:
+            example["dzetadr_stress"] = dzetadr_s
+            example["stress"] = stress
+            example["volume"] = volume
+
+        return example
 
     def transform(
         self, conf: Configuration, fit_forces: bool = False, fit_stress: bool = False
@@ -303,7 +423,8 @@ class Descriptor:
                 grad is `True`, otherwise `None`. Shape: (num_atoms, num_descriptors,
                 num_atoms, 3), where num_atoms and num_descriptors has the same meanings
                 as described in zeta, and 3 denotes the 3D space for the Cartesian
-                coordinates.
+                coordinates. A descriptor may instead return a
+                :class:`SparseGradient`, storing only the nonzero blocks.
             dzeta_ds: Gradient of the descriptor w.r.t. virial stress component. 2D
                 array of shape (num_atoms, num_descriptors, 6), where num_atoms and
                 num_descriptors has the same meanings as described in zeta,
@@ -387,6 +508,123 @@ class Descriptor:
         self.size = size
 
 
+class FingerprintMoments:
+    """
+    Mean and the sum of squared deviations from the mean of fingerprints, accumulated
+    over batches of fingerprints.
+
+    The moments of batches, e.g. of different configurations computed by different
+    processes, are merged using the pairwise algorithm of Chan et al., which is
+    numerically stable. See
+    https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
+
+    Attributes:
+        n: Number of fingerprints.
+        mean: Mean of the fingerprints.
+        M2: Sum of squared deviations of the fingerprints from the mean.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.M2 = None
+
+    @classmethod
+    def from_array(cls, zeta: np.ndarray) -> "FingerprintMoments":
+        """
+        Compute the moments of a batch of fingerprints.
+
+        Args:
+            zeta: 2D array of shape (num_atoms, num_descriptors).
+        """
+        zeta = np.asarray(zeta, dtype=np.float64)
+        moments = cls()
+        moments.n = zeta.shape[0]
+        moments.mean = np.mean(zeta, axis=0)
+        moments.M2 = np.sum((zeta - moments.mean) ** 2, axis=0)
+        return moments
+
+    def update(self, zeta: np.ndarray):
+        """
+        Add a batch of fingerprints of shape (num_atoms, num_descriptors).
+        """
+        self.merge(FingerprintMoments.from_array(zeta))
+
+    def merge(self, other: "FingerprintMoments"):
+        """
+        Merge the moments of another batch of fingerprints.
+        """
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n = other.n
+            self.mean = other.mean.copy()
+            self.M2 = other.M2.copy()
+            return
+
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.n / n)
+        self.M2 = self.M2 + other.M2 + delta**2 * (self.n * other.n / n)
+        self.n = n
+
+    def get_stdev(self) -> np.ndarray:
+        """
+        Return the standard deviation (not the unbiased one) of the fingerprints.
+        """
+        return np.sqrt(self.M2 / self.n)
+
+
+# descriptor used by the worker processes generating fingerprints
+_worker_descriptor = None
+
+
+def _init_descriptor_worker(descriptor: Descriptor):
+    global _worker_descriptor
+    _worker_descriptor = descriptor
+
+
+def _transform_config(args, descriptor: Optional[Descriptor] = None):
+    """
+    Transform a configuration `conf` with `args = (conf, fit_forces, fit_stress)`,
+    using `descriptor` or, if it is `None`, the copy of the descriptor inherited by the
+    worker.
+
+    Returns:
+        The fingerprints and their gradients, and the moments of the fingerprints.
+    """
+    if descriptor is None:
+        descriptor = _worker_descriptor
+    zeta, dzetadr_f, dzetadr_s = descriptor.transform(*args)
+    return zeta, dzetadr_f, dzetadr_s, FingerprintMoments.from_array(zeta)
+
+
+class _PickleWriter:
+    """
+    Write fingerprints of configurations as a stream of pickled dictionaries.
+    """
+
+    def __init__(self, path: Path):
+        create_directory(path, is_directory=False)
+        self._file = open(path, "wb")
+
+    def append(self, example: Dict[str, Any]):
+        pickle.dump(example, self._file)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# fields of the fingerprints store holding integer indices
+_INDEX_FIELDS = ["dzetadr_forces_atom", "dzetadr_forces_neigh"]
+
+
 def load_fingerprints(path: Union[Path, str]):
     """
     Read preprocessed fingerprints from file.
@@ -394,11 +632,14 @@ def load_fingerprints(path: Union[Path, str]):
     This is the reverse operation of Descriptor._dump_fingerprints.
 
     Args:
-        path: Path to the pickled data file.
+        path: Path to the fingerprints store directory or the pickled data file.
 
     Returns:
-        Fingerprints
+        Fingerprints, a sequence of dictionaries, one for each configuration.
     """
+    if to_path(path).is_dir():
+        return FingerprintsStore(path)
+
     data = []
     with open(path, "rb") as f:
         try:
@@ -413,6 +654,443 @@ def load_fingerprints(path: Union[Path, str]):
     return data
 
 
+class FingerprintsWriter:
+    """
+    Write fingerprints of configurations to a binary fingerprints store.
+
+    A fingerprints store is a directory holding one flat binary file for each field of
+    the fingerprints, with the data of all configurations concatenated:
+
+    - `zeta.bin`: (total_natoms, size), fingerprints of all atoms
+    - `dzetadr_forces.bin`: flattened gradients of fingerprints for forces, of size
+      natoms * size * 3 * natoms for each configuration, or nnz * size * 3 if the
+      gradients are sparse (see :class:`SparseGradient`), in which case the atom and
+      neighbor indices are stored in `dzetadr_forces_atom.bin` and
+      `dzetadr_forces_neigh.bin` (int64, (nnz,) for each configuration)
+    - `dzetadr_stress.bin`: (total_natoms, size, 6), gradients of fingerprints for
+      stress
+    - `energy.bin`: (num_configs,), `forces.bin`: (total_natoms, 3),
+      `stress.bin`: (num_configs, 6), `volume.bin`: (num_configs,), reference data
+
+    together with `index.pkl` (the number of atoms of each configuration, from which
+    the offsets of a configuration in each file are computed) and `configurations.pkl`
+    (the configurations). Each configuration is appended to the files as soon as it
+    is transformed, so the fingerprints of all configurations never need to be in
+    memory at the same time.
+
+    Args:
+        path: Path to the fingerprints store directory.
+        dtype: Data type of the fingerprints.
+        fit_forces: Whether the gradients for forces are stored.
+        fit_stress: Whether the gradients for stress are stored.
+        sparse_grad: Whether the gradients for forces are sparse.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        dtype=np.float32,
+        fit_forces: bool = False,
+        fit_stress: bool = False,
+        sparse_grad: bool = False,
+    ):
+        self.path = to_path(path)
+        self.dtype = np.dtype(dtype)
+        self.fit_forces = fit_forces
+        self.fit_stress = fit_stress
+        self.sparse_grad = sparse_grad
+
+        self.size = None
+        self.natoms = []
+        self.nnz = []
+        self.configs = []
+
+        fields = ["zeta", "energy"]
+        if fit_forces:
+            fields.extend(["dzetadr_forces", "forces"])
+            if sparse_grad:
+                fields.extend(["dzetadr_forces_atom", "dzetadr_forces_neigh"])
+        if fit_stress:
+            fields.extend(["dzetadr_stress", "stress", "volume"])
+
+        create_directory(self.path, is_directory=True)
+        self._files = {k: open(self.path / f"{k}.bin", "wb") for k in fields}
+
+    def append(self, example: Dict[str, Any]):
+        """
+        Append the fingerprints of a configuration.
+
+        Args:
+            example: fingerprints of a configuration, with the same keys as the
+                dictionaries returned by :class:`FingerprintsStore`.
+        """
+        zeta = example["zeta"]
+        if self.size is None:
+            self.size = zeta.shape[1]
+        elif zeta.shape[1] != self.size:
+            raise DescriptorError(
+                f"Expect fingerprints of size {self.size}; got {zeta.shape[1]}."
+            )
+
+        if self.fit_forces and self.sparse_grad != ("dzetadr_forces_neigh" in example):
+            raise DescriptorError(
+                f"Expect {'sparse' if self.sparse_grad else 'dense'} gradients of "
+                "fingerprints for forces."
+            )
+
+        for k, f in self._files.items():
+            dtype = np.int64 if k in _INDEX_FIELDS else self.dtype
+            f.write(np.ascontiguousarray(example[k], dtype=dtype).tobytes())
+
+        self.natoms.append(zeta.shape[0])
+        if self.fit_forces and self.sparse_grad:
+            self.nnz.append(len(example["dzetadr_forces_neigh"]))
+        self.configs.append(example["configuration"])
+
+    def close(self):
+        """
+        Finish writing and save the index of the store.
+        """
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+        index = {
+            "natoms": np.asarray(self.natoms, dtype=np.int64),
+            "size": self.size,
+            "dtype": self.dtype.str,
+            "fit_forces": self.fit_forces,
+            "fit_stress": self.fit_stress,
+            "sparse_grad": self.sparse_grad,
+            "nnz": np.asarray(self.nnz, dtype=np.int64),
+        }
+        pickle_dump(self.configs, self.path / "configurations.pkl")
+        pickle_dump(index, self.path / "index.pkl")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FingerprintsStore:
+    """
+    Read-only access to a binary fingerprints store written by
+    :class:`FingerprintsWriter`.
+
+    The binary files are opened via `np.memmap`, such that fingerprints are read from
+    disk only when accessed and the store can be larger than memory. Indexing the
+    store gives the fingerprints of a configuration in a dictionary with keys
+    `configuration`, `zeta`, and `energy`, and also `dzetadr_forces` and `forces` (if
+    stored for forces), and `dzetadr_stress`, `stress` and `volume` (if stored for
+    stress). For sparse gradients, the keys `dzetadr_forces_atom` and
+    `dzetadr_forces_neigh` hold the indices of :class:`SparseGradient`. The arrays are
+    views into the memory map, not copies.
+
+    Args:
+        path: Path to the fingerprints store directory.
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = to_path(path)
+
+        try:
+            index = pickle_load(self.path / "index.pkl")
+            self.configs = pickle_load(self.path / "configurations.pkl")
+        except Exception as e:
+            raise DescriptorError(f"Cannot load fingerprints from `{path}`. {str(e)}")
+
+        self.natoms = index["natoms"]
+        self.size = index["size"]
+        self.dtype = np.dtype(index["dtype"])
+        self.fit_forces = index["fit_forces"]
+        self.fit_stress = index["fit_stress"]
+        self.sparse_grad = index.get("sparse_grad", False)
+
+        # offsets of each configuration in the arrays with one row per atom
+        self._atom_offsets = np.concatenate(([0], np.cumsum(self.natoms)))
+        total_natoms = int(self._atom_offsets[-1])
+        nconfigs = len(self.natoms)
+
+        self.zeta = self._open("zeta", (total_natoms, self.size))
+        self.energy = self._open("energy", (nconfigs,))
+        if self.fit_forces:
+            if self.sparse_grad:
+                nnz = index["nnz"]
+                self._nnz_offsets = np.concatenate(([0], np.cumsum(nnz)))
+                total_nnz = int(self._nnz_offsets[-1])
+                self.dzetadr_forces = self._open(
+                    "dzetadr_forces", (total_nnz, self.size, 3)
+                )
+                self.dzetadr_forces_atom = self._open(
+                    "dzetadr_forces_atom", (total_nnz,), np.int64
+                )
+                self.dzetadr_forces_neigh = self._open(
+                    "dzetadr_forces_neigh", (total_nnz,), np.int64
+                )
+            else:
+                sizes = self.natoms * self.size * 3 * self.natoms
+                self._dzetadr_forces_offsets = np.concatenate(([0], np.cumsum(sizes)))
+                self.dzetadr_forces = self._open(
+                    "dzetadr_forces", (int(self._dzetadr_forces_offsets[-1]),)
+                )
+            self.forces = self._open("forces", (total_natoms, 3))
+        if self.fit_stress:
+            self.dzetadr_stress = self._open(
+                "dzetadr_stress", (total_natoms, self.size, 6)
+            )
+            self.stress = self._open("stress", (nconfigs, 6))
+            self.volume = self._open("volume", (nconfigs,))
+
+    def _open(self, name: str, shape: Tuple[int, ...], dtype=None) -> np.ndarray:
+        dtype = self.dtype if dtype is None else dtype
+
+        if np.prod(shape) == 0:
+            return np.zeros(shape, dtype=dtype)
+
+        # copy-on-write: the arrays are writable (as needed by torch.from_numpy), but
+        # changes are never written back to disk
+        return np.memmap(self.path / f"{name}.bin", dtype=dtype, mode="c", shape=shape)
+
+    def __len__(self):
+        return len(self.natoms)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        n = len(self)
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("Fingerprints index out of range.")
+
+        natoms = int(self.natoms[index])
+        start = int(self._atom_offsets[index])
+        end = int(self._atom_offsets[index + 1])
+
+        example = {
+            "configuration": self.configs[index],
+            "zeta": self.zeta[start:end],
+            "energy": self.energy[index : index + 1].reshape(()),
+        }
+        if self.fit_forces:
+            if self.sparse_grad:
+                i = int(self._nnz_offsets[index])
+                j = int(self._nnz_offsets[index + 1])
+                example["dzetadr_forces"] = self.dzetadr_forces[i:j]
+                example["dzetadr_forces_atom"] = self.dzetadr_forces_atom[i:j]
+                example["dzetadr_forces_neigh"] = self.dzetadr_forces_neigh[i:j]
+            else:
+                i = int(self._dzetadr_forces_offsets[index])
+                j = int(self._dzetadr_forces_offsets[index + 1])
+                example["dzetadr_forces"] = self.dzetadr_forces[i:j].reshape(
+                    natoms, self.size, 3 * natoms
+                )
+            example["forces"] = self.forces[start:end]
+        if self.fit_stress:
+            example["dzetadr_stress"] = self.dzetadr_stress[start:end]
+            example["stress"] = self.stress[index]
+            example["volume"] = self.volume[index : index + 1].reshape(())
+
+        return example
+
+
+class FingerprintsCache:
+    """
+    Cache of the fingerprints of configurations on disk, shared by training runs, e.g.
+    when configurations are added to a training set, or by bootstrap replicas.
+
+    The fingerprints and their gradients returned by `Descriptor.transform()` (i.e.
+    before normalization) are stored in a file for each configuration, keyed on the
+    descriptor class, hyperparameters, cutoff, and data type, and a hash of the coords,
+    cell, PBC, and species of the configuration (see
+    :meth:`~kliff.neighbor.NeighborListCache.hash_configuration`). Fingerprints with
+    gradients for forces or stress also serve requests without them.
+
+    Args:
+        path: Directory of the cache.
+        max_size: Maximum total size in bytes of the files of the cache; the least
+            recently used ones are removed when exceeded. If `None`, there is no limit.
+    """
+
+    def __init__(self, path: Union[Path, str], max_size: Optional[int] = None):
+        self.path = to_path(path)
+        self.max_size = max_size
+        create_directory(self.path, is_directory=True)
+
+        # size of the files, the least recently used first
+        files = sorted(self.path.glob("*.npz"), key=lambda f: f.stat().st_mtime)
+        self._sizes = OrderedDict((f.name, f.stat().st_size) for f in files)
+        self._total_size = sum(self._sizes.values())
+        self._evict()
+
+    @staticmethod
+    def get_descriptor_key(descriptor: Descriptor) -> str:
+        """
+        Hash of the class, hyperparameters, cutoff, and data type of a descriptor.
+        """
+        data = {
+            "class": type(descriptor).__qualname__,
+            "hyperparams": descriptor.hyperparams,
+            "cut_name": descriptor.cut_name,
+            "cut_dists": descriptor.cut_dists,
+            "dtype": np.dtype(descriptor.dtype).str,
+            "sparse_grad": descriptor.sparse_grad,
+        }
+        s = json.dumps(data, sort_keys=True, default=repr)
+        return hashlib.sha1(s.encode()).hexdigest()
+
+    @staticmethod
+    def get_key(descriptor_key: str, conf: Configuration) -> str:
+        """
+        Key of the fingerprints of a configuration.
+
+        Args:
+            descriptor_key: key of the descriptor, see :meth:`get_descriptor_key`.
+            conf: atomic configuration
+        """
+        h = hashlib.sha1(descriptor_key.encode())
+        h.update(NeighborListCache.hash_configuration(conf).encode())
+        return h.hexdigest()
+
+    def has(self, key: str, fit_forces: bool = False, fit_stress: bool = False) -> bool:
+        """
+        Whether the fingerprints of a configuration, with the gradients for forces
+        and stress if required, are in the cache.
+        """
+        return self._find(key, fit_forces, fit_stress) is not None
+
+    def get(
+        self, key: str, fit_forces: bool = False, fit_stress: bool = False
+    ) -> Optional[Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]]:
+        """
+        Get the fingerprints of a configuration.
+
+        Returns:
+            zeta, dzetadr_forces, and dzetadr_stress as returned by
+            `Descriptor.transform()`; `None` if not in the cache.
+        """
+        filename = self._find(key, fit_forces, fit_stress)
+        if filename is None:
+            return None
+
+        try:
+            with np.load(filename) as f:
+                data = {k: f[k] for k in f.files}
+        except FileNotFoundError:
+            # removed by another process sharing the cache
+            self._remove(filename.name)
+            return None
+
+        # mark as recently used
+        os.utime(filename)
+        if filename.name in self._sizes:
+            self._sizes.move_to_end(filename.name)
+
+        zeta = data["zeta"]
+        dzetadr_f = None
+        if fit_forces:
+            dzetadr_f = data["dzetadr_forces"]
+            if "dzetadr_forces_neigh" in data:
+                dzetadr_f = SparseGradient(
+                    dzetadr_f,
+                    data["dzetadr_forces_atom"],
+                    data["dzetadr_forces_neigh"],
+                )
+        dzetadr_s = data["dzetadr_stress"] if fit_stress else None
+
+        return zeta, dzetadr_f, dzetadr_s
+
+    def put(
+        self,
+        key: str,
+        zeta: np.ndarray,
+        dzetadr_forces: Optional[Union[np.ndarray, SparseGradient]] = None,
+        dzetadr_stress: Optional[np.ndarray] = None,
+    ):
+        """
+        Add the fingerprints of a configuration to the cache.
+
+        Args:
+            key: key of the configuration, see :meth:`get_key`.
+            zeta: fingerprints.
+            dzetadr_forces: gradients of the fingerprints for forces, if computed.
+            dzetadr_stress: gradients of the fingerprints for stress, if computed.
+        """
+        data = {"zeta": zeta}
+        if isinstance(dzetadr_forces, SparseGradient):
+            data["dzetadr_forces"] = dzetadr_forces.value
+            data["dzetadr_forces_atom"] = dzetadr_forces.atom
+            data["dzetadr_forces_neigh"] = dzetadr_forces.neigh
+        elif dzetadr_forces is not None:
+            data["dzetadr_forces"] = dzetadr_forces
+        if dzetadr_stress is not None:
+            data["dzetadr_stress"] = dzetadr_stress
+
+        filename = self._get_filename(
+            key, dzetadr_forces is not None, dzetadr_stress is not None
+        )
+
+        # write to a temporary file first, such that other processes sharing the cache
+        # never read a partially written file
+        tmp = filename.with_name(f"{filename.stem}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **data)
+        os.replace(tmp, filename)
+
+        self._remove(filename.name)
+        self._sizes[filename.name] = filename.stat().st_size
+        self._total_size += self._sizes[filename.name]
+
+        self._evict()
+
+    def clear(self):
+        """
+        Remove all fingerprints in the cache.
+        """
+        for name in list(self._sizes):
+            self.path.joinpath(name).unlink(missing_ok=True)
+        self._sizes.clear()
+        self._total_size = 0
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _get_filename(self, key: str, fit_forces: bool, fit_stress: bool) -> Path:
+        return self.path.joinpath(f"{key}_{int(fit_forces)}{int(fit_stress)}.npz")
+
+    def _find(self, key: str, fit_forces: bool, fit_stress: bool) -> Optional[Path]:
+        """
+        The file with the fingerprints of a configuration that has the required
+        gradients.
+        """
+        for f in [False, True]:
+            for s in [False, True]:
+                if (fit_forces and not f) or (fit_stress and not s):
+                    continue
+                filename = self._get_filename(key, f, s)
+                if filename.exists():
+                    return filename
+        return None
+
+    def _remove(self, name: str):
+        size = self._sizes.pop(name, None)
+        if size is not None:
+            self._total_size -= size
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+
+        while self._total_size > self.max_size and self._sizes:
+            name = next(iter(self._sizes))
+            self._remove(name)
+            self.path.joinpath(name).unlink(missing_ok=True)
+
+
 def generate_full_cutoff(cutoff):
     """
     Generate a full binary cutoff dictionary.
@@ -1,6 +1,7 @@
 #include "sym_fn.hpp"
 
 #include <cstring>
+#include <thread>
 
 #ifdef MY_PI
 #undef MY_PI
@@ -601,6 +602,254 @@ void Descriptor::generate_one_atom(int const i,
   }
 }
 
+void Descriptor::generate_config(int const Ncontrib,
+                                 double const * coords,
+                                 int const * particleSpeciesCodes,
+                                 int const * numneigh,
+                                 int const * neighlist,
+                                 int const * image,
+                                 double * const zeta,
+                                 double * const dzetadr_forces,
+                                 double * const dzetadr_stress,
+                                 std::vector<double> * const sparse_value,
+                                 std::vector<int> * const sparse_atom,
+                                 std::vector<int> * const sparse_neigh,
+                                 int const num_threads,
+                                 int const * shifts,
+                                 double const * cell)
+{
+  // offset of the neighbors of each atom in the 1D neighbor list
+  std::vector<int> neighstart(Ncontrib + 1, 0);
+  for (int i = 0; i < Ncontrib; ++i)
+  {
+    neighstart[i + 1] = neighstart[i] + numneigh[i];
+  }
+
+  int const nthreads = std::max(1, std::min(num_threads, Ncontrib));
+  bool const sparse = (sparse_value != nullptr);
+
+  // each thread works on a contiguous range of atoms; zeta and the dense
+  // gradients of different atoms do not overlap, and the sparse gradients are
+  // collected per thread and concatenated in order afterwards
+  std::vector<std::vector<double> > values(nthreads);
+  std::vector<std::vector<int> > atoms(nthreads);
+  std::vector<std::vector<int> > neighs(nthreads);
+
+  auto work = [&](int const t) {
+    generate_atoms(static_cast<long>(Ncontrib) * t / nthreads,
+                   static_cast<long>(Ncontrib) * (t + 1) / nthreads,
+                   Ncontrib,
+                   coords,
+                   particleSpeciesCodes,
+                   numneigh,
+                   neighstart.data(),
+                   neighlist,
+                   image,
+                   zeta,
+                   dzetadr_forces,
+                   dzetadr_stress,
+                   sparse ? &values[t] : nullptr,
+                   sparse ? &atoms[t] : nullptr,
+                   sparse ? &neighs[t] : nullptr,
+                   shifts,
+                   cell);
+  };
+
+  std::vector<std::thread> threads;
+  for (int t = 1; t < nthreads; ++t) { threads.emplace_back(work, t); }
+  work(0);
+  for (auto & thread : threads) { thread.join(); }
+
+  if (sparse)
+  {
+    for (int t = 0; t < nthreads; ++t)
+    {
+      sparse_value->insert(
+          sparse_value->end(), values[t].begin(), values[t].end());
+      sparse_atom->insert(sparse_atom->end(), atoms[t].begin(), atoms[t].end());
+      sparse_neigh->insert(
+          sparse_neigh->end(), neighs[t].begin(), neighs[t].end());
+    }
+  }
+}
+
+void Descriptor::generate_atoms(int const first,
+                                int const last,
+                                int const Ncontrib,
+                                double const * coords,
+                                int const * particleSpeciesCodes,
+                                int const * numneigh,
+                                int const * neighstart,
+                                int const * neighlist,
+                                int const * image,
+                                double * const zeta,
+                                double * const dzetadr_forces,
+                                double * const dzetadr_stress,
+                                std::vector<double> * const sparse_value,
+                                std::vector<int> * const sparse_atom,
+                                std::vector<int> * const sparse_neigh,
+                                int const * shifts,
+                                double const * cell)
+{
+  VectorOfSizeDIM * coordinates = (VectorOfSizeDIM *) coords;
+
+  int const Ndesc = get_num_descriptors();
+  bool const sparse = (sparse_value != nullptr);
+  bool const grad = (dzetadr_forces != nullptr) || (dzetadr_stress != nullptr)
+                    || sparse;
+
+  std::vector<double> grad_desc;
+
+  // slot of a contributing atom in the sparse block of the current atom
+  std::vector<int> slot;
+  std::vector<int> org_ids;
+  if (sparse) { slot.assign(Ncontrib, -1); }
+
+  // with shifts, the neighbors of an atom are gathered at their positions, with
+  // the atom itself last
+  std::vector<double> local_coords;
+  std::vector<int> local_species;
+  std::vector<int> local_list;
+
+  for (int i = first; i < last; ++i)
+  {
+    int const numnei = numneigh[i];
+    int const * const ilist = neighlist + neighstart[i];
+
+    if (grad) { grad_desc.assign(Ndesc * (numnei + 1) * DIM, 0.0); }
+
+    if (shifts)
+    {
+      local_coords.resize((numnei + 1) * DIM);
+      local_species.resize(numnei + 1);
+      local_list.resize(numnei);
+      for (int ii = 0; ii <= numnei; ++ii)
+      {
+        int const j = ii < numnei ? ilist[ii] : i;
+        for (int dim = 0; dim < DIM; ++dim)
+        {
+          local_coords[ii * DIM + dim] = coordinates[j][dim];
+        }
+        local_species[ii] = particleSpeciesCodes[j];
+        if (ii == numnei) { break; }
+
+        int const * const s = shifts + (neighstart[i] + ii) * DIM;
+        for (int dim = 0; dim < DIM; ++dim)
+        {
+          local_coords[ii * DIM + dim] += s[0] * cell[dim]
+                                          + s[1] * cell[DIM + dim]
+                                          + s[2] * cell[2 * DIM + dim];
+        }
+        local_list[ii] = ii;
+      }
+
+      generate_one_atom(numnei,
+                        local_coords.data(),
+                        local_species.data(),
+                        local_list.data(),
+                        numnei,
+                        zeta + i * Ndesc,
+                        grad_desc.data(),
+                        grad);
+    }
+    else
+    {
+      generate_one_atom(i,
+                        coords,
+                        particleSpeciesCodes,
+                        ilist,
+                        numnei,
+                        zeta + i * Ndesc,
+                        grad_desc.data(),
+                        grad);
+    }
+
+    if (!grad) { continue; }
+
+    // the last DIM components of each descriptor are associated with atom i
+    auto atom_id = [&](int const ii) { return ii < numnei ? ilist[ii] : i; };
+
+    if (dzetadr_forces)
+    {
+      for (int p = 0; p < Ndesc; ++p)
+      {
+        double const * const src = grad_desc.data() + p * (numnei + 1) * DIM;
+        double * const dst = dzetadr_forces + (i * Ndesc + p) * Ncontrib * DIM;
+        for (int ii = 0; ii <= numnei; ++ii)
+        {
+          int const org = image[atom_id(ii)];
+          for (int dim = 0; dim < DIM; ++dim)
+          {
+            dst[org * DIM + dim] += src[ii * DIM + dim];
+          }
+        }
+      }
+    }
+
+    if (sparse)
+    {
+      org_ids.clear();
+      for (int ii = 0; ii <= numnei; ++ii)
+      {
+        int const org = image[atom_id(ii)];
+        if (slot[org] < 0)
+        {
+          slot[org] = 0;
+          org_ids.push_back(org);
+        }
+      }
+      std::sort(org_ids.begin(), org_ids.end());
+
+      std::size_t const offset = sparse_value->size();
+      int const nblock = static_cast<int>(org_ids.size());
+      for (int s = 0; s < nblock; ++s)
+      {
+        slot[org_ids[s]] = s;
+        sparse_atom->push_back(i);
+        sparse_neigh->push_back(org_ids[s]);
+      }
+      sparse_value->resize(offset + nblock * Ndesc * DIM, 0.0);
+
+      double * const block = sparse_value->data() + offset;
+      for (int p = 0; p < Ndesc; ++p)
+      {
+        double const * const src = grad_desc.data() + p * (numnei + 1) * DIM;
+        for (int ii = 0; ii <= numnei; ++ii)
+        {
+          int const s = slot[image[atom_id(ii)]];
+          for (int dim = 0; dim < DIM; ++dim)
+          {
+            block[(s * Ndesc + p) * DIM + dim] += src[ii * DIM + dim];
+          }
+        }
+      }
+
+      for (int s = 0; s < nblock; ++s) { slot[org_ids[s]] = -1; }
+    }
+
+    if (dzetadr_stress)
+    {
+      for (int p = 0; p < Ndesc; ++p)
+      {
+        double const * const src = grad_desc.data() + p * (numnei + 1) * DIM;
+        double * const dst = dzetadr_stress + (i * Ndesc + p) * 6;
+        for (int ii = 0; ii <= numnei; ++ii)
+        {
+          double const * const g = src + ii * DIM;
+          double const * const r = shifts ? &local_coords[ii * DIM]
+                                          : coordinates[atom_id(ii)];
+          dst[0] += g[0] * r[0];
+          dst[1] += g[1] * r[1];
+          dst[2] += g[2] * r[2];
+          dst[3] += g[1] * r[2];
+          dst[4] += g[2] * r[0];
+          dst[5] += g[0] * r[1];
+        }
+      }
+    }
+  }
+}
+
 void Descriptor::sym_g1(double const r, double const rcut, double & phi)
 {
   phi = cutoff_func_(r, rcut);
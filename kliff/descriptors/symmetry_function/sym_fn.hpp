@@ -199,7 +199,85 @@ class Descriptor
                          double * const grad_desc,
                          bool const grad);
 
+  /*!
+   * \brief Compute the descriptor values of all contributing atoms in a
+   * configuration, and their derivatives w.r.t. the atomic coordinates for
+   * forces and stress.
+   *
+   * \param Ncontrib Number of contributing atoms
+   * \param coordinates Coordinates of all the atoms (contributing and padding)
+   * \param particleSpeciesCode Index number (code) of the particle species
+   * \param numneigh Number of neighbors of each contributing atom
+   * \param neighlist Neighborlist of all contributing atoms stacked into 1D
+   * \param image Index of the contributing atom that each atom is an image of
+   * \param zeta Descriptor of length Ncontrib*numDesc
+   * \param dzetadr_forces Dense gradient of the descriptor w.r.t. coordinates
+   * of contributing atoms, of length Ncontrib*numDesc*Ncontrib*DIM; ignored if
+   * \c nullptr
+   * \param dzetadr_stress Gradient of the descriptor for virial stress, of
+   * length Ncontrib*numDesc*6; ignored if \c nullptr
+   * \param sparse_value Sparse gradient of the descriptor, numDesc*DIM values
+   * for each (atom, neighbor) pair; ignored if \c nullptr
+   * \param sparse_atom Atom of each (atom, neighbor) pair
+   * \param sparse_neigh Contributing neighbor of each (atom, neighbor) pair
+   * \param num_threads Number of threads to split the atoms over
+   * \param shifts Integer cell shift vector of each neighbor in \c neighlist,
+   * of length DIM times its length; if not \c nullptr, there are no padding
+   * atoms, and a neighbor \c j is at the coordinates of atom \c j displaced by
+   * its shift vector times \c cell
+   * \param cell Cell of the configuration, each row a lattice vector; only used
+   * with \c shifts
+   *
+   * \note
+   * Padding atoms that are images of the same contributing atom are merged in
+   * both \c dzetadr_forces and the sparse gradient. For each atom, the
+   * neighbors of the sparse gradient are sorted in ascending order.
+   */
+  void generate_config(int const Ncontrib,
+                       double const * coordinates,
+                       int const * particleSpeciesCode,
+                       int const * numneigh,
+                       int const * neighlist,
+                       int const * image,
+                       double * const zeta,
+                       double * const dzetadr_forces,
+                       double * const dzetadr_stress,
+                       std::vector<double> * const sparse_value,
+                       std::vector<int> * const sparse_atom,
+                       std::vector<int> * const sparse_neigh,
+                       int const num_threads = 1,
+                       int const * shifts = nullptr,
+                       double const * cell = nullptr);
+
  private:
+  /*!
+   * \brief Compute the descriptor values and their derivatives of the
+   * contributing atoms in range [first, last) of a configuration.
+   *
+   * \param first Index of the first atom
+   * \param last One past the index of the last atom
+   * \param neighstart Offset of the neighbors of each atom in \c neighlist
+   *
+   * \sa generate_config for the other parameters.
+   */
+  void generate_atoms(int const first,
+                      int const last,
+                      int const Ncontrib,
+                      double const * coordinates,
+                      int const * particleSpeciesCode,
+                      int const * numneigh,
+                      int const * neighstart,
+                      int const * neighlist,
+                      int const * image,
+                      double * const zeta,
+                      double * const dzetadr_forces,
+                      double * const dzetadr_stress,
+                      std::vector<double> * const sparse_value,
+                      std::vector<int> * const sparse_atom,
+                      std::vector<int> * const sparse_neigh,
+                      int const * shifts,
+                      double const * cell);
+
   // Symmetry functions: Jorg Behler, J. Chem. Phys. 134, 074106, 2011.
 
   /*!
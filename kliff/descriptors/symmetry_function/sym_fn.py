@@ -6,6 +6,7 @@ from loguru import logger
 
 from kliff.descriptors.descriptor import (
     Descriptor,
+    SparseGradient,
     generate_full_cutoff,
     generate_species_code,
     generate_unique_cutoff_pairs,
@@ -46,6 +47,18 @@ class SymmetryFunction(Descriptor):
         Data type for the generated fingerprints, such as ``np.float32`` and
         ``np.float64``.
 
+    sparse_grad: bool (optional)
+        If ``True``, the gradients of the descriptor values w.r.t. atomic coordinates
+        for forces are stored sparsely as a
+        :class:`~kliff.descriptors.descriptor.SparseGradient`, keeping only the
+        blocks of each atom and its neighbors. This scales linearly with the number of
+        atoms, instead of quadratically as the dense array.
+
+    num_threads: int (optional)
+        Number of threads used by the C++ kernels to compute the descriptor values of
+        the atoms in a configuration. The kernels release the GIL, so several
+        configurations can also be transformed concurrently from Python threads.
+
     Example
     -------
 
@@ -80,11 +93,20 @@ class SymmetryFunction(Descriptor):
     """
 
     def __init__(
-        self, cut_dists, cut_name, hyperparams, normalize=True, dtype=np.float32
+        self,
+        cut_dists,
+        cut_name,
+        hyperparams,
+        normalize=True,
+        dtype=np.float32,
+        sparse_grad=False,
+        num_threads=1,
     ):
         super(SymmetryFunction, self).__init__(
             cut_dists, cut_name, hyperparams, normalize, dtype
         )
+        self.sparse_grad = sparse_grad
+        self.num_threads = num_threads
 
         self._desc = OrderedDict()
 
@@ -126,6 +148,8 @@ class SymmetryFunction(Descriptor):
             dzetadr_forces has shape (num_atoms, num_descriptors, num_atoms*DIM), where
             num_atoms and num_descriptors has the same meanings as described in zeta.
             DIM = 3 denotes three Cartesian coordinates.
+            If ``sparse_grad=True``, a
+            :class:`~kliff.descriptors.descriptor.SparseGradient` instead.
 
         dzetadr_stress: 3D array if fit_stress is ``True``, otherwise ``None``
             Gradient of descriptor values w.r.t. atomic coordinates for stress computation.
@@ -137,62 +161,38 @@ class SymmetryFunction(Descriptor):
 
         # create neighbor list
         infl_dist = max(self.cutoff.values())
-        nei = NeighborList(conf, infl_dist, padding_need_neigh=False)
+        # periodic images referred to by cell shift vectors, without padding atoms
+        nei = NeighborList(conf, infl_dist, use_shifts=True)
 
         coords = nei.coords
-        image = nei.image
-        species = np.asarray([self.species_code[i] for i in nei.species], dtype=np.intc)
+        image = np.asarray(nei.image, dtype=np.intc)
+        species = nei.get_species_code(self.species_code)
 
         Ncontrib = conf.get_num_atoms()
-        Ndesc = len(self)
-
-        grad = fit_forces or fit_stress
-
-        zeta_config = []
-        dzetadr_forces_config = []
-        dzetadr_stress_config = []
-
-        for i in range(Ncontrib):
-            neigh_indices, _, _ = nei.get_neigh(i)
-            neighlist = np.asarray(neigh_indices, dtype=np.intc)
-            zeta, dzetadr = self._cdesc.generate_one_atom(
-                i, coords, species, neighlist, grad
+        numneigh, _, neighlist = nei.get_csr()
+
+        zeta_config, dzetadr_forces_config, dzetadr_stress_config = (
+            self._cdesc.generate_config(
+                coords,
+                species,
+                neighlist,
+                numneigh,
+                image,
+                Ncontrib,
+                fit_forces,
+                fit_stress,
+                self.sparse_grad,
+                self.num_threads,
+                nei.get_shifts(),
+                np.asarray(conf.cell, dtype=np.double),
             )
+        )
 
-            zeta_config.append(zeta)
-
-            if grad:
-                # last 3 elements dzetadr is associated with atom i
-                atom_ids = np.concatenate((neigh_indices, [i]))
-                dzetadr = dzetadr.reshape(Ndesc, -1, 3)
-
-            if fit_forces:
-                dzetadr_forces = np.zeros((Ndesc, Ncontrib, 3))
-                for ii, idx in enumerate(atom_ids):
-                    org_idx = image[idx]
-                    dzetadr_forces[:, org_idx, :] += dzetadr[:, ii, :]
-                dzetadr_forces_config.append(dzetadr_forces.reshape(Ndesc, -1))
-
-            if fit_stress:
-                dzetadr_stress = np.zeros((Ndesc, 6))
-                for ii, idx in enumerate(atom_ids):
-                    dzetadr_stress[:, 0] += dzetadr[:, ii, 0] * coords[idx][0]
-                    dzetadr_stress[:, 1] += dzetadr[:, ii, 1] * coords[idx][1]
-                    dzetadr_stress[:, 2] += dzetadr[:, ii, 2] * coords[idx][2]
-                    dzetadr_stress[:, 3] += dzetadr[:, ii, 1] * coords[idx][2]
-                    dzetadr_stress[:, 4] += dzetadr[:, ii, 2] * coords[idx][0]
-                    dzetadr_stress[:, 5] += dzetadr[:, ii, 0] * coords[idx][1]
-                dzetadr_stress_config.append(dzetadr_stress)
-
-        zeta_config = np.asarray(zeta_config)
-        if fit_forces:
-            dzetadr_forces_config = np.asarray(dzetadr_forces_config)
-        else:
-            dzetadr_forces_config = None
-        if fit_stress:
-            dzetadr_stress_config = np.asarray(dzetadr_stress_config)
-        else:
-            dzetadr_stress_config = None
+        if fit_forces and self.sparse_grad:
+            value, atom, neigh = dzetadr_forces_config
+            dzetadr_forces_config = SparseGradient(
+                value=value, atom=atom.astype(np.int64), neigh=neigh.astype(np.int64)
+            )
 
         msg = (
             "=" * 25
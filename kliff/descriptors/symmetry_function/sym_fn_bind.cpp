@@ -1,6 +1,8 @@
 #include "sym_fn.hpp"
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
+
+#include <algorithm>
 #include <vector>
 
 namespace py = pybind11;
@@ -91,5 +93,142 @@ PYBIND11_MODULE(sf, m)
           py::arg("particleSpecies").noconvert(),
           py::arg("neighlist").noconvert(),
           py::arg("grad"),
-          "Return (zeta, grad_zeta)");
+          "Return (zeta, grad_zeta)")
+
+      .def(
+          "generate_config",
+          [](Descriptor & d,
+             py::array_t<double> coords,
+             py::array_t<int> particleSpecies,
+             py::array_t<int> neighlist,
+             py::array_t<int> numneigh,
+             py::array_t<int> image,
+             int Ncontrib,
+             bool fit_forces,
+             bool fit_stress,
+             bool sparse_grad,
+             int num_threads,
+             py::object shifts,
+             py::object cell) {
+            int const Ndescriptor = d.get_num_descriptors();
+            bool const dense_forces = fit_forces && !sparse_grad;
+            bool const sparse_forces = fit_forces && sparse_grad;
+
+            // create zero-initialized arrays to hold return data
+            py::array_t<double> zeta({Ncontrib, Ndescriptor});
+            std::fill_n(zeta.mutable_data(), zeta.size(), 0.0);
+
+            py::array_t<double> dzetadr_forces;
+            if (dense_forces)
+            {
+              dzetadr_forces = py::array_t<double>(
+                  {Ncontrib, Ndescriptor, Ncontrib * 3});
+              std::fill_n(
+                  dzetadr_forces.mutable_data(), dzetadr_forces.size(), 0.0);
+            }
+
+            py::array_t<double> dzetadr_stress;
+            if (fit_stress)
+            {
+              dzetadr_stress
+                  = py::array_t<double>({Ncontrib, Ndescriptor, 6});
+              std::fill_n(
+                  dzetadr_stress.mutable_data(), dzetadr_stress.size(), 0.0);
+            }
+
+            std::vector<double> value;
+            std::vector<int> atom;
+            std::vector<int> neigh;
+
+            double const * coords_ptr = coords.data(0);
+            int const * species_ptr = particleSpecies.data(0);
+            int const * numneigh_ptr = numneigh.data(0);
+            int const * neighlist_ptr
+                = neighlist.size() > 0 ? neighlist.data(0) : nullptr;
+            int const * image_ptr = image.data(0);
+            double * zeta_ptr = zeta.mutable_data();
+            double * forces_ptr
+                = dense_forces ? dzetadr_forces.mutable_data() : nullptr;
+            double * stress_ptr
+                = fit_stress ? dzetadr_stress.mutable_data() : nullptr;
+
+            // cell shift vectors of the neighbors, instead of padding atoms
+            py::array_t<int, py::array::c_style | py::array::forcecast>
+                shifts_arr;
+            py::array_t<double, py::array::c_style | py::array::forcecast>
+                cell_arr;
+            int const * shifts_ptr = nullptr;
+            double const * cell_ptr = nullptr;
+            if (!shifts.is_none())
+            {
+              shifts_arr = shifts.cast<decltype(shifts_arr)>();
+              if (!cell.is_none()) { cell_arr = cell.cast<decltype(cell_arr)>(); }
+              if (cell_arr.size() != 9)
+              {
+                throw std::runtime_error("\"cell\" is required with \"shifts\".");
+              }
+              shifts_ptr = shifts_arr.data();
+              cell_ptr = cell_arr.data();
+            }
+
+            {
+              // no Python objects are touched during the computation
+              py::gil_scoped_release release;
+
+              d.generate_config(Ncontrib,
+                                coords_ptr,
+                                species_ptr,
+                                numneigh_ptr,
+                                neighlist_ptr,
+                                image_ptr,
+                                zeta_ptr,
+                                forces_ptr,
+                                stress_ptr,
+                                sparse_forces ? &value : nullptr,
+                                sparse_forces ? &atom : nullptr,
+                                sparse_forces ? &neigh : nullptr,
+                                num_threads,
+                                shifts_ptr,
+                                cell_ptr);
+            }
+
+            py::none n;  // None
+
+            py::tuple t(3);
+            t[0] = zeta;
+
+            if (dense_forces) { t[1] = dzetadr_forces; }
+            else if (sparse_forces)
+            {
+              py::ssize_t const nnz = atom.size();
+              py::array_t<double> value_py(
+                  {nnz, py::ssize_t(Ndescriptor), py::ssize_t(3)});
+              std::copy(value.begin(), value.end(), value_py.mutable_data());
+              py::array_t<int> atom_py(nnz);
+              std::copy(atom.begin(), atom.end(), atom_py.mutable_data());
+              py::array_t<int> neigh_py(nnz);
+              std::copy(neigh.begin(), neigh.end(), neigh_py.mutable_data());
+              t[1] = py::make_tuple(value_py, atom_py, neigh_py);
+            }
+            else { t[1] = n; }
+
+            if (fit_stress) { t[2] = dzetadr_stress; }
+            else { t[2] = n; }
+
+            return t;
+          },
+          py::arg("coords").noconvert(),
+          py::arg("particleSpecies").noconvert(),
+          py::arg("neighlist").noconvert(),
+          py::arg("numneigh").noconvert(),
+          py::arg("image").noconvert(),
+          py::arg("Ncontrib"),
+          py::arg("fit_forces"),
+          py::arg("fit_stress"),
+          py::arg("sparse_grad"),
+          py::arg("num_threads") = 1,
+          py::arg("shifts") = py::none(),
+          py::arg("cell") = py::none(),
+          "Return (zeta, dzetadr_forces, dzetadr_stress) of all contributing "
+          "atoms; dzetadr_forces is a tuple (value, atom, neigh) if sparse_grad");
 }
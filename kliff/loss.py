@@ -1,4 +1,7 @@
+import hashlib
 import os
+import time
+from collections import OrderedDict
 from typing import Any, Callable, Dict, List, Optional
 
 import numpy as np
@@ -33,6 +36,13 @@ except ImportError:
     geodesicLM_avail = False
 
 
+# control words broadcast to the ranks in MPI mode
+_MPI_STOP = 0
+_MPI_RESIDUAL = 1
+_MPI_JACOBIAN = 2
+_MPI_LOSS = 3
+
+
 def energy_forces_residual(
     identifier: str,
     natoms: int,
@@ -165,6 +175,10 @@ def forces_residual(
     return residual
 
 
+# residual functions of the form `w * (prediction - reference)`
+_BUILTIN_RESIDUAL_FNS = (energy_forces_residual, energy_residual, forces_residual)
+
+
 class Loss:
     """
     Loss function class to optimize the potential parameters.
@@ -187,6 +201,8 @@ class Loss:
                 "normalize_by_natoms": True,
             }
             See the documentation of :meth:`energy_forces_residual` for more.
+        kwargs: extra keyword arguments passed to :class:`LossPhysicsMotivatedModel`
+            or :class:`LossNeuralNetworkModel`.
     """
 
     def __new__(
@@ -195,14 +211,15 @@ class Loss:
         nprocs: int = 1,
         residual_fn: Optional[Callable] = None,
         residual_data: Optional[Dict[str, Any]] = None,
+        **kwargs,
     ):
         if isinstance(calculator, CalculatorTorch):
             return LossNeuralNetworkModel(
-                calculator, nprocs, residual_fn, residual_data
+                calculator, nprocs, residual_fn, residual_data, **kwargs
             )
         else:
             return LossPhysicsMotivatedModel(
-                calculator, nprocs, residual_fn, residual_data
+                calculator, nprocs, residual_fn, residual_data, **kwargs
             )
 
 
@@ -224,6 +241,14 @@ class LossPhysicsMotivatedModel:
                 "normalize_by_natoms": True,
             }
             See the documentation of :meth:`energy_forces_residual` for more.
+        rebalance_after: The configurations are distributed to the processes (in
+            multiprocessing or MPI mode) to balance their costs estimated from the
+            number of atoms and neighbors. If provided, the configurations are
+            redistributed once after this number of residual evaluations, using the
+            compute time of each configuration measured in these evaluations.
+        cache_size: Number of the most recent residuals to keep, such that the residual
+            is not recomputed if it is requested again for the same parameters, e.g. in
+            a line search of the optimizer. Set to 0 to disable the cache.
     """
 
     scipy_minimize_methods = [
@@ -252,6 +277,8 @@ class LossPhysicsMotivatedModel:
         nprocs: int = 1,
         residual_fn: Optional[Callable] = None,
         residual_data: Optional[Dict[str, Any]] = None,
+        rebalance_after: Optional[int] = None,
+        cache_size: int = 4,
     ):
         default_residual_data = {
             "normalize_by_natoms": True,
@@ -261,6 +288,7 @@ class LossPhysicsMotivatedModel:
 
         self.calculator = calculator
         self.nprocs = nprocs
+        self.rebalance_after = rebalance_after
 
         self.residual_data = residual_data
 
@@ -292,6 +320,32 @@ class LossPhysicsMotivatedModel:
             # TODO this will not work for _WrapperCalculator
             self.residual_fn = residual_fn
 
+        # pool of worker processes for multiprocessing mode, created on first use
+        self._pool = None
+        self._pool_cas = None
+        self._pool_state = None
+        # what the workers of the pool compute: `residual`, `prediction`, or `jacobian`
+        self._pool_task = "residual"
+        # batch of parameter sets of the `loss_batch` task of the workers
+        self._pool_X = None
+
+        # layout of the residual used with the built-in residual functions, created on
+        # first use
+        self._residual_plan = None
+
+        # the most recent residuals, keyed by the parameters
+        self._residual_cache = _ResidualCache(cache_size)
+
+        # indices of the compute arguments of this rank in MPI mode, and the layout of
+        # the buffers to gather the residual, for the compute arguments `_mpi_cas`
+        self._mpi_cas = None
+        self._mpi_indices = None
+        self._mpi_layout = None
+
+        # compute time of each compute arguments accumulated for rebalancing
+        self._timings = None
+        self._num_timings = 0
+
         logger.debug(f"`{self.__class__.__name__}` instantiated.")
 
     def minimize(self, method: str = "L-BFGS-B", **kwargs):
@@ -307,6 +361,9 @@ class LossPhysicsMotivatedModel:
         """
         kwargs = self._adjust_kwargs(method, **kwargs)
 
+        # parameters not optimized may have been changed since the last minimization
+        self._residual_cache.clear()
+
         logger.info(f"Start minimization using method: {method}.")
         result = self._scipy_optimize(method, **kwargs)
         logger.info(f"Finish minimization using method: {method}.")
@@ -398,6 +455,8 @@ class LossPhysicsMotivatedModel:
                         minimize_fn = geodesiclm
                 else:
                     minimize_fn = scipy.optimize.least_squares
+                    if "jac" not in kwargs and self._has_jacobian():
+                        kwargs["jac"] = self._get_jacobian_MPI
                 func = self._get_residual_MPI
 
             elif method in self.scipy_minimize_methods:
@@ -406,12 +465,10 @@ class LossPhysicsMotivatedModel:
 
             if rank == 0:
                 result = minimize_fn(func, x, method=method, **kwargs)
-                # notify other process to break func
-                break_flag = True
-                for i in range(1, size):
-                    comm.send(break_flag, dest=i, tag=i)
+                # notify other processes to break the loop
+                self._bcast_MPI_command(_MPI_STOP, x)
             else:
-                func(x)
+                self._run_MPI_worker()
                 result = None
 
             result = comm.bcast(result, root=0)
@@ -447,6 +504,8 @@ class LossPhysicsMotivatedModel:
                         minimize_fn = geodesiclm
                 else:
                     minimize_fn = scipy.optimize.least_squares
+                    if "jac" not in kwargs and self._has_jacobian():
+                        kwargs["jac"] = self._get_jacobian
 
                 func = self._get_residual
             elif method in self.scipy_minimize_methods:
@@ -471,48 +530,264 @@ class LossPhysicsMotivatedModel:
         self.calculator.update_model_params(x)
 
         cas = self.calculator.get_compute_arguments()
+        state = _get_fixed_params_state(self.calculator)
+
+        residual = self._residual_cache.get(x, cas, state)
+        if residual is not None:
+            return residual
+
+        residual = self._compute_residual(x, cas)
+        self._residual_cache.put(x, cas, state, residual)
+
+        return residual
+
+    def _compute_residual(self, x, cas):
+        """
+        Compute the residual of the compute arguments `cas`, with the parameters `x`
+        already published to the predictor.
+        """
+        plan = self._get_residual_plan()
+
+        if self.nprocs > 1:
+            pool = self._get_pool()
+            results = pool.map((x, "residual" if plan is None else "prediction"))
+            if self._add_timings(pool.timings):
+                logger.info("Rebalancing configurations using measured compute time.")
+                self._create_pool(self._pool_cas, self._timings)
+            if plan is None:
+                return np.concatenate(results)
+            plan.set_predictions(results)
+            return plan.get_residual()
 
-        # TODO the if else could be combined
         if isinstance(self.calculator, _WrapperCalculator):
-            X = zip(cas, self.calc_list, self.residual_fn)
-            if self.nprocs > 1:
-                residuals = parallel.parmap2(
-                    self._get_residual_single_config,
-                    X,
-                    self.residual_data,
-                    nprocs=self.nprocs,
-                    tuple_X=True,
-                )
-                residual = np.concatenate(residuals)
-            else:
-                residual = []
-                for ca, calculator, residual_fn in X:
-                    current_residual = self._get_residual_single_config(
-                        ca, calculator, residual_fn, self.residual_data
-                    )
-                    residual = np.concatenate((residual, current_residual))
+            X = list(zip(cas, self.calc_list, self.residual_fn))
+        else:
+            X = [(ca, self.calculator, self.residual_fn) for ca in cas]
 
+        if plan is not None:
+            for i, (ca, calculator, _) in enumerate(X):
+                calculator.compute(ca)
+                plan.set_prediction(i, ca)
+            return plan.get_residual()
+
+        residual = [
+            self._get_residual_single_config(
+                ca, calculator, residual_fn, self.residual_data
+            )
+            for ca, calculator, residual_fn in X
+        ]
+
+        return np.concatenate(residual)
+
+    def _get_jacobian(self, x):
+        """
+        Compute the Jacobian of the residual in serial or multiprocessing mode.
+
+        This is passed as the `jac` argument of scipy.optimize.least_squares, if the
+        Jacobian can be computed analytically (see :meth:`_has_jacobian`).
+
+        Args:
+            x: optimizing parameter values, 1D array
+
+        Returns:
+            2D array of shape (S, M), where `S` is the size of the residual and `M` the
+            number of optimizing parameters.
+        """
+        self.calculator.update_model_params(x)
+
+        if self.nprocs > 1:
+            jacobians = self._get_pool().map((x, "jacobian"))
         else:
-            if self.nprocs > 1:
-                residuals = parallel.parmap2(
-                    self._get_residual_single_config,
-                    cas,
-                    self.calculator,
-                    self.residual_fn,
-                    self.residual_data,
-                    nprocs=self.nprocs,
-                    tuple_X=False,
+            jacobians = [
+                self._get_jacobian_single_config(
+                    ca, self.calculator, self.residual_fn, self.residual_data
                 )
-                residual = np.concatenate(residuals)
-            else:
-                residual = []
-                for ca in cas:
-                    current_residual = self._get_residual_single_config(
-                        ca, self.calculator, self.residual_fn, self.residual_data
-                    )
-                    residual = np.concatenate((residual, current_residual))
+                for ca in self.calculator.get_compute_arguments()
+            ]
 
-        return residual
+        return np.concatenate(jacobians)
+
+    def _has_jacobian(self) -> bool:
+        """
+        Whether the Jacobian of the residual can be computed analytically.
+
+        This requires the model to provide the Jacobian of the prediction, and the
+        residual function to be one of the built-in ones, which are linear in the
+        prediction.
+        """
+        if isinstance(self.calculator, _WrapperCalculator):
+            return False
+        if not self._has_builtin_residual_fn():
+            return False
+        return self.calculator.has_jacobian()
+
+    def _has_builtin_residual_fn(self) -> bool:
+        """
+        Whether the residual functions of all compute arguments are built-in ones.
+        """
+        if isinstance(self.calculator, _WrapperCalculator):
+            fns = self.residual_fn
+        else:
+            fns = [self.residual_fn]
+        return all(fn in _BUILTIN_RESIDUAL_FNS for fn in fns)
+
+    def _get_residual_plan(self) -> Optional["_ResidualPlan"]:
+        """
+        Get the layout of the residual of the compute arguments.
+
+        The layout is only used with the built-in residual functions; `None` is
+        returned for a custom residual function, which is then called for each compute
+        arguments. It is created on first use and recreated if the compute arguments of
+        the calculator change (e.g. in bootstrapping).
+        """
+        if not self._has_builtin_residual_fn():
+            return None
+
+        cas = self.calculator.get_compute_arguments()
+
+        if self._residual_plan is not None and _same_items(
+            cas, self._residual_plan.cas
+        ):
+            return self._residual_plan
+
+        if isinstance(self.calculator, _WrapperCalculator):
+            calculators = self.calc_list
+            residual_fns = self.residual_fn
+        else:
+            calculators = [self.calculator] * len(cas)
+            residual_fns = [self.residual_fn] * len(cas)
+
+        self._residual_plan = _ResidualPlan(
+            cas, calculators, residual_fns, self.residual_data
+        )
+
+        return self._residual_plan
+
+    def _get_pool(self) -> parallel.WorkerPool:
+        """
+        Get the pool of worker processes used in multiprocessing mode.
+
+        The pool is created on first use, with each worker holding a shard of the
+        compute arguments, and it is reused by all subsequent evaluations such that
+        only the parameters are sent to the workers. It is recreated if the compute
+        arguments of the calculator change (e.g. in bootstrapping), or if the parameters
+        not optimized change, since the workers hold copies of the model made when the
+        pool is created.
+        """
+        cas = self.calculator.get_compute_arguments()
+        state = _get_fixed_params_state(self.calculator)
+
+        if (
+            self._pool is not None
+            and _same_items(cas, self._pool_cas)
+            and state == self._pool_state
+        ):
+            return self._pool
+
+        costs = [_get_compute_cost(ca) for ca in cas]
+        self._create_pool(cas, costs)
+
+        self._timings = None
+        self._num_timings = 0
+
+        return self._pool
+
+    def _create_pool(self, cas, costs):
+        """
+        Create the pool of worker processes, with the compute arguments distributed to
+        balance their costs.
+        """
+        if self._pool is not None:
+            self._pool.close()
+
+        if isinstance(self.calculator, _WrapperCalculator):
+            self._pool = parallel.WorkerPool(
+                self._get_pool_single_config,
+                zip(cas, self.calc_list, self.residual_fn),
+                self.residual_data,
+                update=self._update_pool_worker,
+                shard_f=self._get_pool_loss_batch,
+                tuple_X=True,
+                nprocs=self.nprocs,
+                costs=costs,
+            )
+        else:
+            self._pool = parallel.WorkerPool(
+                self._get_pool_single_config,
+                cas,
+                self.calculator,
+                self.residual_fn,
+                self.residual_data,
+                update=self._update_pool_worker,
+                shard_f=self._get_pool_loss_batch,
+                tuple_X=False,
+                nprocs=self.nprocs,
+                costs=costs,
+            )
+        self._pool_cas = list(cas)
+        self._pool_state = _get_fixed_params_state(self.calculator)
+
+        logger.debug(f"Worker pool of {self.nprocs} processes created.")
+
+    def _add_timings(self, timings) -> bool:
+        """
+        Accumulate the measured compute time of the compute arguments.
+
+        Returns:
+            Whether it is time to rebalance the compute arguments using the accumulated
+            compute time.
+        """
+        if self.rebalance_after is None or self._num_timings >= self.rebalance_after:
+            return False
+
+        if self._timings is None:
+            self._timings = np.asarray(timings, dtype=float)
+        else:
+            self._timings = self._timings + np.asarray(timings, dtype=float)
+        self._num_timings += 1
+
+        return self._num_timings == self.rebalance_after
+
+    def _update_pool_worker(self, p):
+        """
+        Called in each worker of the pool with `p = (x, task)` to publish the
+        parameters `x`, and select whether to compute the residual, the prediction, or
+        the Jacobian of the residual. For the `loss_batch` task, `x` is the batch of
+        parameter sets, published one at a time by :meth:`_get_pool_loss_batch`.
+        """
+        x, task = p
+        if task == "loss_batch":
+            self._pool_X = x
+        else:
+            self.calculator.update_model_params(x)
+        self._pool_task = task
+
+    def _get_pool_loss_batch(self, X, *args):
+        """
+        Called in each worker of the pool with the data `X` of the worker, to compute
+        the partial loss of its compute arguments for each parameter set of the batch.
+        """
+        losses = np.zeros(len(self._pool_X))
+        for k, x in enumerate(self._pool_X):
+            self.calculator.update_model_params(x)
+            for x_ca in X:
+                residual = self._get_residual_single_config(*x_ca, *args)
+                losses[k] += 0.5 * np.dot(residual, residual)
+
+        return losses
+
+    def _get_pool_single_config(self, ca, calculator, residual_fn, residual_data):
+        if self._pool_task == "jacobian":
+            return self._get_jacobian_single_config(
+                ca, calculator, residual_fn, residual_data
+            )
+        elif self._pool_task == "prediction":
+            calculator.compute(ca)
+            return calculator.get_prediction(ca)
+        else:
+            return self._get_residual_single_config(
+                ca, calculator, residual_fn, residual_data
+            )
 
     def _get_loss(self, x):
         """
@@ -528,75 +803,264 @@ class LossPhysicsMotivatedModel:
         loss = 0.5 * np.linalg.norm(residual) ** 2
         return loss
 
+    def get_loss_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Compute the loss of a batch of parameter sets in serial or multiprocessing
+        mode, e.g. of all the walkers of an MCMC sampler.
+
+        Each parameter set is published to the predictor once, and the loss is then
+        computed over all the compute arguments. In multiprocessing mode, the whole
+        batch is sent to the workers of the pool in a single round trip, and each
+        worker loops over the parameter sets, computing the partial loss of its share
+        of the compute arguments. The parameters of the calculator are restored
+        afterwards.
+
+        Args:
+            X: 2D array of shape (K, M), where `K` is the number of parameter sets and
+                `M` the number of optimizing parameters.
+
+        Returns:
+            1D array of shape (K,) of the loss of each parameter set.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.double))
+
+        x0 = np.array(self.calculator.get_opt_params(), dtype=np.double)
+        try:
+            if self.nprocs > 1 and self.calculator.get_compute_arguments():
+                results = self._get_pool().map_shard((X, "loss_batch"))
+                losses = np.sum(results, axis=0)
+            else:
+                losses = np.asarray([self._get_loss(x) for x in X], dtype=np.double)
+        finally:
+            self.calculator.update_model_params(x0)
+
+        return losses
+
     def _get_residual_MPI(self, x):
-        def residual_my_chunk(x):
-            # broadcast parameters
-            x = comm.bcast(x, root=0)
-            # publish params x to predictor
+        cas = self.calculator.get_compute_arguments()
+        state = _get_fixed_params_state(self.calculator)
+        residual = self._residual_cache.get(x, cas, state)
+        if residual is not None:
             self.calculator.update_model_params(x)
-
-            residual = []
-            for ca in cas:
-                current_residual = self._get_residual_single_config(
-                    ca, self.calculator, self.residual_fn, self.residual_data
-                )
-                residual.extend(current_residual)
             return residual
 
+        self._bcast_MPI_command(_MPI_RESIDUAL, x)
+        residual = self._evaluate_MPI(_MPI_RESIDUAL, x)
+        self._residual_cache.put(x, cas, state, residual)
+
+        return residual
+
+    def _get_jacobian_MPI(self, x):
+        self._bcast_MPI_command(_MPI_JACOBIAN, x)
+        return self._evaluate_MPI(_MPI_JACOBIAN, x)
+
+    def _get_loss_MPI(self, x):
+        residual = self._residual_cache.get(
+            x,
+            self.calculator.get_compute_arguments(),
+            _get_fixed_params_state(self.calculator),
+        )
+        if residual is not None:
+            self.calculator.update_model_params(x)
+            return 0.5 * np.linalg.norm(residual) ** 2
+
+        self._bcast_MPI_command(_MPI_LOSS, x)
+        return self._evaluate_MPI(_MPI_LOSS, x)
+
+    def _bcast_MPI_command(self, command=None, x=None):
+        """
+        Broadcast a control word and the parameters from rank 0 to all ranks.
+
+        Both are sent in a single float64 buffer: the control word followed by the
+        parameter values.
+
+        Returns:
+            The control word and the parameters.
+        """
+        comm = MPI.COMM_WORLD
+
+        buf = np.empty(1 + self.calculator.get_num_opt_params(), dtype=np.double)
+        if comm.Get_rank() == 0:
+            buf[0] = command
+            buf[1:] = x
+        comm.Bcast(buf, root=0)
+
+        return int(buf[0]), buf[1:]
+
+    def _run_MPI_worker(self):
+        """
+        Loop of the ranks other than rank 0: wait for a command from rank 0 and carry
+        it out, until told to stop.
+        """
+        while True:
+            command, x = self._bcast_MPI_command()
+            if command == _MPI_STOP:
+                break
+            self._evaluate_MPI(command, x)
+
+    def _evaluate_MPI(self, command, x):
+        """
+        Compute the residual, its Jacobian, or the loss in MPI mode, depending on
+        `command`. This is called by all ranks at the same time.
+
+        Each rank computes the results of its compute arguments. The residuals and
+        Jacobians are collected on rank 0 with `Gatherv` into float64 buffers, whose
+        layout is computed once for the compute arguments, and the loss is the
+        `Allreduce` of partial sums of squares.
+
+        Returns:
+            The result on rank 0, and `None` on other ranks.
+        """
         comm = MPI.COMM_WORLD
         rank = comm.Get_rank()
-        size = comm.Get_size()
+
+        # publish params x to predictor
+        self.calculator.update_model_params(x)
 
         # get my chunk of data
-        cas = self._split_data()
+        # split again if the compute arguments change (e.g. in bootstrapping)
+        cas = self.calculator.get_compute_arguments()
+        if self._mpi_indices is None or not _same_items(cas, self._mpi_cas):
+            self._mpi_cas = list(cas)
+            self._mpi_indices = self._split_data()
+            self._mpi_layout = None
+            self._timings = None
+            self._num_timings = 0
+        indices = self._mpi_indices
+
+        if command == _MPI_JACOBIAN:
+            fn = self._get_jacobian_single_config
+        else:
+            fn = self._get_residual_single_config
+
+        results = []
+        timings = []
+        for i in indices:
+            start = time.perf_counter()
+            results.append(
+                fn(cas[i], self.calculator, self.residual_fn, self.residual_data)
+            )
+            timings.append(time.perf_counter() - start)
 
-        while True:
+        if command == _MPI_LOSS:
+            partial = np.asarray([sum(np.dot(r, r) for r in results)], dtype=np.double)
+            total = np.empty(1, dtype=np.double)
+            comm.Allreduce(partial, total, op=MPI.SUM)
+            out = 0.5 * total[0]
+        else:
+            out = self._gather_MPI(indices, results, len(cas), command == _MPI_JACOBIAN)
+
+        # all ranks reach here for each evaluation, so they agree on when to rebalance
+        if command != _MPI_JACOBIAN:
+            all_timings = np.zeros(len(cas))
+            all_timings[indices] = timings
+            if self._add_timings(all_timings):
+                self._mpi_indices = self._split_data(
+                    comm.allreduce(self._timings, op=MPI.SUM)
+                )
+                self._mpi_layout = None
+
+        return out if rank == 0 else None
+
+    def _gather_MPI(self, indices, results, ncas, jacobian=False):
+        """
+        Gather the residuals (1D), or Jacobians (2D) if `jacobian=True`, of the compute
+        arguments of all ranks on rank 0, in the order of the compute arguments.
+        """
+        comm = MPI.COMM_WORLD
+        rank = comm.Get_rank()
+
+        if self._mpi_layout is None:
+            self._mpi_layout = self._get_MPI_layout(indices, results, ncas)
+        counts, displs, order, residual_buf, send_buf = self._mpi_layout
+
+        if jacobian:
+            ncols = self.calculator.get_num_opt_params()
+            if results:
+                local = np.ascontiguousarray(np.concatenate(results), dtype=np.double)
+            else:
+                local = np.empty((0, ncols), dtype=np.double)
             if rank == 0:
-                break_flag = False
-                for i in range(1, size):
-                    comm.send(break_flag, dest=i, tag=i)
-                residual = residual_my_chunk(x)
-                all_residuals = comm.gather(residual, root=0)
-                return np.concatenate(all_residuals)
+                buf = np.empty(int(np.sum(counts)) * ncols, dtype=np.double)
+                recv = [buf, counts * ncols, displs * ncols, MPI.DOUBLE]
             else:
-                break_flag = comm.recv(source=0, tag=rank)
-                if break_flag:
-                    break
-                else:
-                    residual = residual_my_chunk(x)
-                    all_residuals = comm.gather(residual, root=0)
+                recv = None
+            comm.Gatherv(local, recv, root=0)
+            if rank == 0:
+                return buf.reshape(-1, ncols)[order]
+        else:
+            if results:
+                np.concatenate(results, out=send_buf)
+            if rank == 0:
+                recv = [residual_buf, counts, displs, MPI.DOUBLE]
+            else:
+                recv = None
+            comm.Gatherv(send_buf, recv, root=0)
+            if rank == 0:
+                return residual_buf[order]
 
-    def _get_loss_MPI(self, x):
+    def _get_MPI_layout(self, indices, results, ncas):
+        """
+        Compute the layout of the gathered residual buffer on rank 0.
+
+        Returns:
+            counts: number of residual components of each rank
+            displs: displacement of the residual of each rank in the buffer
+            order: index array to reorder the buffer to the order of the compute
+                arguments
+            residual_buf: preallocated receive buffer of rank 0
+            send_buf: preallocated send buffer of this rank
+        """
         comm = MPI.COMM_WORLD
         rank = comm.Get_rank()
 
-        residual = self._get_residual_MPI(x)
-        if rank == 0:
-            loss = 0.5 * np.linalg.norm(residual) ** 2
-        else:
-            loss = None
+        sizes = [len(r) for r in results]
+        send_buf = np.empty(sum(sizes), dtype=np.double)
+
+        # this is done once, so it is fine to gather Python objects
+        all_sizes = comm.gather((indices, sizes), root=0)
+        if rank != 0:
+            return None, None, None, None, send_buf
+
+        counts = np.asarray([sum(s) for _, s in all_sizes], dtype=int)
+        displs = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+
+        # start and size of the residual of each compute arguments in the buffer
+        start = np.zeros(ncas, dtype=int)
+        size = np.zeros(ncas, dtype=int)
+        offset = 0
+        for idx, s in all_sizes:
+            for i, n in zip(idx, s):
+                start[i] = offset
+                size[i] = n
+                offset += n
+        order = np.concatenate(
+            [np.arange(b, b + n) for b, n in zip(start, size)] + [np.empty(0, int)]
+        )
+        residual_buf = np.empty(offset, dtype=np.double)
 
-        return loss
+        return counts, displs, order, residual_buf, send_buf
+
+    def _split_data(self, costs=None) -> List[int]:
+        """
+        Get the indices of the compute arguments of this rank in MPI mode.
+
+        The compute arguments are distributed with the LPT algorithm (see
+        :meth:`kliff.parallel.lpt_partition`) to balance their costs across the ranks.
 
-    # NOTE this function can be called only once, no need to call it each time
-    # _get_residual_MPI is called
-    def _split_data(self):
+        Args:
+            costs: cost of each compute arguments. If `None`, it is estimated from the
+                number of atoms and neighbors of the configurations.
+        """
         comm = MPI.COMM_WORLD
         rank = comm.Get_rank()
         size = comm.Get_size()
 
-        # get a portion of data based on rank
-        cas = self.calculator.get_compute_arguments()
-        # random.shuffle(cas)
-
-        rank_size = len(cas) // size
-        # last rank deal with the case where len(cas) cannot evenly divide size
-        if rank == size - 1:
-            cas = cas[rank_size * rank :]
-        else:
-            cas = cas[rank_size * rank : rank_size * (rank + 1)]
+        if costs is None:
+            cas = self.calculator.get_compute_arguments()
+            costs = [_get_compute_cost(ca) for ca in cas]
 
-        return cas
+        return parallel.lpt_partition(costs, size)[rank]
 
     @staticmethod
     def _get_residual_single_config(ca, calculator, residual_fn, residual_data):
@@ -616,6 +1080,26 @@ class LossPhysicsMotivatedModel:
 
         return residual
 
+    @staticmethod
+    def _get_jacobian_single_config(ca, calculator, residual_fn, residual_data):
+        # Jacobian of the prediction w.r.t. the optimizing parameters
+        jacobian = calculator.compute_jacobian(ca)
+
+        conf = ca.conf
+        identifier = conf.identifier
+        weight = conf.weight
+        natoms = conf.get_num_atoms()
+
+        # the built-in residual functions are linear in the prediction, so the
+        # Jacobian of the residual is the residual of each column w.r.t. zero
+        zero = np.zeros(jacobian.shape[0])
+        columns = [
+            residual_fn(identifier, natoms, weight, jacobian[:, k], zero, residual_data)
+            for k in range(jacobian.shape[1])
+        ]
+
+        return np.stack(columns, axis=1)
+
 
 class LossNeuralNetworkModel(object):
     """
@@ -774,22 +1258,124 @@ class LossNeuralNetworkModel(object):
             epoch_loss += float(loss)
         return epoch_loss
 
-    # TODO this is nice since it is simple and gives user the opportunity to provide a
-    #  loss function based on each data point. However, this is slow without
-    #  vectorization. Should definitely modify it and use vectorized loss function.
-    #  The way going forward is to batch all necessary info in dataloader.
-    #  The downsides is that then analytic and machine learning models will have
-    #  different interfaces.
     def _get_loss_batch(self, batch: List[Any], normalize: bool = True):
         """
         Compute the loss of a batch of samples.
 
+        If `residual_fn` is one of the built-in residual functions, the loss of the
+        whole batch is computed with vectorized tensor operations on the collated batch.
+        Otherwise, `residual_fn` is called for each configuration.
+
         Args:
             batch: A list of samples.
             normalize: If `True`, normalize the loss of the batch by the size of the
                 batch. Note, how to normalize the loss of a single configuration is
                 determined by the `normalize` flag of `residual_data`.
         """
+        if self._use_vectorized_loss():
+            loss_batch = self._get_loss_batch_vectorized(batch)
+        else:
+            loss_batch = self._get_loss_batch_per_config(batch)
+
+        if normalize:
+            loss_batch /= len(batch)
+
+        return loss_batch
+
+    def _use_vectorized_loss(self) -> bool:
+        """
+        Whether the loss can be computed by :meth:`_get_loss_batch_vectorized`, which
+        reproduces the built-in residual functions.
+        """
+        use_energy = self.calculator.use_energy
+        use_forces = self.calculator.use_forces
+        if self.calculator.use_stress:
+            return False
+        if self.residual_fn is energy_forces_residual:
+            return use_energy
+        if self.residual_fn is energy_residual:
+            return use_energy and not use_forces
+        if self.residual_fn is forces_residual:
+            return use_forces and not use_energy
+        return False
+
+    def _get_loss_batch_vectorized(self, batch: List[Any]):
+        """
+        Compute the (unnormalized) loss of a batch using the packed tensors of the
+        collated batch. See :class:`~kliff.dataset.dataset_torch.FingerprintsBatch`.
+        """
+        batch = self.calculator._as_batch(batch)
+        device = self.calculator.model.device
+
+        results = self.calculator.compute_batch(batch)
+
+        config_weight = batch.config_weight.to(device)
+        if self.residual_data["normalize_by_natoms"]:
+            config_weight = config_weight / batch.natoms.to(device)
+
+        loss = 0
+        if self.calculator.use_energy:
+            weight = config_weight * batch.energy_weight.to(device)
+            residual = weight * (results["energy"] - batch.energy.to(device))
+            loss = loss + torch.sum(torch.pow(residual, 2))
+
+        if self.calculator.use_forces:
+            atom_config = batch.atom_config.to(device)
+            weight = config_weight[atom_config, None] * batch.forces_weight.to(device)
+            residual = weight * (results["forces"] - batch.forces.to(device))
+            loss = loss + torch.sum(torch.pow(residual, 2))
+
+        return loss
+
+    def _get_loss_ensemble(
+        self,
+        batch: List[Any],
+        params: Dict[str, Any],
+        buffers: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Compute the (unnormalized) loss of each configuration in a batch for an
+        ensemble of models, a 2D tensor of shape (K, B), where `K` is the number of
+        models and `B` the number of configurations.
+
+        This reproduces the built-in residual functions, see
+        :meth:`_use_vectorized_loss`. See
+        :meth:`~kliff.calculators.CalculatorTorch.compute_batch_ensemble` for `params`
+        and `buffers`.
+        """
+        batch = self.calculator._as_batch(batch)
+        device = self.calculator.model.device
+
+        results = self.calculator.compute_batch_ensemble(batch, params, buffers)
+
+        config_weight = batch.config_weight.to(device)
+        if self.residual_data["normalize_by_natoms"]:
+            config_weight = config_weight / batch.natoms.to(device)
+
+        loss = 0
+        if self.calculator.use_energy:
+            weight = config_weight * batch.energy_weight.to(device)
+            residual = weight * (results["energy"] - batch.energy.to(device))
+            loss = loss + torch.pow(residual, 2)
+
+        if self.calculator.use_forces:
+            atom_config = batch.atom_config.to(device)
+            weight = config_weight[atom_config, None] * batch.forces_weight.to(device)
+            residual = weight * (results["forces"] - batch.forces.to(device))
+            loss_atom = torch.sum(torch.pow(residual, 2), dim=-1)
+            loss = loss + torch.zeros(
+                (loss_atom.shape[0], len(batch)),
+                dtype=loss_atom.dtype,
+                device=loss_atom.device,
+            ).index_add(1, atom_config, loss_atom)
+
+        return loss
+
+    def _get_loss_batch_per_config(self, batch: List[Any]):
+        """
+        Compute the (unnormalized) loss of a batch by calling `residual_fn` for each
+        configuration.
+        """
         results = self.calculator.compute(batch)
         energy_batch = results["energy"]
         forces_batch = results["forces"]
@@ -809,11 +1395,8 @@ class LossNeuralNetworkModel(object):
         ):
             loss = self._get_loss_single_config(sample, energy, forces, stress)
             losses.append(loss)
-        loss_batch = torch.stack(losses).sum()
-        if normalize:
-            loss_batch /= len(batch)
 
-        return loss_batch
+        return torch.stack(losses).sum()
 
     def _get_loss_single_config(self, sample, pred_energy, pred_forces, pred_stress):
         device = self.calculator.model.device
@@ -868,6 +1451,210 @@ class LossNeuralNetworkModel(object):
         self.optimizer.load_state_dict(torch.load(path))
 
 
+class _ResidualPlan:
+    """
+    Precomputed layout of the residual of a list of compute arguments.
+
+    The built-in residual functions compute `w * (prediction - reference)`, where the
+    weight `w` of each component combines the configuration weight, the energy or
+    forces weight, and the normalization by the number of atoms. The references and
+    the weights of all compute arguments are flattened once into 1D arrays, the
+    predictions are written into a preallocated buffer, and the residual is then
+    obtained with a single vectorized operation.
+
+    Args:
+        cas: compute arguments.
+        calculators: calculator of each compute arguments.
+        residual_fns: built-in residual function of each compute arguments.
+        residual_data: data passed to the residual functions.
+    """
+
+    def __init__(
+        self,
+        cas: List[Any],
+        calculators: List[Any],
+        residual_fns: List[Callable],
+        residual_data: Dict[str, Any],
+    ):
+        self.cas = list(cas)
+
+        references = []
+        weights = []
+        for ca, calculator, residual_fn in zip(self.cas, calculators, residual_fns):
+            ref = np.asarray(calculator.get_reference(ca), dtype=np.double)
+
+            # the residual functions are linear in the prediction, so the weights are
+            # the residual of a prediction of ones w.r.t. a reference of zeros
+            conf = ca.conf
+            w = residual_fn(
+                conf.identifier,
+                conf.get_num_atoms(),
+                conf.weight,
+                np.ones(len(ref)),
+                np.zeros(len(ref)),
+                residual_data,
+            )
+
+            references.append(ref)
+            weights.append(np.broadcast_to(w, ref.shape))
+
+        sizes = [len(r) for r in references]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).astype(int)
+        self.reference = np.concatenate(references) if references else np.zeros(0)
+        self.weight = np.concatenate(weights) if weights else np.zeros(0)
+        self.prediction = np.zeros_like(self.reference)
+
+    def set_prediction(self, i: int, ca):
+        """
+        Write the prediction of the `i`-th compute arguments into the buffer.
+        """
+        pred = self.prediction
+        start = self.offsets[i]
+
+        if ca.compute_energy:
+            pred[start : start + 1] = ca.results["energy"]
+            start += 1
+
+        if ca.compute_forces:
+            forces = np.ravel(ca.results["forces"])
+            pred[start : start + len(forces)] = forces
+            start += len(forces)
+
+        if ca.compute_stress:
+            pred[start : start + 6] = ca.results["stress"]
+            start += 6
+
+        if start != self.offsets[i + 1]:
+            raise LossError(
+                f"Size of the prediction of configuration `{ca.conf.identifier}` "
+                "does not match that of the reference."
+            )
+
+    def set_predictions(self, predictions: List[np.ndarray]):
+        """
+        Write the 1D predictions of all compute arguments into the buffer.
+        """
+        np.concatenate(predictions, out=self.prediction)
+
+    def get_residual(self) -> np.ndarray:
+        """
+        Residual of the predictions in the buffer.
+        """
+        return self.weight * (self.prediction - self.reference)
+
+
+def _get_compute_cost(ca) -> float:
+    """
+    Estimate the cost of computing the properties of a configuration.
+
+    This is the number of neighbors of the contributing atoms if the compute arguments
+    hold a :class:`~kliff.neighbor.NeighborList`, and otherwise the number of atoms.
+    """
+    natoms = ca.conf.get_num_atoms()
+    numneigh = getattr(getattr(ca, "neigh", None), "numneigh", None)
+    if numneigh is None:
+        return float(natoms)
+    return float(natoms + np.sum(numneigh[:natoms]))
+
+
+class _ResidualCache:
+    """
+    Cache of the most recent residuals, keyed by the optimizing parameters they are
+    computed with, and the state of the parameters not optimized (see
+    :func:`_get_fixed_params_state`).
+
+    A cached residual is only valid for the compute arguments it is computed from; the
+    cache is cleared if the compute arguments change (e.g. in bootstrapping).
+
+    Args:
+        maxsize: Maximum number of residuals to keep. The least recently used one is
+            discarded first. The cache is disabled if `0`.
+    """
+
+    def __init__(self, maxsize: int = 4):
+        self.maxsize = maxsize
+        self._cas = None
+        self._items = OrderedDict()
+
+    def get(self, x, cas, state: bytes) -> Optional[np.ndarray]:
+        """
+        Get the residual computed with parameters `x` and fixed parameters `state`, or
+        `None` if it is not cached.
+        """
+        if not _same_items(cas, self._cas):
+            self.clear()
+            return None
+
+        key = self._key(x, state)
+        residual = self._items.get(key)
+        if residual is None:
+            return None
+
+        self._items.move_to_end(key)
+        return residual.copy()
+
+    def put(self, x, cas, state: bytes, residual: np.ndarray):
+        """
+        Add the residual computed with parameters `x` and fixed parameters `state` from
+        compute arguments `cas`.
+        """
+        if self.maxsize <= 0:
+            return
+
+        if not _same_items(cas, self._cas):
+            self.clear()
+            self._cas = list(cas)
+
+        self._items[self._key(x, state)] = np.array(residual, copy=True)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._cas = None
+        self._items.clear()
+
+    @staticmethod
+    def _key(x, state: bytes) -> bytes:
+        return np.asarray(x, dtype=np.double).tobytes() + state
+
+
+def _get_fixed_params_state(calculator) -> bytes:
+    """
+    Digest of the state of the model(s) of a calculator not set by the optimizing
+    parameters: which parameter components are optimized, and the values of the others.
+    """
+    if isinstance(calculator, _WrapperCalculator):
+        calculators = calculator.calculators
+    else:
+        calculators = [calculator]
+
+    h = hashlib.sha1()
+    for calc in calculators:
+        model = calc.model
+        values = {
+            name: np.array(p.value, dtype=np.double).ravel()
+            for name, p in model.get_model_params().items()
+        }
+        for k in range(model.get_num_opt_params()):
+            name, _, _, c_idx = model.get_opt_param_name_value_and_indices(k)
+            values[name][c_idx] = 0.0
+            h.update(f"{name}[{c_idx}];".encode())
+        for name, v in values.items():
+            h.update(name.encode())
+            h.update(v.tobytes())
+
+    return h.digest()
+
+
+def _same_items(a: List[Any], b: List[Any]) -> bool:
+    """
+    Check whether two lists hold the same objects (by identity) in the same order.
+    """
+    if b is None or len(a) != len(b):
+        return False
+    return all(x is y for x, y in zip(a, b))
+
+
 def _check_residual_data(data: Dict[str, Any], default: Dict[str, Any]):
     """
     Check whether user provided residual data is valid, and add default values if not
@@ -398,6 +398,9 @@ class KIMModel(Model):
 
         self.kim_model = self._create_kim_model(model_name)
 
+        # parameter values last pushed to the kim model, {(p_idx, c_idx): value}
+        self._pushed_params = {}
+
         super(KIMModel, self).__init__(model_name, params_transform)
 
     def init_model_params(self) -> Dict[str, Parameter]:
@@ -549,20 +552,12 @@ class KIMModel(Model):
         self.opt_params.set(**kwargs)
 
         # update kim internal model param (note, set_one will update model_params)
+        values = []
         for name, _ in kwargs.items():
             p_idx = self.model_params[name].index
             for c_idx, v in enumerate(self.model_params[name].value):
-                try:
-                    self.kim_model.set_parameter(p_idx, c_idx, v)
-                except RuntimeError:
-                    raise kimpy.KimPyError(
-                        "Calling `kim_model.set_parameter()` failed."
-                    )
-
-        try:
-            self.kim_model.clear_then_refresh()
-        except RuntimeError:
-            raise kimpy.KimPyError("Calling `kim_model.clear_then_refresh()` failed.")
+                values.append((p_idx, c_idx, v))
+        self._push_params(values, force=True)
 
         # reset influence distance in case it changes
         self.init_influence_distance()
@@ -588,16 +583,10 @@ class KIMModel(Model):
 
         # update kim internal model param (note, set_one will update model_params)
         p_idx = self.model_params[name].index
-        for c_idx, v in enumerate(self.model_params[name].value):
-            try:
-                self.kim_model.set_parameter(p_idx, c_idx, v)
-            except RuntimeError:
-                raise kimpy.KimPyError("Calling `kim_model.set_parameter()` failed.")
-
-        try:
-            self.kim_model.clear_then_refresh()
-        except RuntimeError:
-            raise kimpy.KimPyError("Calling `kim_model.clear_then_refresh()` failed.")
+        values = [
+            (p_idx, c_idx, v) for c_idx, v in enumerate(self.model_params[name].value)
+        ]
+        self._push_params(values, force=True)
 
         # reset influence distance in case it changes
         self.init_influence_distance()
@@ -605,6 +594,10 @@ class KIMModel(Model):
     def update_model_params(self, params: Sequence[float]):
         """
         Update optimizing parameters (a sequence used by the optimizer) to the kim model.
+
+        Only the parameter components whose values differ from the ones last pushed to
+        the kim model are set, and the kim model is not refreshed if none of them
+        changes, e.g. when an optimizer evaluates the same parameters repeatedly.
         """
 
         # update from opt params to model params
@@ -614,14 +607,10 @@ class KIMModel(Model):
         if self.params_transform is None:
             # update from model params to kim params
             n = self.get_num_opt_params()
+            values = []
             for i in range(n):
                 _, value, p_idx, c_idx = self.get_opt_param_name_value_and_indices(i)
-                try:
-                    self.kim_model.set_parameter(p_idx, c_idx, value)
-                except RuntimeError:
-                    raise kimpy.KimPyError(
-                        "Calling `kim_model.set_parameter()` failed."
-                    )
+                values.append((p_idx, c_idx, value))
 
         # When params_transform is set, a user can do whatever in it
         # function, e.g. update a parameter that is not an optimizing parameter.
@@ -630,20 +619,15 @@ class KIMModel(Model):
         # Note, `params_transform.inverse_transform()` is called in
         # super().update_model_params(params)
         else:
+            values = []
             for name, params in self.model_params.items():
                 p_idx = params.index
                 for c_idx, value in enumerate(params.value):
-                    try:
-                        self.kim_model.set_parameter(p_idx, c_idx, value)
-                    except RuntimeError:
-                        raise kimpy.KimPyError(
-                            "Calling `kim_model.set_parameter()` failed."
-                        )
+                    values.append((p_idx, c_idx, value))
 
-        # refresh model
-        self.kim_model.clear_then_refresh()
+        changed = self._push_params(values)
 
-        if get_log_level() == "DEBUG":
+        if changed and get_log_level() == "DEBUG":
             params = self.get_kim_model_params()
             s = ""
             for name, p in params.items():
@@ -652,6 +636,43 @@ class KIMModel(Model):
 
             logger.debug(s)
 
+    def _push_params(self, values: Sequence[Any], force: bool = False) -> bool:
+        """
+        Set parameter values to the kim model and refresh it.
+
+        Args:
+            values: a sequence of `(parameter_index, component_index, value)`.
+            force: If `True`, set all the values and refresh the kim model. Otherwise,
+                only set the values that differ from the ones last pushed, and refresh
+                the kim model only if any of them is set.
+
+        Returns:
+            Whether the kim model is refreshed.
+        """
+        changed = False
+        for p_idx, c_idx, value in values:
+            key = (p_idx, c_idx)
+            if not force and key in self._pushed_params:
+                if self._pushed_params[key] == value:
+                    continue
+
+            try:
+                self.kim_model.set_parameter(p_idx, c_idx, value)
+            except RuntimeError:
+                raise kimpy.KimPyError("Calling `kim_model.set_parameter()` failed.")
+            self._pushed_params[key] = value
+            changed = True
+
+        if changed or force:
+            try:
+                self.kim_model.clear_then_refresh()
+            except RuntimeError:
+                raise kimpy.KimPyError(
+                    "Calling `kim_model.clear_then_refresh()` failed."
+                )
+
+        return changed or force
+
     def write_kim_model(self, path: Path = None):
         """
         Write out a KIM model that can be used directly with the kim-api.
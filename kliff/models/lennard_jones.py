@@ -3,10 +3,10 @@ from typing import Dict, List, Optional, Tuple
 import numpy as np
 
 from kliff.dataset.dataset import Configuration
-from kliff.models.model import ComputeArguments, Model
+from kliff.models.model import ComputeArguments, Model, ModelError
 from kliff.models.parameter import Parameter
 from kliff.models.parameter_transform import ParameterTransform
-from kliff.neighbor import NeighborList, assemble_forces, assemble_stress
+from kliff.neighbor import NeighborList
 
 
 class LJComputeArguments(ComputeArguments):
@@ -15,6 +15,7 @@ class LJComputeArguments(ComputeArguments):
     """
 
     implemented_property = ["energy", "forces", "stress"]
+    implemented_jacobian = True
 
     def __init__(
         self,
@@ -50,59 +51,228 @@ class LJComputeArguments(ComputeArguments):
         )
 
         self.neigh = NeighborList(
-            self.conf, influence_distance, padding_need_neigh=False
+            self.conf, influence_distance, half_list=True, use_shifts=True
         )
+        self._init_pairs()
+
+    def _init_pairs(self):
+        """
+        Gather the pair list of the configuration.
+
+        The coordinates of a configuration do not change during fitting, so the pair
+        indices, separation vectors, distances, and the index of the parameter used
+        by each pair are computed once here and reused by every call of `compute()`.
+
+        A half list is used, so a pair of contributing atoms is stored only once, and
+        it gets the full pair energy. A pair with a periodic image gets half of it, the
+        other half going to the same pair seen from the other atom.
+
+        The periodic images are referred to by cell shift vectors instead of padding
+        atoms, so forces go directly to the contributing atoms.
+        """
+        numneigh, _, neighlist = self.neigh.get_csr()
+        natoms = self.conf.get_num_atoms()
+
+        # atom j is the contributing atom of which the neighbor is a periodic image
+        i = np.repeat(np.arange(natoms, dtype=np.intc), numneigh)
+        j = neighlist
+        shifts = self.neigh.get_shifts()
+
+        coords = self.neigh.coords
+        cell = np.asarray(self.conf.cell, dtype=np.double)
+        rij = coords[j] - coords[i] + shifts @ cell
+
+        self._pair_i = i
+        self._pair_j = j
+        self._pair_rij = rij
+        self._pair_r = np.linalg.norm(rij, axis=1)
+        self._pair_param_index = self._get_pair_param_index(i, j)
+        self._pair_weight = np.where(np.any(shifts != 0, axis=1), 0.5, 1.0)
+
+    def _get_pair_param_index(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """
+        Index of the parameter used by each pair (i, j).
+        """
+        unique_species = sorted(
+            {s for pair in self.specie_pairs_to_param_index for s in pair}
+        )
+        code = {s: k for k, s in enumerate(unique_species)}
+
+        table = np.zeros((len(unique_species), len(unique_species)), dtype=np.intc)
+        for (si, sj), idx in self.specie_pairs_to_param_index.items():
+            table[code[si], code[sj]] = idx
+
+        try:
+            species_code = self.neigh.get_species_code(code)
+        except KeyError as e:
+            raise ModelError(f"Species {str(e)} not supported by the model.")
+
+        return table[species_code[i], species_code[j]]
 
     # TODO, rewrite this function to move the tow phi functions to LennardJones
     #  class, and then we can pass the model to this function, instead of the params.
     #  With this, we can unify the calling function in the Calculator.
     def compute(self, params: Dict[str, Parameter]):
-        coords = self.conf.coords
-        species = self.conf.species
+        idx = self._pair_param_index
+        epsilon = np.asarray(params["epsilon"].value, dtype=np.double)[idx]
+        sigma = np.asarray(params["sigma"].value, dtype=np.double)[idx]
+        rcut = np.asarray(params["cutoff"].value, dtype=np.double)[idx]
+
+        r = self._pair_r
+        grad = self.compute_forces or self.compute_stress
+        phi, dphi = self.calc_phi_dphi_pairs(epsilon, sigma, r, rcut, grad)
+
+        if self.compute_energy:
+            self.results["energy"] = np.dot(self._pair_weight, phi)
+
+        if grad:
+            # pair force on atom i; atom j gets the opposite
+            pair = (self._pair_weight * dphi / r)[:, None] * self._pair_rij
 
-        coords_including_padding = self.neigh.coords
         if self.compute_forces:
-            forces_including_padding = np.zeros_like(coords_including_padding)
+            natoms = self.conf.get_num_atoms()
+            forces = np.zeros((natoms, 3))
+            for k in range(3):
+                forces[:, k] = np.bincount(
+                    self._pair_i, weights=pair[:, k], minlength=natoms
+                ) - np.bincount(self._pair_j, weights=pair[:, k], minlength=natoms)
+            self.results["forces"] = forces
 
-        energy = 0
-        for i, (xyz_i, si) in enumerate(zip(coords, species)):
-            neighlist, _, neigh_species = self.neigh.get_neigh(i)
+        if self.compute_stress:
+            # virial of pair (i, j): -(r_i f_i + r_j f_j) = rij * pair
+            rij = self._pair_rij
+            volume = self.conf.get_volume()
+            stress = np.zeros(6)
+            stress[0] = np.dot(rij[:, 0], pair[:, 0])
+            stress[1] = np.dot(rij[:, 1], pair[:, 1])
+            stress[2] = np.dot(rij[:, 2], pair[:, 2])
+            stress[3] = np.dot(rij[:, 1], pair[:, 2])
+            stress[4] = np.dot(rij[:, 2], pair[:, 0])
+            stress[5] = np.dot(rij[:, 0], pair[:, 1])
+            self.results["stress"] = stress / volume
+
+    def compute_jacobian(self, params: Dict[str, Parameter]) -> Dict[str, np.ndarray]:
+        """
+        Analytic derivatives of the prediction w.r.t. `epsilon` and `sigma`.
 
-            for j, sj in zip(neighlist, neigh_species):
-                idx = self.specie_pairs_to_param_index[(si, sj)]
-                epsilon = params["epsilon"][idx]
-                sigma = params["sigma"][idx]
-                rcut = params["cutoff"][idx]
+        The cutoff only enters through the truncation of the pair energy at the cutoff
+        distance, so the derivatives w.r.t. it are zero (almost everywhere) and it is
+        not included in the returned dict.
+        """
+        idx = self._pair_param_index
+        epsilon = np.asarray(params["epsilon"].value, dtype=np.double)[idx]
+        sigma = np.asarray(params["sigma"].value, dtype=np.double)[idx]
+        rcut = np.asarray(params["cutoff"].value, dtype=np.double)[idx]
+
+        r = self._pair_r
+        inside = r <= rcut
+        sor = sigma / r
+        sor6 = sor * sor * sor
+        sor6 = sor6 * sor6
+        sor12 = sor6 * sor6
+
+        # derivatives of phi and dphi (see `calc_phi_dphi_pairs()`)
+        dphi_depsilon = np.where(inside, 4 * (sor12 - sor6), 0.0)
+        ddphi_depsilon = np.where(inside, 24 * (-2 * sor12 + sor6) / r, 0.0)
+        dphi_dsigma = np.where(inside, 24 * epsilon * (2 * sor12 - sor6) / sigma, 0.0)
+        ddphi_dsigma = np.where(
+            inside, 144 * epsilon * (-4 * sor12 + sor6) / (r * sigma), 0.0
+        )
 
-                xyz_j = coords_including_padding[j]
-                rij = xyz_j - xyz_i
-                r = np.linalg.norm(rij)
+        nparams = len(params["epsilon"])
+        return {
+            "epsilon": self._pairs_jacobian(dphi_depsilon, ddphi_depsilon, nparams),
+            "sigma": self._pairs_jacobian(dphi_dsigma, ddphi_dsigma, nparams),
+        }
 
-                if self.compute_forces:
-                    phi, dphi = self.calc_phi_dphi(epsilon, sigma, r, rcut)
-                    energy += 0.5 * phi
-                    pair = 0.5 * dphi / r * rij
+    def _pairs_jacobian(
+        self, dphi: np.ndarray, ddphi: np.ndarray, nparams: int
+    ) -> np.ndarray:
+        """
+        Jacobian of the prediction w.r.t. the components of a parameter.
 
-                    forces_including_padding[i] = forces_including_padding[i] + pair
-                    forces_including_padding[j] = forces_including_padding[j] - pair
+        Args:
+            dphi: derivative of the pair energy w.r.t. the parameter of each pair
+            ddphi: derivative of the radial derivative of the pair energy w.r.t. the
+                parameter of each pair
+            nparams: number of components of the parameter
 
-                elif self.compute_energy:
-                    phi = self.calc_phi(epsilon, sigma, r, rcut)
-                    energy += 0.5 * phi
+        Returns:
+            2D array of shape (S, nparams), with `S` the size of the prediction.
+        """
+        idx = self._pair_param_index
 
+        jacobian = []
         if self.compute_energy:
-            self.results["energy"] = energy
-        if self.compute_forces:
-            forces = assemble_forces(
-                forces_including_padding, len(coords), self.neigh.padding_image
+            energy = np.bincount(
+                idx, weights=self._pair_weight * dphi, minlength=nparams
             )
-            self.results["forces"] = forces
+            jacobian.append(energy[None, :])
+
+        if self.compute_forces or self.compute_stress:
+            pair = (self._pair_weight * ddphi / self._pair_r)[:, None] * self._pair_rij
+
+        if self.compute_forces:
+            # accumulate by (atom, parameter component)
+            natoms = self.conf.get_num_atoms()
+            size = natoms * nparams
+            i = self._pair_i * nparams + idx
+            j = self._pair_j * nparams + idx
+            forces = np.zeros((natoms, 3, nparams))
+            for k in range(3):
+                forces[:, k, :] = (
+                    np.bincount(i, weights=pair[:, k], minlength=size)
+                    - np.bincount(j, weights=pair[:, k], minlength=size)
+                ).reshape(natoms, nparams)
+            jacobian.append(forces.reshape(3 * natoms, nparams))
+
         if self.compute_stress:
+            rij = self._pair_rij
             volume = self.conf.get_volume()
-            stress = assemble_stress(
-                coords_including_padding, forces_including_padding, volume
-            )
-            self.results["stress"] = stress
+            stress = np.zeros((6, nparams))
+            for v, (a, b) in enumerate(
+                [(0, 0), (1, 1), (2, 2), (1, 2), (2, 0), (0, 1)]
+            ):
+                stress[v] = np.bincount(
+                    idx, weights=rij[:, a] * pair[:, b], minlength=nparams
+                )
+            jacobian.append(stress / volume)
+
+        return np.concatenate(jacobian)
+
+    @staticmethod
+    def calc_phi_dphi_pairs(
+        epsilon: np.ndarray,
+        sigma: np.ndarray,
+        r: np.ndarray,
+        rcut: np.ndarray,
+        grad: bool = True,
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Vectorized version of `calc_phi_dphi()` over an array of pairs.
+
+        Args:
+            epsilon: epsilon of each pair, 1D array
+            sigma: sigma of each pair, 1D array
+            r: distance of each pair, 1D array
+            rcut: cutoff of each pair, 1D array
+            grad: whether to compute dphi
+
+        Returns:
+            phi: pair energy, 1D array
+            dphi: derivative of pair energy w.r.t. r, 1D array; `None` if `grad=False`
+        """
+        inside = r <= rcut
+        sor = sigma / r
+        sor6 = sor * sor * sor
+        sor6 = sor6 * sor6
+        sor12 = sor6 * sor6
+        phi = np.where(inside, 4 * epsilon * (sor12 - sor6), 0.0)
+        if grad:
+            dphi = np.where(inside, 24 * epsilon * (-2 * sor12 + sor6) / r, 0.0)
+        else:
+            dphi = None
+        return phi, dphi
 
     @staticmethod
     def calc_phi(epsilon, sigma, r, rcut):
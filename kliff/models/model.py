@@ -29,6 +29,7 @@ class ComputeArguments:
     """
 
     implemented_property = []
+    implemented_jacobian = False
 
     def __init__(
         self,
@@ -67,6 +68,25 @@ class ComputeArguments:
         """
         raise NotImplementedError('"compute" method not implemented.')
 
+    def compute_jacobian(self, params: Dict[str, Parameter]) -> Dict[str, np.ndarray]:
+        """
+        Compute the derivatives of the prediction w.r.t. the parameters.
+
+        This is optional. A subclass implementing it should set
+        `implemented_jacobian = True`, and then least-squares optimizers will use the
+        analytic Jacobian instead of estimating it by finite differences.
+
+        Args:
+            params: the parameters of the model.
+
+        Returns:
+            {name: jacobian}, where `jacobian` is a 2D array of shape (S, P), with `S`
+            the size of the prediction (see :meth:`get_prediction`) and `P` the number
+            of components of parameter `name`. Parameters not in the dict do not
+            affect the prediction.
+        """
+        raise NotImplementedError('"compute_jacobian" method not implemented.')
+
     def get_compute_flag(self, name: str) -> bool:
         """
         Check whether the model is asked to compute property.
@@ -496,6 +516,61 @@ class Model:
         """
         return self.opt_params.get_opt_param_name_value_and_indices(index)
 
+    def has_opt_params_jacobian(self) -> bool:
+        """
+        Whether the Jacobian w.r.t. the optimizing parameters can be computed
+        analytically, i.e. the compute arguments implement `compute_jacobian()` and the
+        parameter transform (if any) implements `inverse_transform_grad()`.
+        """
+        if not self.get_compute_argument_class().implemented_jacobian:
+            return False
+
+        if self.params_transform is not None:
+            try:
+                self.params_transform.inverse_transform_grad(
+                    self.model_params_transformed
+                )
+            except NotImplementedError:
+                return False
+
+        return True
+
+    def get_opt_params_jacobian(self, jacobian: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Convert the Jacobian w.r.t. the model parameters to the Jacobian w.r.t. the
+        optimizing parameters.
+
+        Args:
+            jacobian: Jacobian w.r.t. the model parameters, as returned by
+                `compute_jacobian()` of the compute arguments.
+
+        Returns:
+            2D array of shape (S, M), where `S` is the size of the prediction and `M`
+            the number of optimizing parameters.
+        """
+        if self.params_transform is not None:
+            grad = self.params_transform.inverse_transform_grad(
+                self.model_params_transformed
+            )
+        else:
+            grad = {}
+
+        size = {v.shape[0] for v in jacobian.values()}
+        if len(size) != 1:
+            raise ModelError("Expect the Jacobian of all parameters to have same rows.")
+        size = size.pop()
+
+        nparams = self.get_num_opt_params()
+        opt_jacobian = np.zeros((size, nparams))
+        for k in range(nparams):
+            name, _, _, c_idx = self.get_opt_param_name_value_and_indices(k)
+            if name in jacobian:
+                opt_jacobian[:, k] = jacobian[name][:, c_idx]
+                if name in grad:
+                    opt_jacobian[:, k] *= grad[name][c_idx]
+
+        return opt_jacobian
+
     def get_opt_params_bounds(self) -> List[Tuple[int, int]]:
         """
         Get the lower and upper bounds of optimizing parameters.
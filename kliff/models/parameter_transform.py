@@ -12,6 +12,7 @@ class ParameterTransform:
     Subclass can implement
         - transform
         - inverse_transform
+        - inverse_transform_grad (optional, needed by analytic Jacobian)
     """
 
     def transform(self, model_params: Dict[str, Parameter]) -> Dict[str, Parameter]:
@@ -22,6 +23,21 @@ class ParameterTransform:
     ) -> Dict[str, Parameter]:
         return model_params
 
+    def inverse_transform_grad(
+        self, model_params: Dict[str, Parameter]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Derivatives of the inverse transformed parameters w.r.t. the transformed ones.
+
+        Args:
+            model_params: parameters in the transformed space.
+
+        Returns:
+            {name: derivatives}, with one derivative for each component of the
+            parameter. Parameters not in the dict are not transformed.
+        """
+        raise NotImplementedError("`inverse_transform_grad` not implemented.")
+
     def __call__(self, model_params: Dict[str, Parameter]) -> Dict[str, Parameter]:
         return self.transform(model_params)
 
@@ -62,5 +78,14 @@ class LogParameterTransform(ParameterTransform):
 
         return model_params
 
+    def inverse_transform_grad(
+        self, model_params: Dict[str, Parameter]
+    ) -> Dict[str, np.ndarray]:
+        # d exp(x) / dx = exp(x)
+        return {
+            name: np.exp(np.asarray(model_params[name].value))
+            for name in self.param_names
+        }
+
     def __call__(self, model_params: Dict[str, Parameter]) -> Dict[str, Parameter]:
         return self.transform(model_params)
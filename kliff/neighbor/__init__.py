@@ -1,3 +1,17 @@
-from .neighbor import NeighborList, assemble_forces, assemble_stress
+from .neighbor import (
+    NeighborList,
+    NeighborListCache,
+    assemble_forces,
+    assemble_stress,
+    get_default_cache,
+    set_default_cache,
+)
 
-__all__ = ["NeighborList", "assemble_forces", "assemble_stress"]
+__all__ = [
+    "NeighborList",
+    "NeighborListCache",
+    "assemble_forces",
+    "assemble_stress",
+    "get_default_cache",
+    "set_default_cache",
+]
@@ -1,10 +1,14 @@
-from typing import Dict, List, Tuple
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
 from kliff.atomic_data import atomic_number, atomic_species
 from kliff.dataset.dataset import Configuration
 from kliff.neighbor import neighlist as nl  # C extension
+from kliff.utils import create_directory, to_path
 
 
 class NeighborList:
@@ -22,6 +26,17 @@ class NeighborList:
         infl_dist: Influence distance, within which atoms are interacting with each
             other. In literatures, this is usually referred as ``cutoff``.
         padding_need_neigh: Whether to generate neighbors for padding atoms.
+        half_list: Whether to store each pair of atoms only once. In a half list, atom
+            `j` is a neighbor of atom `i` only if `j > i` or atom `j` has no neighbors
+            (e.g. a padding atom when ``padding_need_neigh=False``).
+        num_threads: Number of threads used to build the neighbor list.
+        use_shifts: Whether to refer to the periodic images of atoms by the index of the
+            contributing atom and an integer cell shift vector, instead of keeping
+            padding atoms. See the note below.
+        cache: Cache to look up the neighbor list from, and to store it to once
+            created. If `None`, the default cache (see
+            :func:`~kliff.neighbor.set_default_cache`) is used, and the neighbor list
+            is not cached if no default cache is set.
 
     Attributes:
         coords: 2D array
@@ -38,18 +53,42 @@ class NeighborList:
         padding_image: 1D array
             Atom index, of which a padding atom is an image.
 
+        shifts: 2D int array
+            Cell shift vectors of the neighbors, only with ``use_shifts=True``.
+
     Note:
         To get the total force on a contributing atom, the forces on all padding atoms
         that are images of the contributing atom should be added back to the
         contributing atom.
+
+        With ``use_shifts=True``, there are no padding atoms: all the arrays are of the
+        contributing atoms, and a neighbor is the contributing atom ``neighlist[k]``
+        displaced by ``shifts[k] @ cell``. The force on a neighbor then directly goes to
+        the contributing atom, and the stress can be computed from the pair virials.
     """
 
     def __init__(
-        self, conf: Configuration, infl_dist: float, padding_need_neigh: bool = False
+        self,
+        conf: Configuration,
+        infl_dist: float,
+        padding_need_neigh: bool = False,
+        half_list: bool = False,
+        num_threads: int = 1,
+        use_shifts: bool = False,
+        cache: Optional["NeighborListCache"] = None,
     ):
+        if use_shifts and padding_need_neigh:
+            raise NeighborListError(
+                '"padding_need_neigh" cannot be "True" with "use_shifts", since there '
+                "are no padding atoms."
+            )
+
         self.conf = conf
         self.infl_dist = infl_dist
         self.padding_need_neigh = padding_need_neigh
+        self.half_list = half_list
+        self.num_threads = num_threads
+        self.use_shifts = use_shifts
 
         # all atoms: contrib + padding
         self.coords = None
@@ -61,11 +100,57 @@ class NeighborList:
         # padding_image[0] = 3: padding atom 1 is the image of contributing atom 3
         self.padding_image = None
 
+        # neighbors of all atoms in compressed sparse row format: neighbors of atom i
+        # are neighlist[neighstart[i]:neighstart[i+1]]
+        self.numneigh = None
+        self.neighlist = None
+        self.neighstart = None
+        self.shifts = None
+
         # neigh
-        self.neigh = nl.create()
-        self.create_neigh()
+        self.neigh = None
+
+        if cache is None:
+            cache = get_default_cache()
+
+        if cache is None:
+            self.create_neigh()
+            return
+
+        data = cache.get(conf, infl_dist, padding_need_neigh, half_list)
+        if data is None:
+            data = self._build(half_list)
+            cache.put(conf, infl_dist, padding_need_neigh, data, half_list)
+        self._set_data(data)
 
     def create_neigh(self):
+        self._set_data(self._build(self.half_list))
+
+    def _set_data(self, data: Dict[str, np.ndarray]):
+        """
+        Set the atoms and neighbors from the data of a created (or cached) list.
+        """
+        n = self.conf.get_num_atoms()
+
+        if self.use_shifts:
+            data = _get_shifted_neighbor_list(data, n, self.conf.cell)
+            self.shifts = data["shifts"]
+
+        self.coords = data["coords"]
+        self.species = data["species"]
+        self.image = data["image"]
+        self.numneigh = data["numneigh"]
+        self.neighlist = data["neighlist"]
+
+        self.neighstart = np.zeros(len(self.numneigh) + 1, dtype=np.intp)
+        np.cumsum(self.numneigh, out=self.neighstart[1:])
+        self.neighstart.flags.writeable = False
+
+        self.padding_coords = self.coords[n:]
+        self.padding_species = list(self.species[n:])
+        self.padding_image = self.image[n:]
+
+    def _build(self, half_list: bool) -> Dict[str, np.ndarray]:
         coords_cb = np.asarray(self.conf.coords, dtype=np.double)
         species_cb = self.conf.species
         cell = np.asarray(self.conf.cell, dtype=np.double)
@@ -84,32 +169,50 @@ class NeighborList:
 
         species_pd = [atomic_species[i] for i in species_code_pd]
 
-        self.padding_coords = np.asarray(coords_pd, dtype=np.double)
-        self.padding_species = species_pd
-        self.padding_image = np.asarray(image_pd, dtype=np.intc)
-
         num_cb = coords_cb.shape[0]
         num_pd = coords_pd.shape[0]
 
-        self.coords = np.asarray(
-            np.concatenate((coords_cb, coords_pd)), dtype=np.double
-        )
-        self.species = np.concatenate((species_cb, species_pd))
-        self.image = np.asarray(
-            np.concatenate((np.arange(num_cb), image_pd)), dtype=np.intc
-        )
+        coords = np.asarray(np.concatenate((coords_cb, coords_pd)), dtype=np.double)
+        species = np.concatenate((species_cb, species_pd))
+        image = np.asarray(np.concatenate((np.arange(num_cb), image_pd)), dtype=np.intc)
+
         # flag to indicate whether to create neighborlist for an atom
         need_neigh = np.ones(num_cb + num_pd, dtype=np.intc)
         if not self.padding_need_neigh:
             need_neigh[num_cb:] = 0
 
-        # create neighbor list
+        # create neighbor list; a new one each time, since the arrays of a created
+        # list are views of its memory
+        self.neigh = nl.create()
         cutoffs = np.asarray([self.infl_dist], dtype=np.double)
         try:
-            self.neigh.build(self.coords, self.infl_dist, cutoffs, need_neigh)
+            self.neigh.build(
+                coords,
+                self.infl_dist,
+                cutoffs,
+                need_neigh,
+                half_list=half_list,
+                num_threads=self.num_threads,
+            )
         except RuntimeError:
             raise NeighborListError("Calling `neighlist.build` failed.")
 
+        # neighbors of all atoms, without copying
+        try:
+            numneigh, _, neighlist = nl.get_csr(self.neigh)
+        except RuntimeError:
+            raise NeighborListError("Calling `neighlist.get_csr` failed.")
+        numneigh.flags.writeable = False
+        neighlist.flags.writeable = False
+
+        return {
+            "coords": coords,
+            "species": species,
+            "image": image,
+            "numneigh": numneigh,
+            "neighlist": neighlist,
+        }
+
     def get_neigh(self, index: int) -> Tuple[List[int], np.array, List[str]]:
         """
         Get the indices, coordinates, and species string of a given atom.
@@ -124,16 +227,19 @@ class NeighborList:
             neigh_species: Species symbol of neighbor atoms.
         """
 
-        cutoffs = np.asarray([self.infl_dist], dtype=np.double)
-        neigh_list_index = 0
-        try:
-            num_neigh, neigh_indices = self.neigh.get_neigh(
-                cutoffs, neigh_list_index, index
+        if index < 0 or index >= len(self.numneigh):
+            raise NeighborListError(
+                f"Atom index {index} out of range [0, {len(self.numneigh)})."
             )
-        except RuntimeError:
-            raise NeighborListError("Calling `neighlist.get_neigh` failed.")
+        neigh_indices = self.neighlist[
+            self.neighstart[index] : self.neighstart[index + 1]
+        ]
 
         neigh_coords = self.coords[neigh_indices]
+        if self.use_shifts:
+            neigh_coords = neigh_coords + self.get_shifts(index) @ np.asarray(
+                self.conf.cell, dtype=np.double
+            )
         neigh_species = self.species[neigh_indices]
 
         return neigh_indices, neigh_coords, neigh_species
@@ -156,6 +262,31 @@ class NeighborList:
                 ``numneigh[0]`` components are the neighbors of atom `0`, the next
                 ``numneigh[1]`` components are the neighbors of atom `1` ....
         """
+        numneigh, _, neighlist = self.get_csr(request_padding)
+
+        return np.array(numneigh, dtype=np.intc), np.array(neighlist, dtype=np.intc)
+
+    def get_csr(
+        self, request_padding: bool = False
+    ) -> Tuple[np.array, np.array, np.array]:
+        """
+        Get the neighbors of all atoms in compressed sparse row format, without copying.
+
+        This is the same as :meth:`get_numneigh_and_neighlist_1D`, but the returned
+        arrays are read-only views of the neighbor list, and the offsets of the
+        neighbors of each atom are returned as well.
+
+        Args:
+            request_padding: If ``True``, the neighbors of padding atoms are included;
+                If ``False``, only these of contributing atoms.
+
+        Returns:
+            numneigh: 1D array of shape (N,); number of neighbors of the N atoms.
+            neighstart: 1D array of shape (N+1,); the neighbors of atom `i` are
+                ``neighlist[neighstart[i]:neighstart[i+1]]``.
+            neighlist: 1D array of shape (neighstart[N],); indices of the neighbors of
+                all atoms.
+        """
         if request_padding:
             if not self.padding_need_neigh:
                 raise NeighborListError(
@@ -166,25 +297,34 @@ class NeighborList:
         else:
             N = self.conf.get_num_atoms()
 
-        cutoffs = np.asarray([self.infl_dist], dtype=np.double)
-        neigh_list_index = 0
-
-        numneigh = []
-        neighlist = []
-        for i in range(N):
-            try:
-                num_neigh, neigh_indices = self.neigh.get_neigh(
-                    cutoffs, neigh_list_index, i
-                )
-            except RuntimeError:
-                raise NeighborListError("Calling `neighlist.get_neigh` failed.")
+        return (
+            self.numneigh[:N],
+            self.neighstart[: N + 1],
+            self.neighlist[: self.neighstart[N]],
+        )
 
-            numneigh.append(num_neigh)
-            neighlist.append(neigh_indices)
-        neighlist = np.asarray(np.concatenate(neighlist), dtype=np.intc)
-        numneigh = np.asarray(numneigh, dtype=np.intc)
+    def get_shifts(self, index: Optional[int] = None) -> np.array:
+        """
+        Get the cell shift vectors of the neighbors, with ``use_shifts=True``.
 
-        return numneigh, neighlist
+        Args:
+            index: Atom number whose neighbor shifts are requested. If `None`, the
+                shifts of the neighbors of all atoms, in the order of ``neighlist``
+                returned by :meth:`get_csr`.
+
+        Returns:
+            2D int array of shape (N, 3), where N is the number of neighbors; neighbor
+            `k` is at ``coords[neighlist[k]] + shifts[k] @ cell``. The returned array is
+            a read-only view.
+        """
+        if not self.use_shifts:
+            raise NeighborListError(
+                'Request to get shifts of neighbors, but "use_shifts" is set to '
+                '"False" at initialization.'
+            )
+        if index is None:
+            return self.shifts
+        return self.shifts[self.neighstart[index] : self.neighstart[index + 1]]
 
     def get_coords(self) -> np.array:
         """
@@ -197,7 +337,7 @@ class NeighborList:
         """
         Return species of both contributing and padding atoms.
         """
-        return self.species[:]
+        return self.species.copy()
 
     def get_species_code(self, mapping: Dict[str, int]) -> np.array:
         """
@@ -209,7 +349,7 @@ class NeighborList:
         Returns:
             1D array of integer species code.
         """
-        return np.asarray([mapping[s] for s in self.species], dtype=np.intc)
+        return _get_species_code(self.species, mapping)
 
     def get_image(self) -> np.array:
         """
@@ -245,7 +385,7 @@ class NeighborList:
         Returns:
             1D array of integer species code for padding atoms.
         """
-        return np.asarray([mapping[s] for s in self.padding_species], dtype=np.intc)
+        return _get_species_code(self.padding_species, mapping)
 
     def get_padding_image(self) -> np.array:
         """
@@ -257,6 +397,330 @@ class NeighborList:
         return self.padding_image.copy()
 
 
+class NeighborListCache:
+    """
+    Cache of neighbor lists, keyed on the geometry of a configuration, the influence
+    distance, and whether it is a half list.
+
+    A configuration is identified by a hash of its coords, cell, PBC, and species, so
+    the cache stays valid when the same configuration is read again or used by
+    multiple calculators (or descriptors), and a modified configuration is never
+    matched with a stale list.
+
+    A request for a smaller influence distance is served from a cached list with a
+    larger one, by removing the neighbors beyond the requested distance and the padding
+    atoms that are no longer neighbors of any contributing atom. Neighbors of padding
+    atoms are only reused for the same influence distance.
+
+    Args:
+        maxsize: Maximum number of neighbor lists kept in memory; the least recently
+            used one is discarded when exceeded. If `0`, nothing is kept in memory.
+        path: Directory to persist the neighbor lists to. If given, lists not in
+            memory are looked up from, and newly created lists are written to, this
+            directory, so that they can be reused across runs.
+    """
+
+    def __init__(self, maxsize: int = 128, path: Optional[Union[Path, str]] = None):
+        self.maxsize = maxsize
+        self.path = to_path(path) if path is not None else None
+        if self.path is not None:
+            create_directory(self.path, is_directory=True)
+
+        # (hash, infl_dist, padding_need_neigh, half_list) -> data
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def hash_configuration(conf: Configuration) -> str:
+        """
+        Hash of the coords, cell, PBC, and species of a configuration.
+        """
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(conf.coords, dtype=np.double).tobytes())
+        h.update(np.ascontiguousarray(conf.cell, dtype=np.double).tobytes())
+        h.update(np.asarray(conf.PBC, dtype=np.intc).tobytes())
+        h.update(" ".join(conf.species).encode())
+        return h.hexdigest()
+
+    def get(
+        self,
+        conf: Configuration,
+        infl_dist: float,
+        padding_need_neigh: bool = False,
+        half_list: bool = False,
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Get the neighbor list of a configuration.
+
+        A half list is only served from a cached half list, and a full list from a
+        cached full list.
+
+        Returns:
+            Data of the neighbor list (see :meth:`put`); `None` if not in the cache.
+        """
+        key = self.hash_configuration(conf)
+
+        candidates = [k for k in self._entries if k[0] == key]
+        match = self._match(candidates, infl_dist, padding_need_neigh, half_list)
+        if match is not None:
+            self._entries.move_to_end(match)
+            data = self._entries[match]
+        elif self.path is not None:
+            match = self._match(
+                self._get_disk_keys(key), infl_dist, padding_need_neigh, half_list
+            )
+            if match is None:
+                return None
+            data = self._load(match)
+            self._add(match, data)
+        else:
+            return None
+
+        _, cached_infl_dist, cached_padding_need_neigh, _ = match
+
+        return _filter_neighbor_list(
+            data,
+            conf.get_num_atoms(),
+            cached_infl_dist,
+            cached_padding_need_neigh,
+            infl_dist,
+            padding_need_neigh,
+        )
+
+    def put(
+        self,
+        conf: Configuration,
+        infl_dist: float,
+        padding_need_neigh: bool,
+        data: Dict[str, np.ndarray],
+        half_list: bool = False,
+    ):
+        """
+        Add the neighbor list of a configuration to the cache.
+
+        Args:
+            conf: atomic configuration
+            infl_dist: influence distance of the neighbor list
+            padding_need_neigh: whether neighbors of padding atoms are included
+            data: `coords`, `species`, and `image` of contributing and padding atoms,
+                and the neighbors of all atoms in compressed sparse row format,
+                `numneigh` and `neighlist`.
+            half_list: whether it is a half list
+        """
+        key = (
+            self.hash_configuration(conf),
+            float(infl_dist),
+            bool(padding_need_neigh),
+            bool(half_list),
+        )
+
+        # the arrays are shared by all neighbor lists created from the cache
+        data = dict(data)
+        for v in data.values():
+            v.flags.writeable = False
+
+        self._add(key, data)
+
+        if self.path is not None:
+            np.savez(self._get_filename(key), **data)
+
+    def clear(self):
+        """
+        Remove all neighbor lists in memory.
+        """
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, key, data):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _match(keys, infl_dist, padding_need_neigh, half_list):
+        """
+        The best key to serve a request: the same influence distance if possible,
+        otherwise the smallest larger one.
+        """
+        best = None
+        for k in keys:
+            _, d, p, h = k
+            if h != half_list:
+                continue
+            if d == infl_dist:
+                if p or not padding_need_neigh:
+                    return k
+            elif d > infl_dist and not padding_need_neigh:
+                if best is None or d < best[1]:
+                    best = k
+        return best
+
+    def _get_filename(self, key) -> Path:
+        h, d, p, half = key
+        return self.path.joinpath(f"{h}_{d!r}_{int(p)}_{int(half)}.npz")
+
+    def _get_disk_keys(self, h):
+        keys = []
+        for f in self.path.glob(f"{h}_*.npz"):
+            _, d, p, half = f.stem.split("_")
+            keys.append((h, float(d), bool(int(p)), bool(int(half))))
+        return keys
+
+    def _load(self, key) -> Dict[str, np.ndarray]:
+        with np.load(self._get_filename(key)) as f:
+            data = {k: f[k] for k in f.files}
+        for v in data.values():
+            v.flags.writeable = False
+        return data
+
+
+def _get_species_code(species: List[str], mapping: Dict[str, int]) -> np.ndarray:
+    """
+    Integer species code of atoms, looking up `mapping` once for each unique species.
+    """
+    unique, inverse = np.unique(np.asarray(species), return_inverse=True)
+    code = np.asarray([mapping[s] for s in unique], dtype=np.intc)
+    return code[inverse.reshape(-1)]
+
+
+def _get_shifted_neighbor_list(
+    data: Dict[str, np.ndarray], n: int, cell: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Replace the padding atoms in a neighbor list (without neighbors of padding atoms)
+    by the contributing atoms they are images of, and the cell shift vectors.
+
+    Args:
+        data: data of the neighbor list
+        n: number of contributing atoms
+        cell: cell of the configuration, each row a lattice vector
+    """
+    coords = data["coords"]
+    image = data["image"]
+    numneigh = data["numneigh"][:n]
+    neighlist = data["neighlist"][: int(np.sum(numneigh))]
+
+    shifts = np.zeros((len(neighlist), 3), dtype=np.intc)
+    padding = neighlist >= n
+    if np.any(padding):
+        pd = neighlist[padding]
+        inv_cell = np.linalg.inv(np.asarray(cell, dtype=np.double))
+        shifts[padding] = np.rint((coords[pd] - coords[image[pd]]) @ inv_cell)
+
+    # copies, so that the arrays of the padding atoms can be freed
+    data = {
+        "coords": np.array(coords[:n]),
+        "species": np.array(data["species"][:n]),
+        "image": np.array(image[:n]),
+        "numneigh": np.array(numneigh),
+        "neighlist": np.asarray(image[neighlist], dtype=np.intc),
+        "shifts": shifts,
+    }
+    for v in data.values():
+        v.flags.writeable = False
+
+    return data
+
+
+def _filter_neighbor_list(
+    data: Dict[str, np.ndarray],
+    n: int,
+    infl_dist: float,
+    padding_need_neigh: bool,
+    new_infl_dist: float,
+    new_padding_need_neigh: bool,
+) -> Dict[str, np.ndarray]:
+    """
+    Derive a neighbor list with a smaller (or the same) influence distance, and
+    without neighbors of padding atoms, from a cached one.
+
+    A half list stays a half list, since the atoms kept are renumbered in the same
+    order.
+
+    Args:
+        data: data of the cached neighbor list
+        n: number of contributing atoms
+        infl_dist: influence distance of the cached neighbor list
+        padding_need_neigh: whether the cached list has neighbors of padding atoms
+        new_infl_dist: requested influence distance
+        new_padding_need_neigh: whether neighbors of padding atoms are requested
+    """
+    if new_infl_dist == infl_dist and padding_need_neigh == new_padding_need_neigh:
+        return data
+
+    numneigh = data["numneigh"]
+    end = int(np.sum(numneigh[:n]))
+
+    if new_infl_dist == infl_dist:
+        # only drop the neighbors of padding atoms
+        new_numneigh = np.zeros_like(numneigh)
+        new_numneigh[:n] = numneigh[:n]
+        return {
+            "coords": data["coords"],
+            "species": data["species"],
+            "image": data["image"],
+            "numneigh": new_numneigh,
+            "neighlist": data["neighlist"][:end],
+        }
+
+    coords = data["coords"]
+    neighlist = data["neighlist"][:end]
+    i = np.repeat(np.arange(n), numneigh[:n])
+
+    rij = coords[neighlist] - coords[i]
+    rsq = rij[:, 0] * rij[:, 0] + rij[:, 1] * rij[:, 1] + rij[:, 2] * rij[:, 2]
+    inside = rsq < new_infl_dist * new_infl_dist
+    neighlist = neighlist[inside]
+
+    # keep contributing atoms and the padding atoms that are still neighbors
+    padding = np.unique(neighlist[neighlist >= n])
+    keep = np.concatenate((np.arange(n), padding))
+    new_index = np.full(len(coords), -1, dtype=np.intc)
+    new_index[keep] = np.arange(len(keep), dtype=np.intc)
+
+    new_numneigh = np.zeros(len(keep), dtype=np.intc)
+    new_numneigh[:n] = np.bincount(i[inside], minlength=n)
+
+    return {
+        "coords": coords[keep],
+        "species": data["species"][keep],
+        "image": data["image"][keep],
+        "numneigh": new_numneigh,
+        "neighlist": new_index[neighlist],
+    }
+
+
+_default_cache = None
+
+
+def get_default_cache() -> Optional[NeighborListCache]:
+    """
+    Get the cache used by :class:`NeighborList` when no cache is specified.
+    """
+    return _default_cache
+
+
+def set_default_cache(cache: Optional[NeighborListCache]):
+    """
+    Set the cache used by :class:`NeighborList` when no cache is specified.
+
+    Neighbor lists are not cached by default. Set a default cache to reuse them in
+    all the neighbor lists created, e.g. by the calculators and descriptors:
+
+    >>> set_default_cache(NeighborListCache(path="neigh_cache"))
+
+    Args:
+        cache: The new default cache; if `None`, neighbor lists are not cached by
+            default.
+    """
+    global _default_cache
+    _default_cache = cache
+
+
 def assemble_forces(forces: np.array, n: int, padding_image: np.array) -> np.array:
     """
     Assemble forces on padding atoms back to contributing atoms.
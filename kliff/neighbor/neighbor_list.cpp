@@ -3,10 +3,13 @@
 #include "neighbor_list.h"
 #include "helper.hpp"
 
+#include <algorithm>
 #include <cmath>
 #include <cstring>
+#include <limits>
 #include <sstream>
 #include <string>
+#include <thread>
 #include <vector>
 
 // WARNING: Do not use std::numeric_limits<double>::epsilon() (or even multiply
@@ -81,8 +84,25 @@ int nbl_build(NeighList * const nl,
               double const influenceDistance,
               int const numberOfCutoffs,
               double const * cutoffs,
-              int const * needNeighbors)
+              int const * needNeighbors,
+              int const halfList,
+              int const numberOfThreads)
 {
+  // free previous neigh content and then create new
+  nbl_clean_content(nl);
+  nbl_allocate_memory(nl, numberOfCutoffs, numberOfParticles);
+
+  if (numberOfParticles <= 0)
+  {
+    for (int k = 0; k < numberOfCutoffs; k++)
+    {
+      nl->lists[k].numberOfParticles = 0;
+      nl->lists[k].cutoff = cutoffs[k];
+      nl->lists[k].neighborList = new int[0];
+    }
+    return 0;
+  }
+
   // find max and min extend of coordinates
   double min[3];
   double max[3];
@@ -120,32 +140,34 @@ int nbl_build(NeighList * const nl,
   if (size[1] <= 0) size[1] = 1;
   if (size[2] <= 0) size[2] = 1;
 
-  int size_total = size[0] * size[1] * size[2];
+  long const size_total = static_cast<long>(size[0]) * size[1] * size[2];
   if (size_total > 1000000000)
   {
     MY_WARNING("Cell size too large. Check if you have partilces fly away.");
     return 1;
   }
 
-  // assign atoms into cells
-  std::vector<std::vector<int> > cells(size_total);
+  // assign atoms into cells by counting sort: the atoms in cell c are
+  // cellAtoms[cellStart[c]:cellStart[c+1]], in increasing order of atom index
+  std::vector<int> cellOf(numberOfParticles);
+  std::vector<int> cellStart(size_total + 1, 0);
   for (int i = 0; i < numberOfParticles; i++)
   {
     int index[3];
-
     coords_to_index(&coordinates[3 * i], size, max, min, index);
-
-    int const idx
-        = index[0] + index[1] * size[0] + index[2] * size[0] * size[1];
-
-    cells[idx].push_back(i);
+    cellOf[i] = index[0] + index[1] * size[0] + index[2] * size[0] * size[1];
+    cellStart[cellOf[i] + 1]++;
   }
+  for (long c = 0; c < size_total; c++) { cellStart[c + 1] += cellStart[c]; }
 
-  // create neighbors
-
-  // free previous neigh content and then create new
-  nbl_clean_content(nl);
-  nbl_allocate_memory(nl, numberOfCutoffs, numberOfParticles);
+  std::vector<int> cellAtoms(numberOfParticles);
+  {
+    std::vector<int> cursor(cellStart.begin(), cellStart.end() - 1);
+    for (int i = 0; i < numberOfParticles; i++)
+    {
+      cellAtoms[cursor[cellOf[i]]++] = i;
+    }
+  }
 
   std::vector<double> cutsqs(numberOfCutoffs);
   for (int i = 0; i < numberOfCutoffs; i++)
@@ -153,17 +175,27 @@ int nbl_build(NeighList * const nl,
     cutsqs[i] = cutoffs[i] * cutoffs[i];
   }
 
-  // temporary neigh container
-  std::vector<std::vector<int> > tmp_neigh(numberOfCutoffs);
-  std::vector<int> total(numberOfCutoffs, 0);
-  std::vector<int> num_neigh(numberOfCutoffs);
+  // each thread works on a contiguous range of atoms, collecting the neighbors
+  // in its own containers, which are concatenated in order afterwards
+  int const nthreads
+      = std::max(1, std::min(numberOfThreads, numberOfParticles));
+  std::vector<std::vector<std::vector<int> > > tmp_neigh(
+      nthreads, std::vector<std::vector<int> >(numberOfCutoffs));
+  std::vector<int> error(nthreads, 0);
 
-  for (int i = 0; i < numberOfParticles; i++)
-  {
-    for (int k = 0; k < numberOfCutoffs; k++) { num_neigh[k] = 0; }
+  auto work = [&](int const t) {
+    int const first = static_cast<long>(numberOfParticles) * t / nthreads;
+    int const last = static_cast<long>(numberOfParticles) * (t + 1) / nthreads;
 
-    if (needNeighbors[i])
+    for (int i = first; i < last; i++)
     {
+      for (int k = 0; k < numberOfCutoffs; k++)
+      {
+        nl->lists[k].Nneighbors[i] = 0;
+      }
+
+      if (!needNeighbors[i]) { continue; }
+
       double const coordinates_i_x = coordinates[3 * i];
       double const coordinates_i_y = coordinates[3 * i + 1];
       double const coordinates_i_z = coordinates[3 * i + 2];
@@ -186,34 +218,38 @@ int nbl_build(NeighList * const nl,
           {
             int const idx = ii + jj * size[0] + kk * size[0] * size[1];
 
-            for (std::size_t m = 0; m < cells[idx].size(); m++)
+            for (int m = cellStart[idx]; m < cellStart[idx + 1]; m++)
             {
-              int n = cells[idx][m];
-              if (n != i)
-              {
-                double const dx = coordinates[3 * n] - coordinates_i_x;
-                double const dy = coordinates[3 * n + 1] - coordinates_i_y;
-                double const dz = coordinates[3 * n + 2] - coordinates_i_z;
-                double const rsq = dx * dx + dy * dy + dz * dz;
+              int const n = cellAtoms[m];
+              if (n == i) { continue; }
 
-                if (rsq < TOL)
-                {
-                  std::ostringstream stringStream;
-                  stringStream << "Collision of atoms " << i + 1 << " and "
-                               << n + 1 << ". ";
-                  stringStream << "Their distance is " << std::sqrt(rsq) << "."
-                               << std::endl;
-                  std::string my_str = stringStream.str();
-                  MY_WARNING(my_str);
-                  return 1;
-                }
-                for (int k = 0; k < numberOfCutoffs; k++)
+              // in a half list, the pair is stored with atom n if n has a
+              // lower index and needs neighbors
+              if (halfList && n < i && needNeighbors[n]) { continue; }
+
+              double const dx = coordinates[3 * n] - coordinates_i_x;
+              double const dy = coordinates[3 * n + 1] - coordinates_i_y;
+              double const dz = coordinates[3 * n + 2] - coordinates_i_z;
+              double const rsq = dx * dx + dy * dy + dz * dz;
+
+              if (rsq < TOL)
+              {
+                std::ostringstream stringStream;
+                stringStream << "Collision of atoms " << i + 1 << " and "
+                             << n + 1 << ". ";
+                stringStream << "Their distance is " << std::sqrt(rsq) << "."
+                             << std::endl;
+                std::string my_str = stringStream.str();
+                MY_WARNING(my_str);
+                error[t] = 1;
+                return;
+              }
+              for (int k = 0; k < numberOfCutoffs; k++)
+              {
+                if (rsq < cutsqs[k])
                 {
-                  if (rsq < cutsqs[k])
-                  {
-                    tmp_neigh[k].push_back(n);
-                    num_neigh[k]++;
-                  }
+                  tmp_neigh[t][k].push_back(n);
+                  nl->lists[k].Nneighbors[i]++;
                 }
               }
             }
@@ -221,22 +257,48 @@ int nbl_build(NeighList * const nl,
         }
       }
     }
+  };
 
-    for (int k = 0; k < numberOfCutoffs; k++)
-    {
-      nl->lists[k].Nneighbors[i] = num_neigh[k];
-      nl->lists[k].beginIndex[i] = total[k];
-      total[k] += num_neigh[k];
-    }
+  std::vector<std::thread> threads;
+  for (int t = 1; t < nthreads; ++t) { threads.emplace_back(work, t); }
+  work(0);
+  for (auto & thread : threads) { thread.join(); }
+
+  for (int t = 0; t < nthreads; ++t)
+  {
+    if (error[t]) { return 1; }
   }
 
   for (int k = 0; k < numberOfCutoffs; k++)
   {
-    nl->lists[k].numberOfParticles = numberOfParticles;
-    nl->lists[k].cutoff = cutoffs[k];
-    nl->lists[k].neighborList = new int[total[k]];
-    std::memcpy(
-        nl->lists[k].neighborList, tmp_neigh[k].data(), sizeof(int) * total[k]);
+    NeighListOne * cnl = &(nl->lists[k]);
+
+    long total = 0;
+    for (int i = 0; i < numberOfParticles; i++)
+    {
+      cnl->beginIndex[i] = static_cast<int>(total);
+      total += cnl->Nneighbors[i];
+    }
+    if (total > std::numeric_limits<int>::max())
+    {
+      MY_WARNING("Too many neighbors to be indexed by int.");
+      return 1;
+    }
+
+    cnl->numberOfParticles = numberOfParticles;
+    cnl->cutoff = cutoffs[k];
+    cnl->neighborList = new int[total];
+
+    int * dest = cnl->neighborList;
+    for (int t = 0; t < nthreads; ++t)
+    {
+      std::vector<int> const & src = tmp_neigh[t][k];
+      if (!src.empty())
+      {
+        std::memcpy(dest, src.data(), sizeof(int) * src.size());
+      }
+      dest += src.size();
+    }
   }
 
   return 0;
@@ -300,7 +362,8 @@ int nbl_create_paddings(int const numberOfParticles,
   int error = inverse(tcell, fcell);
   if (error) { return error; }
 
-  double frac_coords[3 * numberOfParticles];
+  // on the heap, since it can be too large for the stack
+  std::vector<double> frac_coords(3 * static_cast<std::size_t>(numberOfParticles));
 
   double min[3] = {1e10, 1e10, 1e10};
   double max[3] = {-1e10, -1e10, -1e10};
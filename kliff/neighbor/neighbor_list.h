@@ -40,7 +40,9 @@ int nbl_build(NeighList * const nl,
               double const influenceDistance,
               int const numberOfCutoffs,
               double const * cutoffs,
-              int const * needNeighbors);
+              int const * needNeighbors,
+              int const halfList = 0,
+              int const numberOfThreads = 1);
 
 int nbl_get_neigh(void const * const nl,
                   int const numberOfCutoffs,
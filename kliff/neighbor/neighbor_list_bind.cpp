@@ -43,7 +43,9 @@ PYBIND11_MODULE(neighlist, module)
               py::array_t<double> coords,
               double const influence_distance,
               py::array_t<double> cutoffs,
-              py::array_t<int> need_neigh) {
+              py::array_t<int> need_neigh,
+              bool const half_list,
+              int const num_threads) {
     int const natoms_1 = static_cast<int>(coords.size() / 3);
     int const natoms_2 = static_cast<int>(need_neigh.size());
 
@@ -58,13 +60,19 @@ PYBIND11_MODULE(neighlist, module)
     double const * cutoffs_data = cutoffs.data();
     int const * need_neigh_data = need_neigh.data();
 
-    int error = nbl_build(&self,
-                          natoms,
-                          coords_data,
-                          influence_distance,
-                          number_of_cutoffs,
-                          cutoffs_data,
-                          need_neigh_data);
+    int error;
+    {
+      py::gil_scoped_release release;
+      error = nbl_build(&self,
+                        natoms,
+                        coords_data,
+                        influence_distance,
+                        number_of_cutoffs,
+                        cutoffs_data,
+                        need_neigh_data,
+                        half_list,
+                        num_threads);
+    }
     if (error == 1)
     {
       throw std::runtime_error("Cell size too large! (partilces fly away) or\n"
@@ -74,7 +82,9 @@ PYBIND11_MODULE(neighlist, module)
          py::arg("coords").noconvert(),
          py::arg("influence_distance"),
          py::arg("cutoffs").noconvert(),
-         py::arg("need_neigh").noconvert())
+         py::arg("need_neigh").noconvert(),
+         py::arg("half_list") = false,
+         py::arg("num_threads") = 1)
       .def("get_neigh",
            [](NeighList &self,
               py::array_t<double> cutoffs,
@@ -145,6 +155,48 @@ PYBIND11_MODULE(neighlist, module)
      py::arg("neighbor_list_index"),
      py::arg("particle_number"));
 
+  // The arrays are views of the memory owned by the NeighList object, which is kept
+  // alive by the arrays; they become invalid if the list is built again.
+  module.def("get_csr",
+             [](py::object neigh_obj, int const neighbor_list_index) {
+    NeighList & self = neigh_obj.cast<NeighList &>();
+
+    if (neighbor_list_index < 0
+        || neighbor_list_index >= self.numberOfNeighborLists)
+    {
+      throw std::runtime_error("neighbor_list_index = "
+                               + std::to_string(neighbor_list_index)
+                               + " out of range; number of neighbor lists = "
+                               + std::to_string(self.numberOfNeighborLists));
+    }
+
+    NeighListOne const & cnl = self.lists[neighbor_list_index];
+    py::ssize_t const n = cnl.numberOfParticles;
+    py::ssize_t const total
+        = n > 0 ? cnl.beginIndex[n - 1] + cnl.Nneighbors[n - 1] : 0;
+
+    py::array_t<int> number_of_neighbors(
+        {n}, {sizeof(int)}, cnl.Nneighbors, neigh_obj);
+    py::array_t<int> begin_index({n}, {sizeof(int)}, cnl.beginIndex, neigh_obj);
+    py::array_t<int> neighbor_list(
+        {total}, {sizeof(int)}, cnl.neighborList, neigh_obj);
+
+    py::tuple re(3);
+    re[0] = number_of_neighbors;
+    re[1] = begin_index;
+    re[2] = neighbor_list;
+    return re;
+  }, R"pbdoc(
+     Get the neighbors of all particles in compressed sparse row format, without
+     copying: the neighbors of particle i are
+     neighbor_list[begin_index[i]:begin_index[i]+number_of_neighbors[i]].
+
+     Returns:
+         1darray, 1darray, 1darray: number_of_neighbors, begin_index, neighbor_list
+     )pbdoc",
+     py::arg("neigh"),
+     py::arg("neighbor_list_index") = 0);
+
   module.def("create", []() {
     NeighList * neighList = new NeighList;
     return std::unique_ptr<NeighList, PyNeighListDestroy>(std::move(neighList));
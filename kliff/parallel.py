@@ -1,6 +1,9 @@
+import heapq
 import multiprocessing as mp
 import random
 import sys
+import time
+import traceback
 
 import numpy as np
 
@@ -101,7 +104,7 @@ def _func1(f, q_in, q_out):
         q_out.put((i, y))
 
 
-def parmap2(f, X, *args, tuple_X=False, nprocs=mp.cpu_count()):
+def parmap2(f, X, *args, tuple_X=False, nprocs=mp.cpu_count(), costs=None):
     """
     Parallelism over data.
 
@@ -128,6 +131,11 @@ def parmap2(f, X, *args, tuple_X=False, nprocs=mp.cpu_count()):
     nprocs: int
         Number of processors to use.
 
+    costs: list
+        Estimated cost of each data point in ``X``. If provided, the data is divided
+        into groups with :meth:`kliff.parallel.lpt_partition` to balance the cost of the
+        groups.
+
     Return
     ------
     list
@@ -137,8 +145,8 @@ def parmap2(f, X, *args, tuple_X=False, nprocs=mp.cpu_count()):
     ----
     This function is implemented using ``multiprocessing.Pipe``. The data is subdivided
     into ``nprocs`` groups and then each group of data is distributed to a process. The
-    results from each group are then assembled together.  The data is shuffled to balance
-    the load in each process.  See :meth:`kliff.parallel.parmap1` for another
+    results from each group are then assembled together.  If ``costs`` is not provided,
+    the data is shuffled to balance the load in each process.  See :meth:`kliff.parallel.parmap1` for another
     implementation that uses ``multiprocessing.Queue``.
 
     Example
@@ -160,8 +168,11 @@ def parmap2(f, X, *args, tuple_X=False, nprocs=mp.cpu_count()):
         pairs = [(i, *x) for i, x in enumerate(X)]  # to make array_split work
     else:
         pairs = [(i, x) for i, x in enumerate(X)]
-    random.shuffle(pairs)
-    groups = np.array_split(pairs, nprocs)
+    if costs is None:
+        random.shuffle(pairs)
+        groups = np.array_split(pairs, nprocs)
+    else:
+        groups = [[pairs[i] for i in g] for g in lpt_partition(costs, nprocs)]
 
     processes = []
     managers = []
@@ -190,6 +201,270 @@ def _func2(f, iX, args, worker_end):
     worker_end.send(results)
 
 
+class WorkerPool:
+    """
+    A pool of long-lived worker processes, each owning a fixed shard of the data.
+
+    :meth:`kliff.parallel.parmap2` forks ``nprocs`` new processes and distributes the
+    data on every call. When the same function is evaluated over the same data many
+    times with only a small piece of state changing between calls (e.g. the model
+    parameters in an optimization), this is dominated by process creation. Here, the
+    data is distributed once when the pool is created, and each call to :meth:`map`
+    only sends the new state to the workers.
+
+    Parameters
+    ----------
+    f: function
+        The function that operates on the data.
+
+    X: list
+        Data to be parallelized.
+
+    args: args
+        Extra positional arguments needed by the function ``f``.
+
+    update: function
+        Called in each worker as ``update(p)`` with the argument ``p`` of :meth:`map`,
+        before ``f`` is applied to the data of the worker. Use it to publish the new
+        state (e.g. ``calculator.update_model_params``).
+
+    shard_f: function
+        Applied by :meth:`map_shard` to all the data of a worker at once, as
+        ``shard_f(xs, *args)``, with ``xs`` the list of the data points of the worker,
+        each a tuple of the arguments that ``f`` takes from ``X``.
+
+    tuple_X: bool
+        This depends on ``X``. It should be set to ``True`` if multiple arguments are
+        parallelized and set to ``False`` if only one argument is parallelized. See
+        ``Example`` below.
+
+    nprocs: int
+        Number of processors to use.
+
+    costs: list
+        Estimated cost of each data point in ``X``. If provided, the data is divided
+        into shards with :meth:`kliff.parallel.lpt_partition` to balance the cost of the
+        shards. Otherwise, the data is shuffled and divided into shards of the same
+        size. The time spent on each data point in the last call to :meth:`map` is
+        available in ``timings``, which can be used as ``costs`` to create a better
+        balanced pool.
+
+    Note
+    ----
+    Same as :meth:`kliff.parallel.parmap2`, this is implemented using
+    ``multiprocessing.Pipe``, and the data and functions are inherited by the forked
+    workers, so they need not be picklable. The argument ``p`` of :meth:`map` and the
+    returned values of ``f`` are sent through the pipes and should be picklable.
+
+    Example
+    -------
+    >>> state = {"p": 0}
+    >>> def update(p):
+    >>>     state["p"] = p
+    >>> def func(x, y):
+    >>>     return x + y + state["p"]
+    >>> with WorkerPool(func, range(3), 1, update=update, nprocs=2) as pool:
+    >>>     pool.map(1)  # [2,3,4]
+    >>>     pool.map(2)  # [3,4,5]
+    """
+
+    def __init__(
+        self,
+        f,
+        X,
+        *args,
+        update=None,
+        shard_f=None,
+        tuple_X=False,
+        nprocs=mp.cpu_count(),
+        costs=None,
+    ):
+        self.processes = []
+        self.managers = []
+        self.timings = None
+
+        ctx = get_context()
+
+        if tuple_X:
+            pairs = [(i, *x) for i, x in enumerate(X)]
+        else:
+            pairs = [(i, x) for i, x in enumerate(X)]
+        if costs is None:
+            # shuffle and divide into nprocs equally-numbered parts
+            random.shuffle(pairs)
+            groups = [pairs[i::nprocs] for i in range(nprocs)]
+        else:
+            groups = [[pairs[i] for i in g] for g in lpt_partition(costs, nprocs)]
+
+        for i in range(nprocs):
+            manager_end, worker_end = ctx.Pipe(duplex=True)
+            p = ctx.Process(
+                target=_func3,
+                args=(f, update, shard_f, groups[i], args, worker_end),
+            )
+            p.daemon = True
+            p.start()
+            self.processes.append(p)
+            self.managers.append(manager_end)
+
+    def map(self, p=None):
+        """
+        Apply the function to all the data.
+
+        Parameters
+        ----------
+        p:
+            Argument passed to ``update`` in each worker before applying ``f``.
+
+        Return
+        ------
+        list
+            A list of results, corresponding to ``X``.
+        """
+        if not self.managers:
+            raise RuntimeError("Cannot call `map()` on a closed `WorkerPool`.")
+
+        for m in self.managers:
+            m.send(("map", p))
+
+        results = []
+        error = None
+        for m in self.managers:
+            success, r = m.recv()
+            if success:
+                results.extend(r)
+            else:
+                error = r
+        if error is not None:
+            raise RuntimeError(f"Worker process failed with:\n{error}")
+
+        results = sorted(results, key=lambda irt: irt[0])
+        self.timings = [t for i, r, t in results]
+
+        return [r for i, r, t in results]
+
+    def map_shard(self, p=None):
+        """
+        Apply ``shard_f`` to the data of each worker, in a single round trip to the
+        workers.
+
+        Parameters
+        ----------
+        p:
+            Argument passed to ``update`` in each worker before applying ``shard_f``.
+
+        Return
+        ------
+        list
+            A list of results, one for each worker.
+        """
+        if not self.managers:
+            raise RuntimeError("Cannot call `map_shard()` on a closed `WorkerPool`.")
+
+        for m in self.managers:
+            m.send(("shard", p))
+
+        results = []
+        error = None
+        for m in self.managers:
+            success, r = m.recv()
+            if success:
+                results.append(r)
+            else:
+                error = r
+        if error is not None:
+            raise RuntimeError(f"Worker process failed with:\n{error}")
+
+        return results
+
+    def close(self):
+        """
+        Stop all the worker processes.
+        """
+        for m in self.managers:
+            try:
+                m.send((None, None))
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self.processes:
+            p.join()
+        self.processes = []
+        self.managers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def _func3(f, update, shard_f, iX, args, worker_end):
+    while True:
+        command, p = worker_end.recv()
+        if command is None:
+            break
+        try:
+            if update is not None:
+                update(p)
+            if command == "shard":
+                worker_end.send((True, shard_f([ix[1:] for ix in iX], *args)))
+                continue
+            results = []
+            for ix in iX:
+                i = ix[0]
+                x = ix[1:]
+                start = time.perf_counter()
+                r = f(*x, *args)
+                results.append((i, r, time.perf_counter() - start))
+            worker_end.send((True, results))
+        except Exception:
+            worker_end.send((False, traceback.format_exc()))
+
+
+def lpt_partition(costs, nparts):
+    """
+    Partition data into groups of balanced total cost.
+
+    This uses the longest-processing-time-first (LPT) greedy algorithm: the data
+    points are considered in decreasing order of their costs, and each is assigned to
+    the group with the smallest total cost so far.
+
+    Parameters
+    ----------
+    costs: list
+        Cost of each data point, e.g. estimated from the number of atoms and neighbors
+        of a configuration, or measured compute time.
+
+    nparts: int
+        Number of groups.
+
+    Return
+    ------
+    list
+        A list of ``nparts`` groups, each a sorted list of indices of the data points.
+
+    Example
+    -------
+    >>> lpt_partition([1, 5, 2, 2], 2)  # [[1], [0, 2, 3]]
+    """
+    costs = np.asarray(costs, dtype=float)
+
+    # heap of (total cost, group index)
+    heap = [(0.0, i) for i in range(nparts)]
+    groups = [[] for _ in range(nparts)]
+
+    # stable sort such that equal costs are assigned in order
+    for j in np.argsort(-costs, kind="stable"):
+        total, i = heapq.heappop(heap)
+        groups[i].append(int(j))
+        heapq.heappush(heap, (total + costs[j], i))
+
+    return [sorted(g) for g in groups]
+
+
 def get_MPI_world_size():
     try:
         from mpi4py import MPI
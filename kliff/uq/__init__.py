@@ -1,6 +1,7 @@
 from .bootstrap import Bootstrap, BootstrapEmpiricalModel, BootstrapNeuralNetworkModel
+from .chain_store import ChainStore, run_mcmc_stream
 from .mcmc import MCMC, get_T0
-from .mcmc_utils import autocorr, mser, rhat
+from .mcmc_utils import RunningAutocorr, RunningMSER, RunningRhat, autocorr, mser, rhat
 
 __all__ = [
     "MCMC",
@@ -8,6 +9,11 @@ __all__ = [
     "mser",
     "autocorr",
     "rhat",
+    "RunningMSER",
+    "RunningAutocorr",
+    "RunningRhat",
+    "ChainStore",
+    "run_mcmc_stream",
     "Bootstrap",
     "BootstrapEmpiricalModel",
     "BootstrapNeuralNetworkModel",
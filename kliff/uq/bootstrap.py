@@ -1,3 +1,4 @@
+import concurrent.futures
 import copy
 import json
 import os
@@ -5,7 +6,9 @@ from pathlib import Path
 from typing import Any, Callable, List, Optional, Union
 
 import numpy as np
+import torch
 
+from kliff import parallel
 from kliff.calculators.calculator import Calculator, _WrapperCalculator
 from kliff.calculators.calculator_torch import CalculatorTorchSeparateSpecies
 from kliff.loss import (
@@ -390,11 +393,21 @@ class BootstrapEmpiricalModel(_BaseBootstrap):
         initial_guess: Optional[np.ndarray] = None,
         residual_fn_list: Optional[List] = None,
         callback: Optional[Callable] = None,
+        nprocs: int = 1,
+        executor: Optional[concurrent.futures.Executor] = None,
     ) -> np.ndarray:
         """
         Iterate over the generated bootstrap compute arguments samples and train the
         potential using each compute arguments sample.
 
+        The bootstrap samples are independent, so they can be trained in parallel by
+        setting ``nprocs`` larger than 1, or by passing an ``executor``. Each worker
+        trains the samples using its own copy of the loss function, calculator, and
+        model, and only the indices of the compute arguments of each sample are sent to
+        the workers. The trained parameters are appended to the samples in the order of
+        the bootstrap compute arguments as soon as they are available, such that the
+        results are the same as in serial mode.
+
         Args:
             min_kwargs: Keyword arguments for :meth:`~kliff.loss.Loss.minimize`.
             initial_guess: (ndim,) Initial guess of parameters to use for the
@@ -407,6 +420,11 @@ class BootstrapEmpiricalModel(_BaseBootstrap):
                 the bootstrap instance and and output of
                 :meth:`~kliff.loss.Loss.minimize`. This function can also be used to
                 break the run, by returning boolean `True`.
+            nprocs: Number of processes to train the bootstrap samples in parallel.
+            executor: A :class:`concurrent.futures.Executor` to train the bootstrap
+                samples, e.g. ``mpi4py.futures.MPIPoolExecutor`` to use MPI ranks. The
+                bootstrap instance is sent to the workers with each sample, so the loss
+                function needs to be picklable. If given, ``nprocs`` is ignored.
 
         Returns:
             (nsamples, ndim,) Parameter samples from bootstrapping.
@@ -428,59 +446,155 @@ class BootstrapEmpiricalModel(_BaseBootstrap):
         if callback is None:
             callback = default_callback
 
-        # Train the model using each bootstrap compute arguments
-        for ii in range(self._nsamples_done, self._nsamples_prepared):
-            # Update the compute arguments
-            if self.use_multi_calc:
-                # There are multiple calculators used
-                for jj, calc in enumerate(self.calculator.calculators):
-                    calc.compute_arguments = self.bootstrap_compute_arguments[ii][jj]
-            else:
-                self.calculator.compute_arguments = self.bootstrap_compute_arguments[
-                    ii
-                ][0]
-
-            # Set the initial parameter guess
-            if initial_guess is None:
-                initial_guess = self.calculator.get_opt_params().copy()
-            self.calculator.update_model_params(initial_guess)
-            # TODO This assumes that we use the built-in residual functions
-            if self.use_multi_calc:
-                if residual_fn_list is None:
-                    # If multiple calculators are used, we need to update the residual
-                    # function used for each configuration. This is to ensure that we use
-                    # the correct residual function for each configuration.
-                    calc_list = self.calculator.get_calculator_list()
-                    residual_fn_list = []
-                    for calculator in calc_list:
-                        if calculator.use_energy and calculator.use_forces:
-                            residual_fn = energy_forces_residual
-                        elif calculator.use_energy:
-                            residual_fn = energy_residual
-                        elif calculator.use_forces:
-                            residual_fn = forces_residual
-                        else:
-                            raise ValueError(
-                                "Calculator does not use energy or forces."
-                            )
-                        residual_fn_list.append(residual_fn)
-                self.loss.residual_fn = residual_fn_list
-            # Minimization
-            opt_res = self.loss.minimize(**min_kwargs)
-
-            # Append the parameters to the samples
-            self.samples = np.row_stack(
-                (self.samples, self.loss.calculator.get_opt_params())
-            )
+        # Set the initial parameter guess
+        if initial_guess is None:
+            initial_guess = self.calculator.get_opt_params().copy()
+
+        # TODO This assumes that we use the built-in residual functions
+        if self.use_multi_calc and residual_fn_list is None:
+            # If multiple calculators are used, we need to update the residual
+            # function used for each configuration. This is to ensure that we use
+            # the correct residual function for each configuration.
+            residual_fn_list = []
+            for calculator in self.calculator.get_calculator_list():
+                if calculator.use_energy and calculator.use_forces:
+                    residual_fn = energy_forces_residual
+                elif calculator.use_energy:
+                    residual_fn = energy_residual
+                elif calculator.use_forces:
+                    residual_fn = forces_residual
+                else:
+                    raise ValueError("Calculator does not use energy or forces.")
+                residual_fn_list.append(residual_fn)
+
+        args = (initial_guess, min_kwargs, residual_fn_list)
+
+        if nprocs > 1 or executor is not None:
+            self._run_parallel(args, callback, nprocs, executor)
+        else:
+            # Train the model using each bootstrap compute arguments
+            for ii in range(self._nsamples_done, self._nsamples_prepared):
+                params, opt_res = self._train_sample(
+                    self._get_sample_indices(ii), *args
+                )
 
-            # Callback
-            if callback(self, opt_res):
-                break
+                # Append the parameters to the samples
+                self.samples = np.row_stack((self.samples, params))
+
+                # Callback
+                if callback(self, opt_res):
+                    break
 
         # Finishing up
         self.restore_loss()  # Restore the loss function
         return self.samples
 
+    def _run_parallel(
+        self,
+        args: tuple,
+        callback: Callable,
+        nprocs: int,
+        executor: Optional[concurrent.futures.Executor],
+    ):
+        """
+        Train the remaining bootstrap samples in parallel.
+
+        If no ``executor`` is given, a process pool is created whose workers inherit a
+        copy of this bootstrap instance once; otherwise, the instance is sent with each
+        sample. The finished samples are collected in order, and the remaining ones are
+        cancelled if ``callback`` returns `True`.
+        """
+        if executor is None:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=nprocs,
+                mp_context=parallel.get_context(),
+                initializer=_init_bootstrap_worker,
+                initargs=(self,),
+            )
+            bootstrap = None
+        else:
+            pool = executor
+            bootstrap = self
+
+        futures = {
+            pool.submit(
+                _train_bootstrap_sample, self._get_sample_indices(ii), args, bootstrap
+            ): ii
+            for ii in range(self._nsamples_done, self._nsamples_prepared)
+        }
+
+        finished = {}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                finished[futures[future]] = future.result()
+
+                # Append the finished samples in order
+                stop = False
+                while not stop and self._nsamples_done in finished:
+                    params, opt_res = finished.pop(self._nsamples_done)
+                    self.samples = np.row_stack((self.samples, params))
+                    stop = callback(self, opt_res)
+                if stop:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+            if executor is None:
+                pool.shutdown()
+
+    def _get_sample_indices(self, ii: int) -> List[List[int]]:
+        """
+        Get the indices of the compute arguments of the `ii`-th bootstrap sample in the
+        original compute arguments of each calculator.
+        """
+        indices = []
+        for jj, cas in enumerate(self.bootstrap_compute_arguments[ii]):
+            lookup = {
+                id(ca): kk for kk, ca in enumerate(self.orig_compute_arguments[jj])
+            }
+            try:
+                indices.append([lookup[id(ca)] for ca in cas])
+            except KeyError:
+                raise BootstrapError(
+                    "Bootstrap compute arguments are not taken from the original "
+                    "compute arguments."
+                )
+        return indices
+
+    def _train_sample(
+        self,
+        indices: List[List[int]],
+        initial_guess: np.ndarray,
+        min_kwargs: dict,
+        residual_fn_list: Optional[List],
+    ):
+        """
+        Train the potential using the bootstrap sample given by the indices of its
+        compute arguments in the original compute arguments of each calculator.
+
+        Returns:
+            The trained parameters and the output of :meth:`~kliff.loss.Loss.minimize`.
+        """
+        # Update the compute arguments
+        cas = [
+            [self.orig_compute_arguments[jj][kk] for kk in idx]
+            for jj, idx in enumerate(indices)
+        ]
+        if self.use_multi_calc:
+            # There are multiple calculators used
+            for jj, calc in enumerate(self.calculator.calculators):
+                calc.compute_arguments = cas[jj]
+            self.loss.residual_fn = residual_fn_list
+        else:
+            self.calculator.compute_arguments = cas[0]
+
+        self.calculator.update_model_params(initial_guess)
+
+        # Minimization
+        opt_res = self.loss.minimize(**min_kwargs)
+
+        return self.loss.calculator.get_opt_params().copy(), opt_res
+
     def restore_loss(self):
         """
         Restore the loss function: revert back the compute arguments and the parameters
@@ -696,25 +810,36 @@ class BootstrapNeuralNetworkModel(_BaseBootstrap):
         return new_bootstrap_compute_arguments_identifiers
 
     def run(
-        self, min_kwargs: Optional[dict] = None, callback: Optional[Callable] = None
+        self,
+        min_kwargs: Optional[dict] = None,
+        callback: Optional[Callable] = None,
+        ensemble_size: int = 1,
     ) -> np.ndarray:
         """
         Iterate over the generated bootstrap compute arguments samples and train the
         potential using each compute arguments sample.
 
+        If ``ensemble_size`` is larger than 1, the bootstrap samples are trained
+        ``ensemble_size`` at a time: the parameters of the replicas of the model are
+        stacked into batched tensors, and the losses of all replicas are computed in a
+        single forward and backward pass, see :meth:`_train_ensemble`. This requires a
+        single model, one of the built-in residual functions, and an optimizer that
+        updates each parameter independently (i.e. not `LBFGS`).
+
         Args:
             min_kwargs: Keyword arguments for :meth:`~kliff.loss.Loss.minimize`.
             callback: Called after each iteration. The arguments for this function are
                 the bootstrap instance and and output of
                 :meth:`~kliff.loss.Loss.minimize`. This function can also be used to
                 break the run, by returning boolean `True`.
+            ensemble_size: Number of bootstrap samples to train at a time.
 
         Returns:
             (nsamples, ndim,) Parameter samples from bootstrapping.
 
         Raises:
             BootstrapError: If there is no bootstrap compute areguments generated prior to
-                calling this method.
+                calling this method, or if the ensemble training is not supported.
         """
         if self._nsamples_prepared == 0:
             # Bootstrap fingerprints have not been generated
@@ -728,34 +853,206 @@ class BootstrapNeuralNetworkModel(_BaseBootstrap):
         if callback is None:
             callback = default_callback
 
+        if ensemble_size > 1:
+            self._check_ensemble(min_kwargs)
+
         # Train the model using each bootstrap fingerprints
-        for ii in range(self._nsamples_done, self._nsamples_prepared):
-            # Update the fingerprints
-            self.calculator.set_fingerprints(self.bootstrap_compute_arguments[ii])
-
-            for model in self.model:
-                # Reset the initial parameters
-                for layer in model.layers:
-                    try:
-                        layer.reset_parameters()
-                    except AttributeError:
-                        pass
-            # Minimization
-            self.loss.minimize(**min_kwargs)
-
-            # Append the parameters to the samples
-            self.samples = np.row_stack(
-                (self.samples, self.loss.calculator.get_opt_params())
-            )
+        ii = self._nsamples_done
+        while ii < self._nsamples_prepared:
+            if ensemble_size > 1:
+                ensemble = range(ii, min(ii + ensemble_size, self._nsamples_prepared))
+                samples = self._train_ensemble(
+                    [self.bootstrap_compute_arguments[jj] for jj in ensemble],
+                    **min_kwargs,
+                )
+            else:
+                samples = [
+                    self._train_sample(self.bootstrap_compute_arguments[ii], min_kwargs)
+                ]
 
-            # Callback
-            if callback(self):
+            stop = False
+            for params in samples:
+                # Append the parameters to the samples
+                self.samples = np.row_stack((self.samples, params))
+                ii += 1
+
+                # Callback
+                if callback(self):
+                    stop = True
+                    break
+            if stop:
                 break
 
         # Finishing up, restore the state
         self.restore_loss()
         return self.samples
 
+    def _train_sample(self, fingerprints: List, min_kwargs: dict) -> np.ndarray:
+        """
+        Train the potential using a bootstrap sample of fingerprints.
+
+        Returns:
+            The trained parameters.
+        """
+        # Update the fingerprints
+        self.calculator.set_fingerprints(fingerprints)
+
+        for model in self.model:
+            # Reset the initial parameters
+            self._reset_parameters(model)
+        # Minimization
+        self.loss.minimize(**min_kwargs)
+
+        return self.loss.calculator.get_opt_params()
+
+    def _check_ensemble(self, min_kwargs: dict):
+        """
+        Check if the bootstrap samples can be trained as an ensemble.
+        """
+        if self._calc_separate_species:
+            raise BootstrapError(
+                "Ensemble training is not supported for separate species models."
+            )
+        if not self.loss._use_vectorized_loss():
+            raise BootstrapError(
+                "Ensemble training requires one of the built-in residual functions "
+                "without stress."
+            )
+        if min_kwargs.get("method", "Adam") == "LBFGS":
+            raise BootstrapError("Ensemble training does not support `LBFGS`.")
+
+    def _train_ensemble(
+        self,
+        samples: List[List],
+        method: str = "Adam",
+        batch_size: int = 100,
+        num_epochs: int = 1000,
+        start_epoch: int = 0,
+        **kwargs,
+    ) -> np.ndarray:
+        """
+        Train the potential using several bootstrap samples of fingerprints at once.
+
+        The replicas of the model are initialized in the same way as in
+        :meth:`_train_sample`, and their parameters are stacked into batched tensors
+        that are evaluated with :func:`torch.func.vmap`. Each sample is represented by the
+        indices of its fingerprints in the original fingerprints, which are shared by
+        all replicas. In each minimization step, each replica uses the next batch of its
+        own sample: the union of these batches is computed once for all replicas, and
+        the loss of each replica counts each of its fingerprints as many times as it
+        appears in its batch. Since the loss of a replica only depends on its own
+        parameters, and the optimizer updates each parameter independently, each
+        replica is trained as in :meth:`~kliff.loss.LossNeuralNetworkModel.minimize`.
+
+        Args:
+            samples: Bootstrap samples of fingerprints.
+            method: PyTorch optimization method, see
+                :meth:`~kliff.loss.LossNeuralNetworkModel.minimize`.
+            batch_size: Number of configurations used in each minimization step.
+            num_epochs: Number of epochs to carry out the minimization.
+            start_epoch: The starting epoch number.
+            kwargs: Extra keyword arguments that can be used by the PyTorch optimizer.
+
+        Returns:
+            (K, ndim) Trained parameters of the `K` samples.
+        """
+        model = self.model[0]
+
+        # indices of the fingerprints of each sample in the original fingerprints,
+        # identified by their configurations
+        lookup = {
+            id(fp["configuration"]): kk
+            for kk, fp in enumerate(self.orig_compute_arguments)
+        }
+        try:
+            indices = [
+                np.asarray([lookup[id(fp["configuration"])] for fp in fps])
+                for fps in samples
+            ]
+        except KeyError:
+            raise BootstrapError(
+                "Bootstrap fingerprints are not taken from the original fingerprints."
+            )
+        self.calculator.set_fingerprints(self.orig_compute_arguments)
+        dataset = self.calculator.fingerprints_dataset
+
+        # stacked parameters of the replicas of the model; the model itself cannot be
+        # copied (the descriptor is not picklable), so the tensors are stacked as done
+        # by `torch.func.stack_module_state`
+        replicas = []
+        for _ in samples:
+            self._reset_parameters(model)
+            replicas.append(
+                (
+                    {k: v.detach().clone() for k, v in model.named_parameters()},
+                    {k: v.detach().clone() for k, v in model.named_buffers()},
+                )
+            )
+        params = {
+            k: torch.stack([p[k] for p, _ in replicas]).requires_grad_(True)
+            for k in replicas[0][0]
+        }
+        buffers = {k: torch.stack([b[k] for _, b in replicas]) for k in replicas[0][1]}
+
+        try:
+            optimizer = getattr(torch.optim, method)(params.values(), **kwargs)
+        except (AttributeError, TypeError) as e:
+            raise BootstrapError(f"Cannot create optimizer `{method}`: {e}")
+
+        nmodels = len(samples)
+        nbatches = max(int(np.ceil(len(idx) / batch_size)) for idx in indices)
+        for epoch in range(start_epoch, start_epoch + num_epochs):
+            epoch_loss = 0
+            for ib in range(nbatches):
+                batches = [
+                    idx[ib * batch_size : (ib + 1) * batch_size] for idx in indices
+                ]
+
+                # number of times each fingerprint in the union of the batches appears
+                # in the batch of each replica, normalized by the size of the batch
+                union, inverse = np.unique(np.concatenate(batches), return_inverse=True)
+                counts = np.zeros((nmodels, len(union)))
+                start = 0
+                for kk, b in enumerate(batches):
+                    np.add.at(counts[kk], inverse[start : start + len(b)], 1)
+                    if len(b) > 0:
+                        counts[kk] /= len(b)
+                    start += len(b)
+
+                batch = [dataset[jj] for jj in union]
+                counts = torch.as_tensor(counts, device=model.device)
+
+                optimizer.zero_grad()
+                loss_config = self.loss._get_loss_ensemble(batch, params, buffers)
+                loss = torch.sum(counts.to(loss_config.dtype) * loss_config)
+                loss.backward()
+                optimizer.step()
+                # float() such that do not accumulate history, more memory friendly
+                epoch_loss += float(loss)
+
+            print("Epoch = {:<6d}  loss = {:.10e}".format(epoch, epoch_loss))
+
+        names = [name for name, _ in model.named_parameters()]
+        return np.stack(
+            [
+                np.concatenate(
+                    [params[name][kk].detach().cpu().numpy().ravel() for name in names]
+                )
+                for kk in range(nmodels)
+            ]
+        )
+
+    @staticmethod
+    def _reset_parameters(model):
+        """
+        Reset the initial parameters of the layers of a model.
+        """
+        for layer in model.layers:
+            try:
+                layer.reset_parameters()
+            except AttributeError:
+                pass
+
     def restore_loss(self):
         """
         Restore the loss function: revert back the compute arguments and the parameters
@@ -767,6 +1064,29 @@ class BootstrapNeuralNetworkModel(_BaseBootstrap):
             model.load(fname)
 
 
+# copy of the bootstrap instance inherited by each worker of the process pool
+_worker_bootstrap = None
+
+
+def _init_bootstrap_worker(bootstrap: BootstrapEmpiricalModel):
+    global _worker_bootstrap
+    _worker_bootstrap = bootstrap
+
+
+def _train_bootstrap_sample(
+    indices: List[List[int]],
+    args: tuple,
+    bootstrap: Optional[BootstrapEmpiricalModel] = None,
+):
+    """
+    Train a bootstrap sample in a worker, using `bootstrap` or, if it is `None`, the
+    copy of the bootstrap instance inherited by the worker.
+    """
+    if bootstrap is None:
+        bootstrap = _worker_bootstrap
+    return bootstrap._train_sample(indices, *args)
+
+
 class BootstrapError(Exception):
     def __init__(self, msg: str):
         super(BootstrapError, self).__init__(msg)
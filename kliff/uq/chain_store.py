@@ -0,0 +1,326 @@
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from kliff.utils import create_directory, pickle_dump, pickle_load, to_path
+
+try:
+    import emcee
+
+    emcee_avail = True
+except ImportError:
+    emcee_avail = False
+
+try:
+    import ptemcee
+
+    ptemcee_avail = True
+except ImportError:
+    ptemcee_avail = False
+
+
+class ChainStore:
+    """On-disk storage of MCMC chains that grows during the sampling.
+
+    The samples and their log-probabilities are appended step by step to the flat binary
+    files ``chain.bin`` and ``log_prob.bin`` in the store directory, and they are read
+    back via ``np.memmap``, such that the chains never need to be in memory. The shape
+    of the samples of a step, e.g. (nwalkers, ndim,) for ``emcee`` and
+    (ntemps, nwalkers, ndim,) for ``ptemcee``, is saved in ``index.pkl``.
+
+    A checkpoint, saved in ``checkpoint.pkl``, records the number of steps stored and
+    the state of the sampler needed to resume the sampling. When an existing store is
+    opened, the steps appended after its last checkpoint are discarded.
+
+    Args:
+        path: Path to the store directory. If it already holds a store, the store is
+            opened at its last checkpoint.
+        shape: Shape of the samples of a step. It is required to create a new store.
+        dtype: Data type of the samples.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        shape: Optional[Tuple[int, ...]] = None,
+        dtype=np.float64,
+    ):
+        self.path = to_path(path)
+
+        index_file = self.path / "index.pkl"
+        if index_file.exists():
+            index = pickle_load(index_file)
+            self.shape = tuple(index["shape"])
+            self.dtype = np.dtype(index["dtype"])
+            if shape is not None and tuple(shape) != self.shape:
+                raise ChainStoreError(
+                    f"Expect samples of shape {self.shape} in store `{self.path}`; got "
+                    f"{tuple(shape)}."
+                )
+        else:
+            if shape is None:
+                raise ChainStoreError(
+                    "The shape of the samples is required to create a new store."
+                )
+            self.shape = tuple(shape)
+            self.dtype = np.dtype(dtype)
+            create_directory(self.path, is_directory=True)
+            pickle_dump({"shape": self.shape, "dtype": self.dtype.str}, index_file)
+
+        checkpoint = self.load_checkpoint()
+        self.nsteps = 0 if checkpoint is None else checkpoint["nsteps"]
+
+        # discard the steps appended after the last checkpoint
+        self._files = {}
+        for name, shape in self._fields.items():
+            filename = self.path / f"{name}.bin"
+            with open(filename, "ab") as f:
+                f.truncate(self.nsteps * self._step_nbytes(shape))
+            self._files[name] = open(filename, "ab")
+
+    @property
+    def _fields(self) -> Dict[str, Tuple[int, ...]]:
+        return {"chain": self.shape, "log_prob": self.shape[:-1]}
+
+    def _step_nbytes(self, shape: Tuple[int, ...]) -> int:
+        return int(np.prod(shape)) * self.dtype.itemsize
+
+    def append(self, samples: np.ndarray, log_prob: np.ndarray):
+        """Append steps of the chains.
+
+        Args:
+            samples: Samples of a step, or (nsteps, ...) samples of several steps.
+            log_prob: Log-probabilities of the samples, without the last dimension of
+                ``samples``.
+        """
+        samples = np.asarray(samples, dtype=self.dtype)
+        log_prob = np.asarray(log_prob, dtype=self.dtype)
+        if samples.shape == self.shape:
+            samples = samples[None]
+            log_prob = log_prob[None]
+
+        if samples.shape[1:] != self.shape or log_prob.shape[1:] != self.shape[:-1]:
+            raise ChainStoreError(
+                f"Expect samples of shape {self.shape} and log-probabilities of shape "
+                f"{self.shape[:-1]}; got {samples.shape[1:]} and {log_prob.shape[1:]}."
+            )
+        if len(samples) != len(log_prob):
+            raise ChainStoreError(
+                "The numbers of steps of samples and log-probabilities are different."
+            )
+
+        self._files["chain"].write(np.ascontiguousarray(samples).tobytes())
+        self._files["log_prob"].write(np.ascontiguousarray(log_prob).tobytes())
+        self.nsteps += len(samples)
+
+    def checkpoint(self, state: Optional[Dict[str, Any]] = None):
+        """Write the appended steps to disk, and save a checkpoint.
+
+        Args:
+            state: State of the sampler to resume the sampling from the last step.
+        """
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+        # write to a temporary file first such that the checkpoint is never corrupted
+        filename = self.path / "checkpoint.pkl"
+        tmp = self.path / "checkpoint.pkl.tmp"
+        pickle_dump({"nsteps": self.nsteps, "state": state}, tmp)
+        os.replace(tmp, filename)
+
+    def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Load the last checkpoint.
+
+        Returns:
+            A dictionary with the number of steps ``nsteps`` and the ``state`` of the
+            sampler at the checkpoint, or ``None`` if there is no checkpoint.
+        """
+        filename = self.path / "checkpoint.pkl"
+        if not filename.exists():
+            return None
+        return pickle_load(filename)
+
+    def get_chain(self, discard: int = 0, thin: int = 1) -> np.ndarray:
+        """Get the stored chains.
+
+        Args:
+            discard: Number of steps to discard from the beginning of the chains.
+            thin: Take only every ``thin`` steps.
+
+        Returns:
+            (nsteps, ...) Memory-mapped, read-only array of the samples.
+        """
+        return self._open("chain")[discard::thin]
+
+    def get_log_prob(self, discard: int = 0, thin: int = 1) -> np.ndarray:
+        """Get the log-probabilities of the stored chains.
+
+        See :meth:`get_chain` for the arguments.
+        """
+        return self._open("log_prob")[discard::thin]
+
+    def iter_chunks(
+        self, chunk_size: int = 1000, start: int = 0
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Iterate over the stored chains in chunks of steps.
+
+        This is useful to compute diagnostics with :class:`~kliff.uq.RunningMSER`,
+        :class:`~kliff.uq.RunningAutocorr`, and :class:`~kliff.uq.RunningRhat` with only
+        one chunk in memory at a time.
+
+        Args:
+            chunk_size: Number of steps of each chunk.
+            start: Index of the first step.
+
+        Returns:
+            An iterator over the samples and log-probabilities of each chunk.
+        """
+        chain = self._open("chain")
+        log_prob = self._open("log_prob")
+        for i in range(start, self.nsteps, chunk_size):
+            yield np.array(chain[i : i + chunk_size]), np.array(
+                log_prob[i : i + chunk_size]
+            )
+
+    def _open(self, name: str) -> np.ndarray:
+        shape = (self.nsteps,) + self._fields[name]
+        if self.nsteps == 0:
+            return np.zeros(shape, dtype=self.dtype)
+
+        self._files[name].flush()
+        return np.memmap(
+            self.path / f"{name}.bin", dtype=self.dtype, mode="r", shape=shape
+        )
+
+    def close(self):
+        """Close the files of the store."""
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def run_mcmc_stream(
+    sampler,
+    store: ChainStore,
+    nsteps: int,
+    p0: Optional[np.ndarray] = None,
+    checkpoint_every: int = 100,
+    callback: Optional[Callable] = None,
+) -> ChainStore:
+    """Run an MCMC sampler and stream the chains into a :class:`ChainStore`.
+
+    The samples are kept in memory for at most ``checkpoint_every`` steps: they are then
+    appended to the store, and a checkpoint with the state of the sampler is saved. If
+    the store already has steps, the sampling is resumed from its last checkpoint, and
+    ``p0`` is ignored.
+
+    Args:
+        sampler: Sampler instance from ``emcee.EnsembleSampler`` or ``ptemcee.Sampler``,
+            e.g. created by :class:`~kliff.uq.MCMC`.
+        store: Store of the chains.
+        nsteps: Total number of steps of the chains in the store.
+        p0: Initial positions of the walkers, with the shape of the samples of a step.
+        checkpoint_every: Number of steps between checkpoints.
+        callback: Called after each checkpoint, with the store and the samples and
+            log-probabilities of the last chunk of steps as arguments. This can be used
+            to update diagnostics, and to stop the sampling by returning `True`.
+
+    Returns:
+        The store of the chains.
+    """
+    remaining = nsteps - store.nsteps
+    if remaining <= 0:
+        return store
+
+    checkpoint = store.load_checkpoint() if store.nsteps > 0 else None
+    state = None if checkpoint is None else checkpoint["state"]
+    if state is None and p0 is None:
+        raise ChainStoreError("Initial positions `p0` are required.")
+
+    if emcee_avail and isinstance(sampler, emcee.EnsembleSampler):
+        steps = _sample_emcee(sampler, remaining, p0, state)
+    elif ptemcee_avail and isinstance(sampler, ptemcee.Sampler):
+        steps = _sample_ptemcee(sampler, remaining, p0, state)
+    else:
+        raise ChainStoreError(
+            "Only samplers from `emcee.EnsembleSampler` or `ptemcee.Sampler` are "
+            "supported."
+        )
+
+    samples = []
+    log_prob = []
+    for ii, (x, lp, state) in enumerate(steps):
+        samples.append(np.array(x))
+        log_prob.append(np.array(lp))
+
+        if len(samples) == checkpoint_every or ii == remaining - 1:
+            chunk = (np.stack(samples), np.stack(log_prob))
+            store.append(*chunk)
+            store.checkpoint(state)
+            samples = []
+            log_prob = []
+
+            if callback is not None and callback(store, *chunk):
+                break
+
+    return store
+
+
+def _sample_emcee(sampler, nsteps, p0, state):
+    """Iterate over the steps of an ``emcee`` sampler, yielding the samples, their
+    log-probabilities, and the state to resume from.
+    """
+    if state is not None:
+        p0 = emcee.State(
+            state["coords"],
+            log_prob=state["log_prob"],
+            random_state=state["random_state"],
+        )
+
+    for step in sampler.sample(p0, iterations=nsteps, store=False):
+        state = {
+            "coords": np.array(step.coords),
+            "log_prob": np.array(step.log_prob),
+            "random_state": step.random_state,
+        }
+        yield step.coords, step.log_prob, state
+
+
+def _sample_ptemcee(sampler, nsteps, p0, state):
+    """Iterate over the steps of a ``ptemcee`` sampler, yielding the samples, their
+    log-probabilities, and the state to resume from.
+    """
+    kwargs = {"p0": p0}
+    if state is not None:
+        sampler._random.set_state(state["random_state"])
+        kwargs = {
+            "p0": state["coords"],
+            "lnprob0": state["log_prob"],
+            "lnlike0": state["log_like"],
+        }
+
+    for p, lnprob, lnlike in sampler.sample(
+        iterations=nsteps, storechain=False, **kwargs
+    ):
+        state = {
+            "coords": np.array(p),
+            "log_prob": np.array(lnprob),
+            "log_like": np.array(lnlike),
+            "random_state": sampler._random.get_state(),
+        }
+        yield p, lnprob, state
+
+
+class ChainStoreError(Exception):
+    def __init__(self, msg):
+        super(ChainStoreError, self).__init__(msg)
+        self.msg = msg
@@ -272,6 +272,13 @@ if emcee_avail:
             sampling temperature is set to the natural temperature. To use the untempered
             likelihood (:math:`T=1`), user should specify the argument ``T=1``.
 
+            With ``vectorize=True``, the log-probability of all the walkers is evaluated
+            in one call, and the likelihood of the walkers within the support of the
+            prior is computed with
+            :meth:`~kliff.loss.LossPhysicsMotivatedModel.get_loss_batch`. This uses the
+            worker pool of the loss function in multiprocessing mode, instead of the
+            ``pool`` of ``emcee``.
+
 
         References:
             .. [Frederiksen2004] S. L. Frederiksen, K. W. Jacobsen, K. S. Brown, and J. P.
@@ -305,8 +312,20 @@ if emcee_avail:
 
             global logprobability_fn
 
-            def logprobability_fn(x):
-                return logl_fn(x) + logp_fn(x)
+            if kwargs.get("vectorize", False):
+
+                def logprobability_fn(X):
+                    logp = np.array([logp_fn(x) for x in X], dtype=float)
+                    # only evaluate the likelihood within the support of the prior
+                    finite = np.isfinite(logp)
+                    if np.any(finite):
+                        logp[finite] += self._loglikelihood_batch(X[finite])
+                    return logp
+
+            else:
+
+                def logprobability_fn(x):
+                    return logl_fn(x) + logp_fn(x)
 
             super().__init__(nwalkers, ndim, logprobability_fn, **kwargs)
 
@@ -316,6 +335,10 @@ if emcee_avail:
             """
             return _get_loglikelihood(x, self.loss, self.T)
 
+        def _loglikelihood_batch(self, X):
+            """Log-likelihood of a batch of parameter values, one in each row of ``X``."""
+            return _get_loglikelihood_batch(X, self.loss, self.T)
+
         def _logprior_wrapper(self, logprior_fn, *logprior_args):
             """A wapper to the log-prior function, so that the only argument is the
             parameter values.
@@ -340,6 +363,15 @@ def _get_loglikelihood(x: np.ndarray, loss: Loss, T: Optional[float] = 1.0):
     return logl
 
 
+def _get_loglikelihood_batch(X: np.ndarray, loss: Loss, T: Optional[float] = 1.0):
+    """Compute the log-likelihood of a batch of parameter values, one in each row of
+    ``X``. See :func:`_get_loglikelihood`.
+    """
+    cost = loss.get_loss_batch(X)
+    logl = -cost / T
+    return logl
+
+
 def _get_parameter_bounds(loss):
     """Get the parameter bounds for the default uniform prior."""
     bounds = loss.calculator.get_opt_params_bounds()
@@ -42,10 +42,9 @@ def mser(
     """
     length = len(chain)  # Chain length
 
-    # Compute the SE square
-    SE2_list = [
-        _standard_error_squared(chain[dd:]) for dd in range(length)[dmin:dmax:dstep]
-    ]
+    # Compute the SE square of all the suffixes at once from cumulative sums
+    dd = np.arange(length)[dmin:dmax:dstep]
+    SE2_list = list(_standard_error_squared_suffix(chain, dd))
 
     # Get the estimate of the equilibration time, wrt the original time series
     dest = np.argmin(SE2_list)
@@ -121,6 +120,261 @@ def rhat(
     return toreturn
 
 
+class RunningMSER:
+    """Estimate the equilibration time using MSER on a chain that grows in chunks.
+
+    This gives the same estimate as :func:`mser` with ``dmax=-1`` on the chain seen so
+    far, but only the partial sums of the chain up to the candidate equilibration times
+    are stored, such that each update costs :math:`O(m)` for a chunk of :math:`m`
+    steps, and the chain itself doesn't need to be kept in memory.
+
+    Args:
+        dmin: Index where to start the search in the time series.
+        dstep: How much to increment the search is done.
+    """
+
+    def __init__(self, dmin: Optional[int] = 1, dstep: Optional[int] = 10):
+        self.dmin = dmin
+        self.dstep = dstep
+        self.nsteps = 0
+
+        self._shift = None
+        self._sum1 = None
+        self._sum2 = None
+        # candidate equilibration times and the partial sums of the chain up to them
+        self._d = []
+        self._prefix1 = []
+        self._prefix2 = []
+
+    def update(self, chunk: np.ndarray):
+        """Append a chunk of the chain.
+
+        Args:
+            chunk: (nsteps, ...) Array containing the next steps of the time series. The
+                trailing dimensions, if any, are independent time series, e.g. of each
+                walker and parameter.
+        """
+        chunk = np.asarray(chunk, dtype=float)
+        if self._shift is None:
+            # shift the chain by its first value to reduce round-off errors
+            self._shift = chunk[0].copy()
+            self._sum1 = np.zeros_like(self._shift)
+            self._sum2 = np.zeros_like(self._shift)
+        x = chunk - self._shift
+
+        zero = np.zeros((1,) + self._shift.shape)
+        cumsum1 = self._sum1 + np.concatenate((zero, np.cumsum(x, axis=0)))
+        cumsum2 = self._sum2 + np.concatenate((zero, np.cumsum(x**2, axis=0)))
+
+        start = self.nsteps
+        self.nsteps += len(x)
+
+        d = self.dmin + self.dstep * len(self._d)
+        while d <= self.nsteps:
+            self._d.append(d)
+            self._prefix1.append(cumsum1[d - start])
+            self._prefix2.append(cumsum2[d - start])
+            d += self.dstep
+
+        self._sum1 = cumsum1[-1]
+        self._sum2 = cumsum2[-1]
+
+    def estimate(self, full_output: Optional[bool] = False) -> Union[int, dict]:
+        """Estimate the equilibration time from the chain seen so far.
+
+        Returns:
+            Estimate of the equilibration time using MSER, an array if the time series
+            have trailing dimensions. If ``full_output=True``, then a dictionary
+            containing the estimated equilibration time and the list of squared
+            standard errors will be returned.
+        """
+        # same candidates as `range(length)[dmin:-1:dstep]` in :func:`mser`
+        ncandidates = sum(d < self.nsteps - 1 for d in self._d)
+        if ncandidates == 0:
+            raise ValueError(
+                "The chain is too short to estimate the equilibration time."
+            )
+
+        d = np.asarray(self._d[:ncandidates])
+        nn = (self.nsteps - d).reshape((-1,) + (1,) * self._shift.ndim)
+        mean = (self._sum1 - np.asarray(self._prefix1[:ncandidates])) / nn
+        mean2 = (self._sum2 - np.asarray(self._prefix2[:ncandidates])) / nn
+        SE2 = np.maximum(mean2 - mean**2, 0.0) / nn
+
+        dest = np.argmin(SE2, axis=0)
+        dstar = np.minimum(self.dmin + (dest + 1) * self.dstep, self.nsteps)
+        if np.ndim(dstar) == 0:
+            dstar = int(dstar)
+
+        if full_output:
+            return {"dstar": dstar, "SE2": list(SE2)}
+        else:
+            return dstar
+
+
+class RunningAutocorr:
+    """Estimate the autocorrelation length of chains that grow in chunks.
+
+    This follows ``emcee.autocorr.integrated_time`` used by :func:`autocorr`: the
+    normalized autocorrelation function is averaged over the walkers, and the
+    integrated autocorrelation time is estimated with the automated windowing procedure
+    of Sokal. The sums of the lagged products of the chains are accumulated for lags
+    smaller than ``max_lag``, such that each update costs :math:`O(m L)` for a chunk of
+    :math:`m` steps and ``max_lag`` :math:`L`, and only the first and last ``max_lag``
+    steps of the chains are kept in memory. The estimate is the same as that of
+    :func:`autocorr` as long as the window, about ``c`` times the autocorrelation
+    length, is smaller than ``max_lag``.
+
+    Args:
+        max_lag: Maximum lag of the autocorrelation function.
+        c: Step size for the window search.
+    """
+
+    def __init__(self, max_lag: Optional[int] = 1000, c: Optional[float] = 5):
+        self.max_lag = max_lag
+        self.c = c
+        self.nsteps = 0
+
+        self._shift = None
+        self._sum = None
+        self._lagged = None  # sum of x_t x_{t+k} for each lag k
+        self._head = None  # first max_lag steps
+        self._tail = None  # last max_lag - 1 steps
+
+    def update(self, chunk: np.ndarray):
+        """Append a chunk of the chains.
+
+        Args:
+            chunk: (nwalkers, nsteps, ndim,) Next steps of the chains.
+        """
+        x = np.swapaxes(
+            np.asarray(chunk, dtype=float), 0, 1
+        )  # (nsteps, nwalkers, ndim)
+        if self._shift is None:
+            # shift the chains by their first values to reduce round-off errors
+            self._shift = x[0].copy()
+            self._sum = np.zeros_like(self._shift)
+            self._lagged = np.zeros((self.max_lag,) + self._shift.shape)
+            self._head = x[:0]
+            self._tail = x[:0]
+        x = x - self._shift
+
+        # the lagged products with an end in this chunk
+        z = np.concatenate((self._tail, x))
+        start = len(self._tail)
+        for k in range(min(self.max_lag, len(z))):
+            lo = max(start, k)
+            self._lagged[k] += np.sum(z[lo:] * z[lo - k : len(z) - k], axis=0)
+
+        self.nsteps += len(x)
+        self._sum += np.sum(x, axis=0)
+        if len(self._head) < self.max_lag:
+            self._head = np.concatenate((self._head, x[: self.max_lag]))
+        self._tail = z[len(z) - (self.max_lag - 1) :] if self.max_lag > 1 else z[:0]
+
+    def estimate(self) -> np.ndarray:
+        """Estimate the autocorrelation length from the chains seen so far.
+
+        Returns:
+            Estimate of the autocorrelation length for each parameter.
+        """
+        n = self.nsteps
+        nlags = min(self.max_lag, n)
+        mean = self._sum / n
+
+        # sum of (x_t - mean) (x_{t+k} - mean) for t = 0, ..., n - k - 1
+        k = np.arange(nlags).reshape((-1,) + (1,) * mean.ndim)
+        first_k = np.concatenate(
+            (np.zeros((1,) + mean.shape), np.cumsum(self._head[: nlags - 1], axis=0))
+        )
+        last_k = np.concatenate(
+            (
+                np.zeros((1,) + mean.shape),
+                np.cumsum(self._tail[::-1][: nlags - 1], axis=0),
+            )
+        )
+        acov = (
+            self._lagged[:nlags]
+            - mean * ((self._sum - last_k) + (self._sum - first_k))
+            + (n - k) * mean**2
+        )
+
+        # normalized autocorrelation function averaged over the walkers
+        acf = np.mean(acov / acov[0], axis=1)  # (nlags, ndim)
+        taus = 2.0 * np.cumsum(acf, axis=0) - 1.0
+
+        tau = np.empty(taus.shape[1])
+        for d in range(taus.shape[1]):
+            m = np.arange(nlags) < self.c * taus[:, d]
+            window = np.argmin(m) if np.any(m) else nlags - 1
+            tau[d] = taus[window, d]
+        return tau
+
+
+class RunningRhat:
+    """Compute :math:`\\hat{r}` of :func:`rhat` on chains that grow in chunks.
+
+    The walkers are the chains whose covariances within and between them are compared.
+    The mean and the covariance matrix of each chain are updated for each chunk using
+    the pairwise algorithm of Chan et al., such that the chains themselves don't need to
+    be kept in memory.
+    """
+
+    def __init__(self):
+        self.nsteps = 0
+        self._mean = None
+        self._M2 = None
+
+    def update(self, chunk: np.ndarray):
+        """Append a chunk of the chains.
+
+        Args:
+            chunk: (nwalkers, nsteps, ndim,) Next steps of the chains.
+        """
+        chunk = np.asarray(chunk, dtype=float)
+        nb = chunk.shape[1]
+        mean_b = np.mean(chunk, axis=1)
+        centered = chunk - mean_b[:, None, :]
+        M2_b = np.einsum("wti,wtj->wij", centered, centered)
+
+        if self._mean is None:
+            self._mean = mean_b
+            self._M2 = M2_b
+        else:
+            na = self.nsteps
+            n = na + nb
+            delta = mean_b - self._mean
+            self._mean = self._mean + delta * nb / n
+            self._M2 = (
+                self._M2 + M2_b + np.einsum("wi,wj->wij", delta, delta) * na * nb / n
+            )
+        self.nsteps += nb
+
+    def estimate(
+        self, return_WB: Optional[bool] = False
+    ) -> Union[float, Tuple[float, np.ndarray, np.ndarray]]:
+        """Compute the value of :math:`\\hat{r}` from the chains seen so far.
+
+        Args:
+            return_WB: A flag to return covariance matrices within and between chains.
+
+        Returns:
+            The value of rhat. if ``return_WB=True``, also returns matrices of
+            covariance within and between the chains.
+        """
+        m = len(self._mean)
+        n = self.nsteps
+        W = np.mean(self._M2, axis=0) / (n - 1)
+        B_over_n = np.atleast_2d(np.cov(self._mean, rowvar=False, ddof=1))
+        lambda1 = _lambda1_WB(W, B_over_n)
+        r = 1 - 1 / n + (1 + 1 / m) * lambda1
+
+        if return_WB:
+            return r, W, B_over_n
+        else:
+            return r
+
+
 def _standard_error_squared(chain: np.ndarray) -> float:
     """Compute the square of the standard error."""
     nn = len(chain)
@@ -128,13 +382,34 @@ def _standard_error_squared(chain: np.ndarray) -> float:
     return se2
 
 
+def _standard_error_squared_suffix(chain: np.ndarray, dd: np.ndarray) -> np.ndarray:
+    """Compute the square of the standard error of ``chain[d:]`` for each ``d`` in
+    ``dd``.
+    """
+    # shift the chain by its mean to reduce round-off errors
+    x = np.asarray(chain, dtype=float)
+    x = x - np.mean(x)
+    sum1 = np.append(np.cumsum(x[::-1])[::-1], 0.0)
+    sum2 = np.append(np.cumsum(x[::-1] ** 2)[::-1], 0.0)
+
+    nn = len(x) - dd
+    mean = sum1[dd] / nn
+    var = np.maximum(sum2[dd] / nn - mean**2, 0.0)
+    return var / nn
+
+
 def _lambda1(chain):
     """Compute the largest eigenvalue of :math:`W^{-1} B/n`."""
     W = _W(chain)
     B_over_n = _B_over_n(chain)
+    return _lambda1_WB(W, B_over_n), W, B_over_n
+
+
+def _lambda1_WB(W, B_over_n):
+    """Compute the largest eigenvalue of :math:`W^{-1} B/n` from the matrices."""
     V = np.linalg.lstsq(W, B_over_n, rcond=-1)[0]
     s = np.linalg.svd(V, compute_uv=False)
-    return np.max(s), W, B_over_n
+    return np.max(s)
 
 
 def _B_over_n(chain):
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from kliff.analyzers import Fisher
+from kliff.analyzers.rmse import AnalyzerError
+from kliff.calculators import Calculator
+from kliff.dataset import Dataset
+from kliff.models import LennardJones
+
+
+def init(path, use_forces=True):
+    model = LennardJones(species=["Si"])
+    model.set_opt_params(sigma=[[2.0]], epsilon=[[1.5]])
+
+    tset = Dataset(path / "configs" / "Si_4")
+    configs = tset.get_configs()
+
+    calc = Calculator(model)
+    calc.create(configs, use_energy=True, use_forces=use_forces)
+
+    return calc
+
+
+def test_jacobian(test_data_dir):
+    """
+    Test the finite difference Jacobian against the analytic one.
+    """
+    calc = init(test_data_dir)
+    analyzer = Fisher(calc)
+
+    params = calc.get_opt_params()
+    cas = calc.get_compute_arguments()
+    jacobians = analyzer._compute_jacobian_finite_difference(cas, params)
+
+    calc.update_model_params(params)
+    for ca, j in zip(cas, jacobians):
+        ref = analyzer._compute_jacobian_analytic(ca)
+        assert np.allclose(j, ref, rtol=1e-6, atol=1e-10)
+
+
+def test_fisher(test_data_dir):
+    calc = init(test_data_dir)
+
+    I_all = []
+    for ca in calc.get_compute_arguments():
+        dfdp = Fisher(calc)._compute_jacobian_analytic(ca)
+        I_all.append(np.dot(dfdp.T, dfdp))
+
+    for nprocs, chunk_size in [(1, 100), (1, 1), (2, 1)]:
+        analyzer = Fisher(calc, nprocs=nprocs, chunk_size=chunk_size)
+        I, I_stdev = analyzer.run(verbose=0)
+        assert np.allclose(I, np.mean(I_all, axis=0))
+        assert np.allclose(I_stdev, np.std(I_all, axis=0))
+
+
+def test_no_forces(test_data_dir):
+    calc = init(test_data_dir, use_forces=False)
+    with pytest.raises(AnalyzerError):
+        Fisher(calc).run(verbose=0)
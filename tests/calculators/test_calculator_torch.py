@@ -7,7 +7,7 @@ from torch import Tensor
 
 from kliff import nn
 from kliff.calculators import CalculatorTorch
-from kliff.dataset import Dataset
+from kliff.dataset import Configuration, Dataset
 from kliff.descriptors import SymmetryFunction
 from kliff.models import NeuralNetwork
 
@@ -160,3 +160,50 @@ def test_predictions_change(calc, loader, p0, p1):
         change.append(not Tensor.all(f0 - f1 == 0.0))
     # Use any since there might be special configurations
     assert np.any(change), "Changing parameters doesn't change predictions"
+
+
+def test_sparse_grad(test_data_dir, tmp_dir):
+    """
+    Test forces computed from sparse gradients of fingerprints are the same as those
+    computed from dense gradients.
+    """
+    descriptor = SymmetryFunction(
+        cut_name="cos", cut_dists={"Si-Si": 5.0}, hyperparams="set30", normalize=True
+    )
+    model = NeuralNetwork(descriptor)
+    model.add_layers(nn.Linear(descriptor.get_size(), 5), nn.Tanh(), nn.Linear(5, 1))
+
+    configs = [Configuration.from_file(test_data_dir / "configs" / "Si.xyz")]
+
+    forces = {}
+    for sparse_grad in [False, True]:
+        descriptor.sparse_grad = sparse_grad
+        calc = CalculatorTorch(model, gpu=False)
+        calc.create(configs, fingerprints_filename=f"fingerprints_{sparse_grad}")
+
+        forces[sparse_grad] = []
+        for batch in calc.get_compute_arguments(batch_size=1):
+            forces[sparse_grad].extend(calc.compute(batch)["forces"])
+
+    for f_dense, f_sparse in zip(forces[False], forces[True]):
+        assert f_sparse.shape == f_dense.shape
+        assert torch.allclose(f_sparse, f_dense, rtol=1e-4, atol=1e-5)
+
+
+def test_batch(calc, loader, p1):
+    """
+    Test the predictions of a batch of configurations are the same as those computed
+    one configuration at a time.
+    """
+    calc.update_model_params(p1)
+
+    batch = next(iter(loader))
+    results = calc.compute(batch)
+    for i, sample in enumerate(batch):
+        ref = calc.compute([sample])
+        assert torch.allclose(results["energy"][i], ref["energy"][0])
+        assert torch.allclose(results["forces"][i], ref["forces"][0])
+
+    packed = calc.compute_batch(batch)
+    assert packed["energy"].shape == (len(batch),)
+    assert packed["forces"].shape == (int(batch.natoms.sum()), 3)
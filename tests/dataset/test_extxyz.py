@@ -1,7 +1,11 @@
+from pathlib import Path
+
 import numpy as np
 import pytest
 
 from kliff.dataset.dataset import Configuration, Dataset
+from kliff.dataset.extxyz import iread_extxyz, read_extxyz
+from kliff.error import InputError
 
 
 @pytest.mark.parametrize(
@@ -85,3 +89,90 @@ def test_dataset(test_data_dir):
     tset = Dataset(test_data_dir / "configs/MoS2")
     configs = tset.get_configs()
     assert len(configs) == 3
+
+
+def test_multi_frame(test_data_dir, tmp_dir):
+    path = test_data_dir / "configs" / "MoS2"
+    configs = Dataset(path).get_configs()
+
+    fname = Path("MoS2_frames.xyz")
+    for i, conf in enumerate(configs):
+        conf.to_file(fname, append=i > 0)
+
+    frames = list(iread_extxyz(fname))
+    assert len(frames) == len(configs)
+
+    # first frame only
+    conf = Configuration.from_file(fname)
+    assert conf.identifier == str(fname)
+    assert np.allclose(conf.coords, configs[0].coords)
+
+    frame_configs = Dataset(fname).get_configs()
+    assert len(frame_configs) == len(configs)
+    for i, (c1, c2) in enumerate(zip(frame_configs, configs)):
+        assert c1.identifier.endswith(f"{fname}@{i}")
+        assert c1.species == c2.species
+        assert np.allclose(c1.cell, c2.cell)
+        assert np.allclose(c1.coords, c2.coords)
+        assert c1.PBC == c2.PBC
+        assert c1.energy == c2.energy
+        if c2._forces is None:
+            assert c1._forces is None
+        else:
+            assert np.allclose(c1.forces, c2.forces)
+        if c2._stress is None:
+            assert c1._stress is None
+        else:
+            assert np.allclose(c1.stress, c2.stress)
+
+
+def test_corrupted(tmp_dir):
+    fname = Path("corrupted.xyz")
+    with open(fname, "w") as f:
+        f.write('2\nLattice="1 0 0 0 1 0 0 0 1" PBC="1 1 1"\n')
+        f.write("Si 0.0 0.0 0.0\n")
+        f.write("Si 0.5 0.5\n")
+
+    with pytest.raises(InputError, match="line 4"):
+        read_extxyz(fname)
+
+
+def test_dataset_nprocs(test_data_dir):
+    path = test_data_dir / "configs" / "Si_4"
+    configs = Dataset(path).get_configs()
+    configs_par = Dataset(path, nprocs=2).get_configs()
+
+    assert len(configs_par) == len(configs)
+    for c1, c2 in zip(configs_par, configs):
+        assert c1.identifier == c2.identifier
+        assert np.allclose(c1.coords, c2.coords)
+        assert c1.energy == c2.energy
+
+
+def test_dataset_lazy(test_data_dir, tmp_dir):
+    path = test_data_dir / "configs" / "MoS2"
+    configs = Dataset(path).get_configs()
+
+    fname = Path("MoS2_frames.xyz")
+    for i, conf in enumerate(configs):
+        conf.to_file(fname, append=i > 0)
+
+    for nprocs in [1, 2]:
+        tset = Dataset(path, lazy=True, cache_size=2, nprocs=nprocs)
+        tset.add_configs(fname)
+        lazy_configs = tset.get_configs()
+        assert tset.get_num_configs() == 2 * len(configs)
+
+        ref = configs + Dataset(fname).get_configs()
+        for c1, c2 in zip(lazy_configs, ref):
+            assert c1.identifier == c2.identifier
+            assert c1.species == c2.species
+            assert np.allclose(c1.coords, c2.coords)
+            assert c1.energy == c2.energy
+
+        # cached configurations are reused, and evicted beyond cache_size
+        conf = lazy_configs[0]
+        assert lazy_configs[0] is conf
+        _ = lazy_configs[1:3]
+        assert len(lazy_configs._cache) == 2
+        assert lazy_configs[0] is not conf
@@ -206,3 +206,10 @@ def test_desc(test_data_dir):
     zeta, dzeta_dr = desc.transform(conf, grad=False)
     assert np.allclose(zeta, zeta_ref)
     assert dzeta_dr is None
+
+    # multithreaded kernels give the same results
+    desc.num_threads = 3
+    zeta_threads, dzeta_dr_threads = desc.transform(conf, grad=True)
+    assert np.array_equal(zeta_threads, zeta)
+    assert np.allclose(dzeta_dr_threads[0][:2], dzeta_dr_001)
+    assert np.allclose(dzeta_dr_threads[-1][-2:], dzeta_dr_minus_121)
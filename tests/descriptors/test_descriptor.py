@@ -1,9 +1,19 @@
 import itertools
+from pathlib import Path
 
 import numpy as np
+import pytest
 
-from kliff.dataset import Configuration
-from kliff.descriptors.descriptor import Descriptor, DescriptorError, load_fingerprints
+from kliff.dataset import Configuration, Dataset
+from kliff.descriptors.descriptor import (
+    Descriptor,
+    DescriptorError,
+    FingerprintMoments,
+    FingerprintsCache,
+    FingerprintsStore,
+    FingerprintsWriter,
+    load_fingerprints,
+)
 
 # make up some data
 num_atoms = 4
@@ -80,14 +90,12 @@ def test_descriptor(test_data_dir, tmp_dir):
     conf.identifier = str(fname)
     configs = [conf, conf]
 
-    for normalize, fit_forces, fit_stress, serial in itertools.product(
-        [False, True], [False, True], [False, True], [False, True]
+    for normalize, fit_forces, fit_stress in itertools.product(
+        [False, True], [False, True], [False, True]
     ):
         desc = ExampleDescriptor(normalize)
-        desc.generate_fingerprints(
-            configs, fit_forces, fit_stress, use_welford_method=serial
-        )
-        data = load_fingerprints("fingerprints.pkl")[0]
+        desc.generate_fingerprints(configs, fit_forces, fit_stress)
+        data = load_fingerprints("fingerprints")[0]
 
         if normalize:
             assert_mean_stdev(desc.mean, desc.stdev, _mean, _stdev)
@@ -104,10 +112,16 @@ def test_descriptor(test_data_dir, tmp_dir):
             if fit_stress:
                 assert np.allclose(data["dzetadr_stress"], _dzetadr_stress)
 
+    # the deprecated `use_welford_method` is ignored, with a warning
+    desc = ExampleDescriptor(True)
+    with pytest.warns(DeprecationWarning):
+        desc.generate_fingerprints(configs, use_welford_method=True)
+    assert np.allclose(load_fingerprints("fingerprints")[0]["zeta"], _normalized_zeta)
+
     # check when normalize is True, if mean and stdev is provided by user, it has to be
     # correct.
     for normalize, fp_path, mean_std_path in itertools.product(
-        [False, True], ["fp.pkl"], [None, "ms.pkl"]
+        [False, True], ["fp.pkl", "fp"], [None, "ms.pkl"]
     ):
         desc = ExampleDescriptor(normalize)
 
@@ -130,7 +144,7 @@ def test_descriptor(test_data_dir, tmp_dir):
             )
 
             if fp_path is None:
-                fp_path = "fingerprints.pkl"
+                fp_path = "fingerprints"
             data = load_fingerprints(fp_path)[0]
 
             if normalize:
@@ -139,3 +153,161 @@ def test_descriptor(test_data_dir, tmp_dir):
             else:
                 assert_mean_stdev(desc.mean, desc.stdev, None, None)
                 assert np.allclose(data["zeta"], _zeta)
+
+
+class CoordsDescriptor(Descriptor):
+    """Fingerprints that differ from atom to atom and from config to config."""
+
+    def __init__(self):
+        super(CoordsDescriptor, self).__init__(None, None, None, normalize=True)
+        self.ncalls = 0
+
+    def transform(self, conf, fit_forces=False, fit_stress=False):
+        self.ncalls += 1
+        coords = conf.coords
+        zeta = np.concatenate([coords, coords**2], axis=1)
+        natoms = len(zeta)
+        dzetadr_forces = np.ones((natoms, 6, natoms * 3)) if fit_forces else None
+        dzetadr_stress = np.ones((natoms, 6, 6)) if fit_stress else None
+        return zeta, dzetadr_forces, dzetadr_stress
+
+
+def test_fingerprint_moments():
+    rng = np.random.default_rng(35)
+    batches = [rng.random((n, 3)) * 10 + 100 for n in [1, 7, 4]]
+    stacked = np.concatenate(batches)
+
+    moments = FingerprintMoments()
+    for zeta in batches:
+        moments.update(zeta)
+
+    assert moments.n == len(stacked)
+    assert np.allclose(moments.mean, np.mean(stacked, axis=0))
+    assert np.allclose(moments.get_stdev(), np.std(stacked, axis=0))
+
+
+def test_generate_fingerprints_nprocs(test_data_dir, tmp_dir):
+    """
+    Test fingerprints generated in serial and multiprocessing modes are normalized by
+    the mean and stdev of the fingerprints of all atoms.
+    """
+    configs = Dataset(test_data_dir / "configs" / "Si_4").get_configs()
+
+    desc = CoordsDescriptor()
+    stacked = np.concatenate([desc.transform(conf)[0] for conf in configs])
+    mean = np.mean(stacked, axis=0)
+    stdev = np.std(stacked, axis=0)
+
+    for nprocs in [1, 2]:
+        desc = CoordsDescriptor()
+        path = desc.generate_fingerprints(
+            configs,
+            fit_forces=True,
+            fingerprints_filename=f"fp_{nprocs}",
+            nprocs=nprocs,
+        )
+        assert_mean_stdev(desc.mean, desc.stdev, mean, stdev)
+        assert not Path(f"fp_{nprocs}.raw").exists()
+
+        data = load_fingerprints(path)
+        assert len(data) == len(configs)
+        for conf, fp in zip(configs, data):
+            zeta, dzetadr_forces, _ = desc.transform(conf, fit_forces=True)
+            assert fp["configuration"].get_num_atoms() == conf.get_num_atoms()
+            assert np.allclose(fp["zeta"], (zeta - mean) / stdev, atol=1e-5)
+            assert np.allclose(
+                fp["dzetadr_forces"], dzetadr_forces / np.atleast_3d(stdev), atol=1e-5
+            )
+
+
+def test_fingerprints_cache(test_data_dir, tmp_dir):
+    """
+    Test only the configurations not in the cache are transformed, and the cache is
+    kept within its size budget.
+    """
+    configs = Dataset(test_data_dir / "configs" / "Si_4").get_configs()
+
+    desc = CoordsDescriptor()
+    ref = desc.generate_fingerprints(
+        configs, fit_forces=True, fingerprints_filename="ref"
+    )
+
+    cache = FingerprintsCache("fp_cache")
+    desc = CoordsDescriptor()
+    desc.generate_fingerprints(
+        configs[:2], fit_forces=True, fingerprints_filename="fp", cache=cache
+    )
+    assert desc.ncalls == 2
+    assert len(cache) == 2
+
+    # add configurations to the training set
+    desc = CoordsDescriptor()
+    path = desc.generate_fingerprints(
+        configs, fit_forces=True, fingerprints_filename="fp", cache=cache
+    )
+    assert desc.ncalls == 2
+    assert len(cache) == 4
+
+    for fp, fp_ref in zip(load_fingerprints(path), load_fingerprints(ref)):
+        assert np.allclose(fp["zeta"], fp_ref["zeta"])
+        assert np.allclose(fp["dzetadr_forces"], fp_ref["dzetadr_forces"])
+
+    # gradients for forces are not cached for a new descriptor setting
+    desc = CoordsDescriptor()
+    desc.dtype = np.float64
+    desc.generate_fingerprints(configs[:1], fingerprints_filename="fp", cache=cache)
+    assert desc.ncalls == 1
+
+    # reopen with a size budget of at most two files
+    size = min(f.stat().st_size for f in Path("fp_cache").glob("*.npz"))
+    cache = FingerprintsCache("fp_cache", max_size=2 * size)
+    desc = CoordsDescriptor()
+    desc.generate_fingerprints(configs, fingerprints_filename="fp", cache=cache)
+    assert len(cache) <= 2
+    assert sum(f.stat().st_size for f in Path("fp_cache").glob("*.npz")) <= 2 * size
+
+
+def test_fingerprints_store(tmp_dir):
+    rng = np.random.default_rng(35)
+    size = 3
+
+    examples = []
+    for natoms in [2, 5, 1]:
+        conf = Configuration(
+            cell=np.eye(3),
+            species=["Si"] * natoms,
+            coords=rng.random((natoms, 3)),
+            PBC=[True, True, True],
+            energy=float(natoms),
+            forces=rng.random((natoms, 3)),
+            stress=list(rng.random(6)),
+        )
+        examples.append(
+            {
+                "configuration": conf,
+                "zeta": rng.random((natoms, size)),
+                "energy": np.asarray(conf.energy),
+                "dzetadr_forces": rng.random((natoms, size, 3 * natoms)),
+                "forces": conf.forces,
+                "dzetadr_stress": rng.random((natoms, size, 6)),
+                "stress": np.asarray(conf.stress),
+                "volume": np.asarray(conf.get_volume()),
+            }
+        )
+
+    with FingerprintsWriter("fp_store", np.float64, True, True) as writer:
+        for example in examples:
+            writer.append(example)
+
+    store = load_fingerprints("fp_store")
+    assert isinstance(store, FingerprintsStore)
+    assert len(store) == len(examples)
+
+    for data, example in zip(store, examples):
+        assert data["configuration"].get_num_atoms() == len(example["zeta"])
+        for key, value in example.items():
+            if key != "configuration":
+                assert data[key].shape == value.shape
+                assert np.allclose(data[key], value)
+
+    assert np.allclose(store[-1]["zeta"], examples[-1]["zeta"])
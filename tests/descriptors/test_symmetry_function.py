@@ -5,6 +5,7 @@ import numpy as np
 
 from kliff.dataset import Configuration
 from kliff.descriptors import SymmetryFunction
+from kliff.descriptors.descriptor import SparseGradient
 
 zeta_ref = [
     [
@@ -305,3 +306,44 @@ def test_desc(test_data_dir):
             assert np.allclose(dzetadr_forces[0], dzetadr_forces_ref)
         if fit_stress:
             assert np.allclose(dzetadr_stress[0], dzetadr_stress_ref)
+
+
+def test_desc_sparse_grad(test_data_dir):
+    config = Configuration.from_file(test_data_dir / "configs" / "Si.xyz")
+    natoms = config.get_num_atoms()
+
+    desc = get_descriptor()
+    zeta, dzetadr_forces, _ = desc.transform(config, fit_forces=True)
+
+    desc.sparse_grad = True
+    zeta_sparse, sparse, _ = desc.transform(config, fit_forces=True)
+    assert isinstance(sparse, SparseGradient)
+    assert np.allclose(zeta_sparse, zeta)
+
+    # scatter sparse blocks back to the dense layout
+    dense = np.zeros((natoms, desc.get_size(), natoms, 3))
+    for value, i, j in zip(sparse.value, sparse.atom, sparse.neigh):
+        dense[i, :, j, :] += value
+    assert np.allclose(dense.reshape(dzetadr_forces.shape), dzetadr_forces)
+
+
+def test_desc_num_threads(test_data_dir):
+    config = Configuration.from_file(test_data_dir / "configs" / "Si.xyz")
+    desc = get_descriptor()
+
+    for sparse_grad in [False, True]:
+        desc.sparse_grad = sparse_grad
+        desc.num_threads = 1
+        ref = desc.transform(config, fit_forces=True, fit_stress=True)
+
+        # multithreaded kernel gives the same results
+        desc.num_threads = 3
+        rslt = desc.transform(config, fit_forces=True, fit_stress=True)
+
+        assert np.array_equal(rslt[0], ref[0])
+        assert np.array_equal(rslt[2], ref[2])
+        if sparse_grad:
+            for x, y in zip(rslt[1], ref[1]):
+                assert np.array_equal(x, y)
+        else:
+            assert np.array_equal(rslt[1], ref[1])
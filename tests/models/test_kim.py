@@ -133,6 +133,23 @@ def test_get_update_params():
     assert kim_params["A"][0] == A + 0.1
 
 
+def test_update_params_unchanged():
+    modelname = "SW_StillingerWeber_1985_Si__MO_405512056662_006"
+    model = KIMModel(modelname)
+    model.set_opt_params(sigma=[["default"]], A=[["default"]])
+
+    x1 = [i + 0.1 for i in model.get_opt_params()]
+    model.update_model_params(x1)
+
+    # only the changed components are pushed to the kim model
+    _, sigma, p_idx, c_idx = model.get_opt_param_name_value_and_indices(0)
+    assert not model._push_params([(p_idx, c_idx, sigma)])
+    assert model._push_params([(p_idx, c_idx, sigma + 0.1)])
+
+    kim_params = model.get_kim_model_params()
+    assert kim_params["sigma"][0] == sigma + 0.1
+
+
 def test_params_transform():
     modelname = "SW_StillingerWeber_1985_Si__MO_405512056662_006"
     model = KIMModel(
@@ -4,8 +4,11 @@ import warnings
 import numpy as np
 import pytest
 
+from kliff.calculators import Calculator
 from kliff.dataset import Configuration
 from kliff.models.lennard_jones import LennardJones, LJComputeArguments
+from kliff.models.parameter_transform import LogParameterTransform
+from kliff.neighbor import NeighborList, assemble_forces, assemble_stress
 
 
 def write_tmp_params(fname):
@@ -140,3 +143,104 @@ def test_lj(test_data_dir):
     energy_forces_stress(model, config, True, False, False)
     # energy_forces_stress(model, config, True, True, False)
     # energy_forces_stress(model, config, True, False, True)
+
+
+def _energy_forces_stress_loop(ca, params):
+    """
+    Reference implementation looping over atoms and neighbors one pair at a time,
+    using a full neighbor list.
+    """
+    neigh = NeighborList(ca.conf, ca.neigh.infl_dist)
+    coords = neigh.coords
+    forces = np.zeros_like(coords)
+    energy = 0
+    for i, si in enumerate(ca.conf.species):
+        neighlist, _, neigh_species = neigh.get_neigh(i)
+        for j, sj in zip(neighlist, neigh_species):
+            idx = ca.specie_pairs_to_param_index[(si, sj)]
+            rij = coords[j] - coords[i]
+            r = np.linalg.norm(rij)
+            phi, dphi = ca.calc_phi_dphi(
+                params["epsilon"][idx], params["sigma"][idx], r, params["cutoff"][idx]
+            )
+            energy += 0.5 * phi
+            pair = 0.5 * dphi / r * rij
+            forces[i] += pair
+            forces[j] -= pair
+
+    natoms = ca.conf.get_num_atoms()
+    stress = assemble_stress(coords, forces, ca.conf.get_volume())
+    forces = assemble_forces(forces, natoms, neigh.padding_image)
+
+    return energy, forces, stress
+
+
+def test_lj_vectorized(test_data_dir):
+    model = LennardJones(species=["Mo", "S"])
+    model.set_opt_params(
+        sigma=[[1.1], [1.2], [1.3]],
+        epsilon=[[2.1], [2.2], [2.3]],
+        cutoff=[[4.0, "fix"], [4.0, "fix"], [4.0, "fix"]],
+    )
+    params = model.get_model_params()
+
+    config = Configuration.from_file(
+        test_data_dir / "configs/MoS2/MoS2_energy_forces_stress.xyz"
+    )
+    ca = LJComputeArguments(
+        config,
+        supported_species=model.supported_species,
+        influence_distance=model.get_influence_distance(),
+        compute_energy=True,
+        compute_forces=True,
+        compute_stress=True,
+    )
+    ca.compute(params)
+
+    energy, forces, stress = _energy_forces_stress_loop(ca, params)
+    assert ca.get_energy() == pytest.approx(energy, 1e-10)
+    assert np.allclose(ca.get_forces(), forces)
+    assert np.allclose(ca.get_stress(), stress)
+
+
+def test_lj_jacobian(test_data_dir):
+    """
+    Test the analytic Jacobian w.r.t. the optimizing parameters (with `sigma` in log
+    space) against finite differences.
+    """
+    model = LennardJones(
+        species=["Mo", "S"], params_transform=LogParameterTransform(["sigma"])
+    )
+    model.set_opt_params(
+        sigma=[[np.log(1.1)], [np.log(1.2)], [np.log(1.3)]],
+        epsilon=[[2.1], [2.2], [2.3]],
+        cutoff=[[4.0, "fix"], [4.0, "fix"], [4.0, "fix"]],
+    )
+
+    config = Configuration.from_file(
+        test_data_dir / "configs/MoS2/MoS2_energy_forces_stress.xyz"
+    )
+    calc = Calculator(model)
+    ca = calc.create([config], use_energy=True, use_forces=True, use_stress=True)[0]
+    assert calc.has_jacobian()
+
+    x0 = calc.get_opt_params()
+    calc.update_model_params(x0)
+    jacobian = calc.compute_jacobian(ca)
+
+    h = 1e-6
+    ref = np.zeros_like(jacobian)
+    for k in range(len(x0)):
+        x = x0.copy()
+        x[k] += h
+        calc.update_model_params(x)
+        calc.compute(ca)
+        plus = calc.get_prediction(ca)
+        x[k] -= 2 * h
+        calc.update_model_params(x)
+        calc.compute(ca)
+        minus = calc.get_prediction(ca)
+        ref[:, k] = (plus - minus) / (2 * h)
+
+    assert jacobian.shape == (1 + 3 * config.get_num_atoms() + 6, len(x0))
+    assert np.allclose(jacobian, ref, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,307 @@
+import numpy as np
+import pytest
+import torch
+
+from kliff import nn
+from kliff.calculators import Calculator, CalculatorTorch
+from kliff.dataset import Dataset
+from kliff.dataset.weight import MagnitudeInverseWeight, Weight
+from kliff.descriptors import SymmetryFunction
+from kliff.loss import (
+    Loss,
+    energy_forces_residual,
+    energy_residual,
+    forces_residual,
+    mpi4py_avail,
+)
+from kliff.models import LennardJones, NeuralNetwork
+
+
+def init(path, nprocs=1, **kwargs):
+    model = LennardJones(species=["Si"])
+    model.set_opt_params(sigma=[[2.0]], epsilon=[[1.5]])
+
+    tset = Dataset(path / "configs" / "Si_4")
+    configs = tset.get_configs()
+
+    calc = Calculator(model)
+    calc.create(configs, use_energy=True, use_forces=True)
+
+    return Loss(calc, nprocs=nprocs, **kwargs)
+
+
+def test_residual_nprocs(test_data_dir):
+    loss_serial = init(test_data_dir, nprocs=1)
+    loss_parallel = init(test_data_dir, nprocs=2)
+    loss_rebalance = init(test_data_dir, nprocs=2, rebalance_after=1)
+
+    for x in [[2.0, 1.5], [2.1, 1.4], [1.9, 1.6]]:
+        ref = loss_serial._get_residual(np.asarray(x))
+        residual = loss_parallel._get_residual(np.asarray(x))
+        assert np.allclose(residual, ref)
+        residual = loss_rebalance._get_residual(np.asarray(x))
+        assert np.allclose(residual, ref)
+
+
+def test_residual_plan(test_data_dir):
+    """
+    Test the residual computed with the precomputed layout of the built-in residual
+    functions is the same as that of calling the residual function for each
+    configuration.
+    """
+
+    def custom_residual(identifier, natoms, weight, prediction, reference, data):
+        return energy_forces_residual(
+            identifier, natoms, weight, prediction, reference, data
+        )
+
+    model = LennardJones(species=["Si"])
+    model.set_opt_params(sigma=[[2.0]], epsilon=[[1.5]])
+
+    weight = MagnitudeInverseWeight(
+        config_weight=0.5,
+        weight_params={
+            "energy_weight_params": [1.0, 0.1],
+            "forces_weight_params": [1.0, 0.2],
+        },
+    )
+    tset = Dataset(test_data_dir / "configs" / "Si_4", weight=weight)
+
+    calc = Calculator(model)
+    calc.create(tset.get_configs(), use_energy=True, use_forces=True)
+
+    loss = Loss(calc)
+    loss_custom = Loss(calc, residual_fn=custom_residual)
+    assert loss._get_residual_plan() is not None
+    assert loss_custom._get_residual_plan() is None
+
+    for x in [[2.0, 1.5], [2.1, 1.4]]:
+        ref = loss_custom._get_residual(np.asarray(x))
+        residual = loss._get_residual(np.asarray(x))
+        assert np.allclose(residual, ref)
+
+
+def test_loss_batch(test_data_dir):
+    """
+    Test the loss of a batch of parameter sets is the same as the loss of each of them,
+    in serial and multiprocessing modes.
+    """
+    loss_serial = init(test_data_dir, nprocs=1)
+    loss_parallel = init(test_data_dir, nprocs=2)
+
+    X = np.asarray([[2.0, 1.5], [2.1, 1.4], [1.9, 1.6]])
+    ref = [loss_serial._get_loss(x) for x in X]
+
+    x0 = np.asarray([2.2, 1.3])
+
+    # serial mode: each parameter set is published once, and the parameters are
+    # restored
+    calc = loss_serial.calculator
+    calc.update_model_params(x0)
+
+    nupdates = [0]
+    update_model_params = calc.update_model_params
+
+    def counted_update_model_params(x):
+        nupdates[0] += 1
+        return update_model_params(x)
+
+    calc.update_model_params = counted_update_model_params
+    loss_serial._residual_cache.clear()
+
+    assert np.allclose(loss_serial.get_loss_batch(X), ref)
+    assert nupdates[0] == len(X) + 1
+    assert np.array_equal(calc.get_opt_params(), x0)
+
+    # multiprocessing mode: the batch is computed in a single round trip to the
+    # workers, and the parameters are restored
+    loss_parallel.calculator.update_model_params(x0)
+    pool = loss_parallel._get_pool()
+
+    dispatches = []
+    pool_map = pool.map
+    pool_map_shard = pool.map_shard
+    pool.map = lambda p=None: dispatches.append("map") or pool_map(p)
+    pool.map_shard = lambda p=None: dispatches.append("shard") or pool_map_shard(p)
+
+    assert np.allclose(loss_parallel.get_loss_batch(X), ref)
+    assert dispatches == ["shard"]
+    assert np.array_equal(loss_parallel.calculator.get_opt_params(), x0)
+
+
+def test_nn_loss_vectorized(test_data_dir, tmp_dir):
+    """
+    Test the vectorized loss of a batch is the same as the one computed by calling the
+    residual function for each configuration.
+    """
+    descriptor = SymmetryFunction(
+        cut_name="cos", cut_dists={"Si-Si": 5.0}, hyperparams="set30", normalize=True
+    )
+    model = NeuralNetwork(descriptor)
+    model.add_layers(nn.Linear(descriptor.get_size(), 5), nn.Tanh(), nn.Linear(5, 1))
+
+    tset = Dataset(test_data_dir / "configs" / "Si_4")
+    configs = tset.get_configs()
+    for i, conf in enumerate(configs):
+        conf.weight = Weight(
+            config_weight=1.0 + i, energy_weight=0.5, forces_weight=2.0 + i
+        )
+
+    for sparse_grad in [False, True]:
+        descriptor.sparse_grad = sparse_grad
+        calc = CalculatorTorch(model, gpu=False)
+        calc.create(configs, fingerprints_filename=f"fingerprints_{sparse_grad}")
+        batch = next(iter(calc.get_compute_arguments(batch_size=len(configs))))
+
+        for residual_fn in [None, energy_residual, forces_residual]:
+            calc.use_energy = residual_fn is not forces_residual
+            calc.use_forces = residual_fn is not energy_residual
+            loss = Loss(calc, residual_fn=residual_fn)
+            assert loss._use_vectorized_loss()
+
+            params = list(model.parameters())
+            ref = loss._get_loss_batch_per_config(batch)
+            ref_grad = torch.autograd.grad(ref, params, allow_unused=True)
+            vectorized = loss._get_loss_batch_vectorized(batch)
+            grad = torch.autograd.grad(vectorized, params, allow_unused=True)
+
+            assert torch.allclose(vectorized, ref)
+            for g, ref_g in zip(grad, ref_grad):
+                # parameters not affecting the loss, e.g. last bias for forces only
+                if ref_g is None:
+                    assert g is None
+                else:
+                    assert torch.allclose(g, ref_g)
+
+
+def test_jacobian(test_data_dir):
+    """
+    Test the analytic Jacobian of the residual against finite differences, in serial
+    and multiprocessing modes.
+    """
+    loss_serial = init(test_data_dir, nprocs=1)
+    loss_parallel = init(test_data_dir, nprocs=2)
+    assert loss_serial._has_jacobian()
+
+    x0 = np.asarray([2.1, 1.4])
+    jacobian = loss_serial._get_jacobian(x0)
+
+    h = 1e-6
+    ref = np.zeros_like(jacobian)
+    for k in range(len(x0)):
+        x = x0.copy()
+        x[k] += h
+        plus = loss_serial._get_residual(x)
+        x[k] -= 2 * h
+        minus = loss_serial._get_residual(x)
+        ref[:, k] = (plus - minus) / (2 * h)
+
+    assert np.allclose(jacobian, ref, rtol=1e-5, atol=1e-8)
+    assert np.allclose(loss_parallel._get_jacobian(x0), jacobian)
+
+
+@pytest.mark.skipif(not mpi4py_avail, reason="mpi4py is not found")
+def test_MPI(test_data_dir):
+    """
+    Test the residual, Jacobian, and loss in MPI mode are the same as in serial mode,
+    with a single MPI process (i.e. not run with `mpiexec`).
+    """
+    loss_serial = init(test_data_dir, nprocs=1)
+    loss_MPI = init(test_data_dir, nprocs=1)
+
+    for x in [[2.0, 1.5], [2.1, 1.4]]:
+        x = np.asarray(x)
+        residual = loss_MPI._get_residual_MPI(x)
+        jacobian = loss_MPI._get_jacobian_MPI(x)
+        loss_MPI._residual_cache.clear()
+        loss = loss_MPI._get_loss_MPI(x)
+
+        assert np.allclose(residual, loss_serial._get_residual(x))
+        assert np.allclose(jacobian, loss_serial._get_jacobian(x))
+        assert np.allclose(loss, loss_serial._get_loss(x))
+
+
+def test_residual_cache(test_data_dir):
+    """
+    Test the residual is not recomputed for parameters recently evaluated, and the
+    cache is cleared if the compute arguments change.
+    """
+    loss = init(test_data_dir, cache_size=2)
+    calc = loss.calculator
+
+    ncalls = [0]
+    compute = calc.compute
+
+    def counted_compute(ca):
+        ncalls[0] += 1
+        return compute(ca)
+
+    calc.compute = counted_compute
+    ncas = len(calc.get_compute_arguments())
+
+    x1 = np.asarray([2.0, 1.5])
+    x2 = np.asarray([2.1, 1.4])
+    x3 = np.asarray([1.9, 1.6])
+
+    ref = loss._get_residual(x1)
+    loss._get_residual(x2)
+    assert ncalls[0] == 2 * ncas
+
+    residual = loss._get_residual(x1.copy())
+    assert ncalls[0] == 2 * ncas
+    assert np.array_equal(residual, ref)
+    assert np.array_equal(calc.get_opt_params(), x1)
+
+    # x2 is the least recently used one, and is discarded
+    loss._get_residual(x3)
+    loss._get_residual(x2)
+    assert ncalls[0] == 4 * ncas
+
+    # new compute arguments
+    configs = [ca.conf for ca in calc.get_compute_arguments()]
+    calc.create(configs, use_energy=True, use_forces=True)
+    loss._get_residual(x2)
+    assert ncalls[0] == 5 * ncas
+
+
+def test_residual_cache_fixed_params(test_data_dir):
+    """
+    Test the cached residual is not used after a parameter not optimized changes.
+    """
+    model = LennardJones(species=["Si"])
+    model.set_opt_params(sigma=[[2.0]])
+    calc = Calculator(model)
+    calc.create(Dataset(test_data_dir / "configs" / "Si_4").get_configs())
+    loss = Loss(calc)
+
+    x = np.asarray([2.1])
+    before = loss._get_loss(x)
+
+    model.set_one_opt_param("epsilon", [[3.0, "fix"]])
+    after = loss._get_loss(x)
+    assert after != before
+
+    loss._residual_cache.clear()
+    assert after == loss._get_loss(x)
+
+
+def test_pool_fixed_params(test_data_dir):
+    """
+    Test the workers of the pool use the parameters not optimized as changed between
+    two evaluations.
+    """
+    losses = []
+    for nprocs in [1, 2]:
+        model = LennardJones(species=["Si"])
+        model.set_opt_params(sigma=[[2.0]])
+        calc = Calculator(model)
+        calc.create(Dataset(test_data_dir / "configs" / "Si_4").get_configs())
+        loss = Loss(calc, nprocs=nprocs, cache_size=0)
+
+        x = np.asarray([2.1])
+        before = loss._get_loss(x)
+        model.set_one_opt_param("epsilon", [[3.0, "fix"]])
+        losses.append((before, loss._get_loss(x)))
+
+    assert np.allclose(losses[1], losses[0])
+    assert losses[1][1] != losses[1][0]
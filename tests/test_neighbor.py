@@ -1,7 +1,14 @@
 import numpy as np
+import pytest
 
 from kliff.dataset.dataset import Configuration
-from kliff.neighbor import NeighborList
+from kliff.neighbor import (
+    NeighborList,
+    NeighborListCache,
+    get_default_cache,
+    set_default_cache,
+)
+from kliff.neighbor.neighbor import NeighborListError
 
 target_coords = np.asarray(
     [
@@ -47,6 +54,10 @@ def test_neigh(test_data_dir):
     assert np.allclose(coords, target_coords)
     assert np.array_equal(species, target_species)
 
+    # copies, which do not share the memory of the (possibly cached) neighbor list
+    species[0] = "C"
+    assert neigh.species[0] == "O"
+
     # contributing
     for i in range(conf.get_num_atoms()):
         nei_indices, nei_coords, nei_species = neigh.get_neigh(i)
@@ -98,3 +109,184 @@ def test_1D():
         assert np.allclose(neighbors, [nei_idx])
         assert np.allclose(neighbor_xyz, [coords[nei_idx]])
         assert neighbor_species == [species[nei_idx]]
+
+
+def test_csr(test_data_dir):
+    conf = Configuration.from_file(
+        test_data_dir / "configs" / "MoS2" / "MoS2_energy.xyz"
+    )
+    n = conf.get_num_atoms()
+
+    for padding_need_neigh in [False, True]:
+        neigh = NeighborList(conf, infl_dist=5.0, padding_need_neigh=padding_need_neigh)
+        N = len(neigh.coords) if padding_need_neigh else n
+
+        numneigh, neighstart, neighlist = neigh.get_csr(padding_need_neigh)
+        assert len(numneigh) == N
+        assert len(neighstart) == N + 1
+        assert not neighlist.flags.writeable
+
+        for i in range(N):
+            indices, _, _ = neigh.get_neigh(i)
+            assert numneigh[i] == len(indices)
+            assert np.array_equal(neighlist[neighstart[i] : neighstart[i + 1]], indices)
+
+        # species code looked up for each unique species
+        mapping = {"Mo": 0, "S": 1}
+        code = neigh.get_species_code(mapping)
+        assert np.array_equal(code, [mapping[s] for s in neigh.species])
+
+
+def _pairs(neigh, N):
+    """Set of (i, j) pairs of the first N atoms, with i < j."""
+    rslt = set()
+    for i in range(N):
+        indices, _, _ = neigh.get_neigh(i)
+        rslt.update((min(i, j), max(i, j)) for j in indices)
+    return rslt
+
+
+def test_half_list(test_data_dir):
+    conf = Configuration.from_file(
+        test_data_dir / "configs" / "MoS2" / "MoS2_energy.xyz"
+    )
+    n = conf.get_num_atoms()
+
+    for padding_need_neigh in [False, True]:
+        full = NeighborList(conf, 5.0, padding_need_neigh=padding_need_neigh)
+        N = len(full.coords) if padding_need_neigh else n
+        nfull = full.neighstart[N]
+
+        # built directly, and from the cache
+        cache = NeighborListCache()
+        halves = [
+            NeighborList(conf, 5.0, padding_need_neigh, half_list=True, cache=cache)
+        ]
+        assert halves[0].neigh is not None
+        halves.append(
+            NeighborList(conf, 5.0, padding_need_neigh, half_list=True, cache=cache)
+        )
+        assert halves[1].neigh is None
+        for num_threads in [1, 3]:
+            halves.append(
+                NeighborList(
+                    conf,
+                    5.0,
+                    padding_need_neigh,
+                    half_list=True,
+                    num_threads=num_threads,
+                )
+            )
+
+        for half in halves:
+            assert np.array_equal(half.neighlist, halves[0].neighlist)
+            assert _pairs(half, N) == _pairs(full, N)
+
+            # each pair of atoms with neighbors is stored once
+            npd = np.sum(full.neighlist[:nfull] >= N)
+            assert half.neighstart[N] == (nfull - npd) // 2 + npd
+
+        # threads give the same full list
+        threaded = NeighborList(conf, 5.0, padding_need_neigh, num_threads=4)
+        assert np.array_equal(threaded.numneigh, full.numneigh)
+        assert np.array_equal(threaded.neighlist, full.neighlist)
+
+
+def test_shifts(test_data_dir):
+    conf = Configuration.from_file(
+        test_data_dir / "configs" / "MoS2" / "MoS2_energy.xyz"
+    )
+    n = conf.get_num_atoms()
+
+    for half_list in [False, True]:
+        ref = NeighborList(conf, 5.0, half_list=half_list)
+        neigh = NeighborList(conf, 5.0, half_list=half_list, use_shifts=True)
+
+        # no padding atoms
+        assert len(neigh.coords) == n
+        assert len(neigh.padding_coords) == 0
+
+        numneigh, _, neighlist = neigh.get_csr()
+        ref_numneigh, _, ref_neighlist = ref.get_csr()
+        assert np.array_equal(numneigh, ref_numneigh)
+        assert np.array_equal(neighlist, ref.image[ref_neighlist])
+        assert neigh.get_shifts().shape == (len(neighlist), 3)
+
+        for i in range(n):
+            _, coords, species = neigh.get_neigh(i)
+            _, ref_coords, ref_species = ref.get_neigh(i)
+            assert np.allclose(coords, ref_coords)
+            assert np.array_equal(species, ref_species)
+
+    with pytest.raises(NeighborListError):
+        NeighborList(conf, 5.0, padding_need_neigh=True, use_shifts=True)
+    with pytest.raises(NeighborListError):
+        ref.get_shifts()
+
+
+def _neigh_coords(neigh, n):
+    """Sorted coords of the neighbors of each contributing atom."""
+    rslt = []
+    for i in range(n):
+        _, nei_coords, _ = neigh.get_neigh(i)
+        rslt.append(nei_coords[np.lexsort(nei_coords.T)])
+    return rslt
+
+
+def test_cache(test_data_dir, tmp_dir):
+    conf = Configuration.from_file(test_data_dir / "configs" / "Si.xyz")
+    n = conf.get_num_atoms()
+
+    cache = NeighborListCache(path="neigh_cache")
+    ref = NeighborList(conf, infl_dist=5.0, cache=cache)
+    assert ref.neigh is not None
+    assert len(cache) == 1
+
+    # same configuration, read again
+    conf2 = Configuration.from_file(test_data_dir / "configs" / "Si.xyz")
+    neigh = NeighborList(conf2, infl_dist=5.0, cache=cache)
+    assert neigh.neigh is None
+    assert np.array_equal(neigh.coords, ref.coords)
+    for x, y in zip(
+        neigh.get_numneigh_and_neighlist_1D(), ref.get_numneigh_and_neighlist_1D()
+    ):
+        assert np.array_equal(x, y)
+
+    # smaller cutoff, filtered from the cached list
+    fresh = NeighborList(conf, infl_dist=3.0, cache=NeighborListCache(maxsize=0))
+    neigh = NeighborList(conf, infl_dist=3.0, cache=cache)
+    assert neigh.neigh is None
+    for x, y in zip(_neigh_coords(neigh, n), _neigh_coords(fresh, n)):
+        assert np.array_equal(x, y)
+
+    # not cached by default, unless a default cache is set
+    assert get_default_cache() is None
+    assert NeighborList(conf, infl_dist=5.0).neigh is not None
+    set_default_cache(cache)
+    try:
+        assert NeighborList(conf, infl_dist=5.0).neigh is None
+    finally:
+        set_default_cache(None)
+
+    # persisted to disk
+    cache2 = NeighborListCache(path="neigh_cache")
+    neigh = NeighborList(conf, infl_dist=5.0, cache=cache2)
+    assert neigh.neigh is None
+    assert np.array_equal(neigh.neighlist, ref.neighlist)
+
+    # half lists are cached separately, and filtered from a cached half list
+    neigh = NeighborList(conf, infl_dist=5.0, half_list=True, cache=cache)
+    assert neigh.neigh is not None
+    assert len(cache) == 2
+    fresh = NeighborList(
+        conf, infl_dist=3.0, half_list=True, cache=NeighborListCache(maxsize=0)
+    )
+    neigh = NeighborList(conf, infl_dist=3.0, half_list=True, cache=cache)
+    assert neigh.neigh is None
+    assert _pairs(neigh, n) == _pairs(fresh, n)
+
+    # a modified configuration is not matched
+    conf.coords[0, 0] += 0.1
+    neigh = NeighborList(conf, infl_dist=5.0, cache=cache)
+    assert neigh.neigh is not None
+    assert len(cache) == 3
@@ -1,6 +1,6 @@
 import numpy as np
 
-from kliff.parallel import parmap1, parmap2
+from kliff.parallel import WorkerPool, lpt_partition, parmap1, parmap2
 
 
 def func(x, y, z=1):
@@ -36,3 +36,50 @@ def test_parmap():
 
     results = parmap2(func, zip(X, Y), 1, nprocs=2, tuple_X=True)
     assert np.array_equal(results, XpYp1)
+
+    results = parmap2(func, X, 1, nprocs=2, costs=[3, 1, 2])
+    assert np.array_equal(results, Xp2)
+
+
+def test_worker_pool():
+    X = range(3)
+    Y = range(3)
+    state = {"p": 0}
+
+    def update(p):
+        state["p"] = p
+
+    def func_state(x, y):
+        return x + y + state["p"]
+
+    with WorkerPool(func_state, X, 1, update=update, nprocs=2) as pool:
+        for p in range(3):
+            results = pool.map(p)
+            assert np.array_equal(results, [x + 1 + p for x in X])
+
+    with WorkerPool(func, zip(X, Y), tuple_X=True, nprocs=2) as pool:
+        results = pool.map()
+        assert np.array_equal(results, [x + y + 1 for x, y in zip(X, Y)])
+        assert len(pool.timings) == len(X)
+
+    with WorkerPool(func, X, 1, nprocs=2, costs=[3, 1, 2]) as pool:
+        results = pool.map()
+        assert np.array_equal(results, [x + 2 for x in X])
+
+    def shard_func(xs, y):
+        return sum(x + y + state["p"] for x, in xs)
+
+    with WorkerPool(
+        func_state, X, 1, update=update, shard_f=shard_func, nprocs=2
+    ) as pool:
+        results = pool.map_shard(2)
+        assert len(results) == 2
+        assert sum(results) == sum(x + 1 + 2 for x in X)
+
+
+def test_lpt_partition():
+    costs = [1, 8, 2, 3, 2, 4]
+    groups = lpt_partition(costs, 3)
+
+    assert sorted(i for g in groups for i in g) == list(range(len(costs)))
+    assert [sum(costs[i] for i in g) for g in groups] == [8, 6, 6]
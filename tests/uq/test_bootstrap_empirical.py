@@ -186,3 +186,18 @@ def test_multi_calc_cas_generator():
     assert (
         len(bootstrap_cas[0][0]) + len(bootstrap_cas[0][1]) == ncas_energy + ncas_forces
     ), "For each sample, generator should generate the same number of cas in total as the original"
+
+
+def test_run_nprocs():
+    """Test if training the bootstrap samples in parallel gives the same samples as in
+    serial mode.
+    """
+    BS_2calc.reset()
+    BS_2calc.generate_bootstrap_compute_arguments(nsamples)
+    serial = BS_2calc.run(min_kwargs=min_kwargs).copy()
+
+    BS_2calc.samples = np.empty((0, serial.shape[1]))
+    parallel = BS_2calc.run(min_kwargs=min_kwargs, nprocs=2)
+    assert np.allclose(
+        parallel, serial
+    ), "Parallel bootstrap samples are different from the serial ones"
@@ -7,6 +7,7 @@ from pathlib import Path
 
 import numpy as np
 import pytest
+import torch
 
 from kliff import nn
 from kliff.calculators import CalculatorTorch
@@ -146,3 +147,36 @@ def test_reset():
     # Check reset bootstrap samples
     assert BS._nsamples_prepared == 0, "Reset bootstrap cas failed"
     assert BS._nsamples_done == 0, "Reset ensembles failed"
+
+
+def test_run_ensemble(tmp_dir):
+    """Test if training the bootstrap samples as an ensemble gives the same parameters
+    as training them one at a time from the same initial parameters.
+    """
+    calc_ensemble = CalculatorTorch(model)
+    calc_ensemble.create(configs, use_energy=True, use_forces=True)
+    loss_ensemble = Loss(calc_ensemble)
+    BS_ensemble = Bootstrap(loss_ensemble, orig_state_filename="orig_model.pkl")
+    BS_ensemble.generate_bootstrap_compute_arguments(3)
+    samples = [BS_ensemble.bootstrap_compute_arguments[ii] for ii in range(3)]
+
+    torch.manual_seed(seed)
+    ensemble = BS_ensemble._train_ensemble(samples, **min_kwargs)
+
+    # the replicas are initialized one after another before training
+    torch.manual_seed(seed)
+    initial_params = []
+    for _ in samples:
+        BS_ensemble._reset_parameters(model)
+        initial_params.append(calc_ensemble.get_opt_params())
+
+    for params, fingerprints, ensemble_params in zip(initial_params, samples, ensemble):
+        calc_ensemble.update_model_params(params)
+        calc_ensemble.set_fingerprints(fingerprints)
+        loss_ensemble.minimize(**min_kwargs)
+        assert np.allclose(
+            ensemble_params, calc_ensemble.get_opt_params(), rtol=1e-4, atol=1e-5
+        )
+
+    BS_ensemble.run(min_kwargs=min_kwargs, ensemble_size=2)
+    assert BS_ensemble.samples.shape == (3, calc_ensemble.get_num_opt_params())
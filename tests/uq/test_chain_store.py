@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from kliff.uq.chain_store import ChainStore, ChainStoreError, run_mcmc_stream
+
+try:
+    import emcee
+
+    emcee_avail = True
+except ImportError:
+    emcee_avail = False
+
+seed = 1717
+nwalkers = 4
+ndim = 2
+
+
+def log_prob_fn(x):
+    return -0.5 * np.sum(x**2)
+
+
+def test_append_checkpoint(tmp_dir):
+    """Test the steps appended after the last checkpoint are discarded when the store
+    is opened again.
+    """
+    rstate = np.random.RandomState(seed)
+    samples = rstate.normal(size=(10, nwalkers, ndim))
+    log_prob = rstate.normal(size=(10, nwalkers))
+
+    store = ChainStore("store", shape=(nwalkers, ndim))
+    store.append(samples[:6], log_prob[:6])
+    store.checkpoint({"step": 6})
+    store.append(samples[6:], log_prob[6:])
+    assert np.array_equal(store.get_chain(), samples)
+    store.close()
+
+    with ChainStore("store") as store:
+        assert store.nsteps == 6
+        assert store.load_checkpoint()["state"] == {"step": 6}
+        assert np.array_equal(store.get_chain(), samples[:6])
+        assert np.array_equal(store.get_log_prob(discard=2, thin=2), log_prob[2:6:2])
+
+        chunks = list(store.iter_chunks(chunk_size=4))
+        assert [len(c) for c, _ in chunks] == [4, 2]
+
+    with pytest.raises(ChainStoreError):
+        ChainStore("store", shape=(nwalkers, ndim + 1))
+
+
+@pytest.mark.skipif(not emcee_avail, reason="emcee is not found")
+def test_run_mcmc_stream(tmp_dir):
+    """Test a sampling stopped and resumed from a checkpoint gives the same chains as
+    an uninterrupted sampling.
+    """
+    p0 = np.random.RandomState(seed).normal(size=(nwalkers, ndim))
+    nsteps = 50
+
+    def new_sampler():
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, log_prob_fn)
+        sampler.random_state = np.random.RandomState(seed).get_state()
+        return sampler
+
+    sampler = new_sampler()
+    sampler.run_mcmc(p0, nsteps)
+    ref = sampler.get_chain()
+
+    # stop after the second checkpoint, and resume with a new sampler
+    def callback(store, samples, log_prob):
+        return store.nsteps >= 20
+
+    store = ChainStore("store", shape=(nwalkers, ndim))
+    run_mcmc_stream(
+        new_sampler(), store, nsteps, p0, checkpoint_every=10, callback=callback
+    )
+    assert store.nsteps == 20
+    store.close()
+
+    store = ChainStore("store")
+    run_mcmc_stream(new_sampler(), store, nsteps, checkpoint_every=10)
+    assert store.nsteps == nsteps
+    assert np.allclose(store.get_chain(), ref)
+    store.close()
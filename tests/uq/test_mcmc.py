@@ -145,6 +145,25 @@ def test_dimensionality2():
     ), "Dimensionality from the emcee wrapper is not right"
 
 
+@pytest.mark.skipif(not emcee_avail, reason="emcee is not found")
+def test_vectorize():
+    """Test if the vectorized log-probability of the emcee wrapper gives the same values
+    as evaluating the walkers one at a time.
+    """
+    vsampler = MCMC(
+        loss,
+        nwalkers=nwalkers,
+        logprior_args=(prior_bounds,),
+        sampler="emcee",
+        vectorize=True,
+    )
+    p0 = np.random.uniform(0, 10, (nwalkers, ndim))
+    p0[0, 0] = -1.0  # outside of the support of the prior
+    logp = vsampler.log_prob_fn(p0)
+    assert np.isneginf(logp[0])
+    assert np.allclose(logp[1:], [sampler.log_prob_fn(x) for x in p0[1:]])
+
+
 @pytest.mark.skipif(not ptemcee_avail, reason="ptemcee is not found")
 def test_pool_exception():
     """Test if an exception is raised when declaring the pool prior to instantiating
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from kliff.uq.mcmc_utils import (
+    RunningAutocorr,
+    RunningMSER,
+    RunningRhat,
+    _standard_error_squared,
+    mser,
+    rhat,
+)
+
+try:
+    import emcee
+
+    from kliff.uq.mcmc_utils import autocorr
+
+    emcee_avail = True
+except ImportError:
+    emcee_avail = False
+
+seed = 1717
+nwalkers = 4
+nsteps = 2000
+ndim = 2
+chunk_size = 300
+
+
+@pytest.fixture(scope="module")
+def chain():
+    """AR(1) chains of shape (nwalkers, nsteps, ndim), starting away from equilibrium."""
+    rstate = np.random.RandomState(seed)
+    chain = np.empty((nwalkers, nsteps, ndim))
+    chain[:, 0] = 5.0 + rstate.normal(size=(nwalkers, ndim))
+    for ii in range(1, nsteps):
+        chain[:, ii] = 0.9 * chain[:, ii - 1] + rstate.normal(size=(nwalkers, ndim))
+    return chain
+
+
+def test_mser(chain):
+    """Test MSER computed from cumulative sums against the definition."""
+    x = chain[0, :, 0]
+    SE2 = [_standard_error_squared(x[dd:]) for dd in range(len(x))[1:-1:10]]
+    output = mser(x, dmin=1, dstep=10, dmax=-1, full_output=True)
+    assert np.allclose(output["SE2"], SE2)
+    assert output["dstar"] == min(1 + (np.argmin(SE2) + 1) * 10, len(x))
+
+
+def test_running_mser(chain):
+    """Test the running MSER gives the same estimate as MSER on the whole chain."""
+    running = RunningMSER(dmin=1, dstep=10)
+    for ii in range(0, nsteps, chunk_size):
+        running.update(np.swapaxes(chain[:, ii : ii + chunk_size], 0, 1))
+
+    dstar = running.estimate()
+    assert dstar.shape == (nwalkers, ndim)
+    for ww in range(nwalkers):
+        for dd in range(ndim):
+            assert dstar[ww, dd] == mser(chain[ww, :, dd], dmin=1, dstep=10)
+
+
+def test_running_rhat(chain):
+    """Test the running rhat gives the same value as rhat on the whole chains."""
+    running = RunningRhat()
+    for ii in range(0, nsteps, chunk_size):
+        running.update(chain[:, ii : ii + chunk_size])
+
+    r, W, B = running.estimate(return_WB=True)
+    r_ref, W_ref, B_ref = rhat(chain, time_axis=0, return_WB=True)
+    assert np.isclose(r, r_ref)
+    assert np.allclose(W, W_ref)
+    assert np.allclose(B, B_ref)
+
+
+@pytest.mark.skipif(not emcee_avail, reason="emcee is not found")
+def test_running_autocorr(chain):
+    """Test the running autocorrelation length is the same as that of emcee."""
+    running = RunningAutocorr(max_lag=500)
+    for ii in range(0, nsteps, chunk_size):
+        running.update(chain[:, ii : ii + chunk_size])
+
+    assert np.allclose(running.estimate(), autocorr(chain, quiet=True))